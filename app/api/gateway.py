@@ -2,44 +2,91 @@ from fastapi import APIRouter, Request, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
 import logging
+import math
 from typing import Optional
 import time
+from urllib.parse import quote
 
+from app.core.config import settings
 from app.core.errors import ServiceNotFoundError, ProxyError, ServiceUnavailableError
 from app.core.security import get_current_user, validate_api_key
+from app.core.tracing import current_trace, span
 from app.db.postgres import get_db
 from app.models.user import User
-from app.services.service import get_service_by_path
+from app.services.circuit_breaker import circuit_breakers
 from app.services.proxy import proxy_request
-from app.services.rate_limit import check_rate_limit
+from app.services.rate_limit import (
+    RateLimitPolicy,
+    client_policy,
+    enforce_rate_limits,
+    get_client_id,
+)
+from app.services.load_balancer import load_balancer
 from app.services.log_service import log_request
+from app.services.registry import service_registry
+from app.services.routing import is_safe_path, upstream_url
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+GATEWAY_METHODS = ["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"]
 
-@router.api_route(
-    "/{service_name}",
-    methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"],
-)
+
+@router.api_route("/{service_name}", methods=GATEWAY_METHODS)
+@router.api_route("/{service_name}/{path:path}", methods=GATEWAY_METHODS)
 async def gateway_endpoint(
     request: Request,
     service_name: str,
+    path: str = "",
     db: AsyncSession = Depends(get_db),
     current_user: User | None = Depends(get_current_user),
 ):
     start_time = time.time()
     client_ip = request.client.host
 
-    service = await get_service_by_path(db, service_name, current_user.id)
-    if not service:
+    with span("route"):
+        if not service_registry.loaded:
+            await service_registry.load(db)
+        # Matched on the still-encoded path so that an encoded "/", "?" or
+        # dot segment reaches the upstream as sent, never as a separator
+        route = service_registry.resolve(_raw_route_path(request), current_user.id)
+    user_id = current_user.id if current_user else None
+    if route:
+        # Labels the request metrics recorded by RequestLoggingMiddleware
+        request.state.service_name = route[0].name
+
+    rate_limits = []
+    if not getattr(request.state, "client_limit_checked", False):
+        rate_limits.append(client_policy(get_client_id(request)))
+    if route and route[0].status == "active":
+        service = route[0]
+        rate_limits.append(
+            RateLimitPolicy(
+                key=f"service:{service.id}:user:{user_id or 'anonymous'}",
+                limit=service.rate_limit,
+                duration=service.rate_limit_duration,
+                algorithm=service.rate_limit_algorithm,
+                lease_size=service.rate_limit_lease_size or 0,
+            )
+        )
+    with span("ratelimit"):
+        await enforce_rate_limits(rate_limits)
+
+    if not route:
         logger.warning(f"Service not found: {service_name}")
         raise ServiceNotFoundError(detail=f"Service '{service_name}' not found")
 
+    service, path = route
+
+    if not is_safe_path(path):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid request path"
+        )
+
     if service.status != "active":
-        logger.warning(f"Service {service_name} is not active: {service.status}")
+        logger.warning(f"Service {service.name} is not active: {service.status}")
         raise ServiceUnavailableError(
-            detail=f"Service '{service_name}' is {service.status}"
+            detail=f"Service '{service.name}' is {service.status}"
         )
 
     if service.require_authentication and not current_user:
@@ -49,70 +96,117 @@ async def gateway_endpoint(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user_id = current_user.id if current_user else None
+    pool = load_balancer.pool(service)
+    if not pool.healthy:
+        raise ServiceUnavailableError(
+            detail=f"Service '{service.name}' has no healthy target",
+            headers={"Retry-After": str(math.ceil(settings.HEALTH_CHECK_INTERVAL))},
+        )
 
-    rate_limit_key = f"service:{service.id}:user:{user_id or 'anonymous'}"
-    await check_rate_limit(
-        rate_limit_key, service.rate_limit, service.rate_limit_duration
-    )
+    circuit_breakers.check(service)
 
-    try:
-        response = await proxy_request(
-            request=request, service=service, user=current_user
-        )
+    rules = service.log_rules
+    body_capture = bytearray() if rules.max_body_bytes else None
 
-        process_time = time.time() - start_time
+    target = pool.acquire()
 
+    async def record(
+        status_code: int,
+        error: Optional[str] = None,
+        response_size: Optional[int] = None,
+    ) -> None:
+        response_time = (time.time() - start_time) * 1000
+        await circuit_breakers.record(service.id, status_code >= 500, response_time)
+        keep = rules.keep(status_code, response_time)
+        trace = current_trace.get()
         await log_request(
             method=request.method,
-            path=service.base_url,
-            status_code=response.status_code,
-            response_time=process_time * 1000,
+            # Logged against base_url whatever the target, so an endpoint
+            # keeps one path across targets
+            path=upstream_url(service.base_url, path),
+            status_code=status_code,
+            response_time=response_time,
             client_ip=client_ip,
             user_id=user_id,
             service_id=service.id,
-            headers=dict(request.headers),
-            query_params=dict(request.query_params),
+            headers=rules.filter_headers(request.headers) if keep else None,
+            query_params=(
+                rules.filter_query_params(request.query_params) if keep else None
+            ),
+            error=error,
+            response_size=response_size,
+            request_body=(
+                rules.capture_body(bytes(body_capture))
+                if keep and body_capture
+                else None
+            ),
+            keep=keep,
+            request_id=getattr(request.state, "request_id", None),
+            target=target.url if target.url != service.base_url else None,
+            spans=(
+                trace.to_log()
+                if trace is not None and keep and settings.TRACE_LOG_SPANS
+                else None
+            ),
         )
+
+    try:
+        failed = False
+        try:
+            with span("upstream"):
+                response = await proxy_request(
+                    request=request,
+                    service=service,
+                    user=current_user,
+                    path=path,
+                    base_url=target.url,
+                    body_capture=body_capture,
+                    capture_limit=rules.max_body_bytes,
+                )
+            failed = response.status_code >= 500
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Also runs when the client disconnects, which cancels the task
+            # without going through record()
+            pool.release(target, failed, (time.time() - start_time) * 1000)
+
+        with span("log"):
+            await record(response.status_code, response_size=_content_length(response))
         return response
 
-    except httpx.RequestError as e:
-        logger.error(f"Error proxying request to {service_name}: {str(e)}")
-        process_time = time.time() - start_time
+    except ProxyError as e:
+        await record(e.status_code, error=str(e.detail))
+        raise
 
-        await log_request(
-            method=request.method,
-            path=service.base_url,
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            response_time=process_time * 1000,
-            client_ip=client_ip,
-            user_id=user_id,
-            service_id=service.id,
-            headers=dict(request.headers),
-            query_params=dict(request.query_params),
-            error=str(e),
-        )
+    except httpx.RequestError as e:
+        logger.error(f"Error proxying request to {service.name}: {str(e)}")
+        await record(status.HTTP_502_BAD_GATEWAY, error=str(e))
 
         raise ProxyError(detail=f"Error connecting to service: {str(e)}")
 
     except Exception as e:
         logger.exception(f"Unexpected error in gateway: {str(e)}")
-        process_time = time.time() - start_time
-
-        await log_request(
-            method=request.method,
-            path=service.base_url,
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            response_time=process_time * 1000,
-            client_ip=client_ip,
-            user_id=user_id,
-            service_id=service.id,
-            headers=dict(request.headers),
-            query_params=dict(request.query_params),
-            error=str(e),
-        )
+        await record(status.HTTP_500_INTERNAL_SERVER_ERROR, error=str(e))
 
         raise ProxyError(
             detail="Internal server error",
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
+
+
+def _raw_route_path(request: Request) -> str:
+    """The percent-encoded request path after the gateway prefix."""
+    raw_path = request.scope.get("raw_path")
+    path = raw_path.decode("latin-1") if raw_path else quote(request.scope["path"])
+    root_path = request.scope.get("root_path", "")
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path) :]
+    # "/gateway/<service>/<rest>" -> "<service>/<rest>"
+    return path.split("/", 2)[2]
+
+
+def _content_length(response) -> Optional[int]:
+    value = response.headers.get("content-length")
+    return int(value) if value and value.isdigit() else None
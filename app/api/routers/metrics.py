@@ -0,0 +1,54 @@
+from fastapi import APIRouter, HTTPException, Response, status
+
+from app.api.routers.monitoring import cache_stats
+from app.core.config import settings
+from app.core.metrics import CONTENT_TYPE, Counter, Gauge, metrics_registry
+from app.services.log_writer import log_writer
+
+router = APIRouter()
+
+# Read from the components' own counters when scraped, nothing to update on
+# the hot path.
+Gauge(
+    "gateway_cache_hit_ratio",
+    "Hit ratio of the in-process caches since startup.",
+    ("cache",),
+    collect=lambda: {
+        (name,): stats["hit_ratio"] for name, stats in cache_stats().items()
+    },
+)
+Gauge(
+    "gateway_cache_entries",
+    "Entries held by the in-process caches.",
+    ("cache",),
+    collect=lambda: {(name,): stats["size"] for name, stats in cache_stats().items()},
+)
+Gauge(
+    "gateway_log_queue_depth",
+    "Request logs waiting for the background writer.",
+    collect=lambda: {(): log_writer.stats()["queue_depth"]},
+)
+Counter(
+    "gateway_log_records_total",
+    "Request logs handled by the log pipeline, by outcome.",
+    ("outcome",),
+    collect=lambda: {
+        (outcome,): log_writer.stats()[outcome]
+        for outcome in (
+            "enqueued",
+            "dropped",
+            "written",
+            "failed",
+            "sampled_out",
+            "spilled",
+            "replayed",
+        )
+    },
+)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return Response(content=metrics_registry.render(), media_type=CONTENT_TYPE)
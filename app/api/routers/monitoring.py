@@ -1,29 +1,59 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from datetime import datetime, timedelta
 
-from app.core.security import get_current_active_user, get_current_admin_user
+from app.core.security import (
+    api_key_cache,
+    api_key_negative_cache,
+    get_current_active_user,
+    get_current_admin_user,
+    token_cache,
+    user_cache,
+    username_cache,
+)
 from app.db.postgres import get_db
 from app.db.mongodb import get_mongodb
 from app.schemas.user import User
 from app.schemas.log import LogFilterParams, LogResponse, LogStatsResponse
-from app.services.log_service import get_logs, get_log_stats
+from app.schemas.monitoring import CacheStats, LogPipelineStats, UpstreamPoolStats
+from app.services.log_export import (
+    DEFAULT_EXPORT_FIELDS,
+    EXPORT_FIELDS,
+    MEDIA_TYPES,
+    ExportFormat,
+    export_logs,
+)
+from app.services.log_service import build_log_query, get_logs_page, get_log_stats
+from app.services.log_writer import log_writer
+from app.services.proxy import upstream_clients
+from app.services.rate_limit import local_buckets
+from app.services.result_cache import result_cache
+from app.services.registry import service_registry
 
 router = APIRouter()
 
 
 @router.get("/logs", response_model=List[LogResponse])
 async def read_logs(
+    response: Response,
     service_id: Optional[int] = None,
     status_code: Optional[int] = None,
     method: Optional[str] = None,
     path: Optional[str] = None,
+    path_mode: Literal["contains", "prefix"] = Query(
+        "contains",
+        description="contains: case-insensitive regex, prefix: anchored prefix",
+    ),
     from_date: Optional[datetime] = None,
     to_date: Optional[datetime] = None,
     limit: int = Query(100, ge=1, le=1000),
     skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(
+        None, description="X-Next-Cursor of the previous page, replaces skip"
+    ),
     mongodb: AsyncIOMotorDatabase = Depends(get_mongodb),
     current_user: User = Depends(get_current_admin_user),
 ):
@@ -32,16 +62,86 @@ async def read_logs(
         status_code=status_code,
         method=method,
         path=path,
+        path_mode=path_mode,
         from_date=from_date,
         to_date=to_date,
         limit=limit,
         skip=skip,
+        cursor=cursor,
     )
 
-    logs = await get_logs(mongodb, filter_params)
+    try:
+        logs, next_cursor = await get_logs_page(mongodb, filter_params)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return logs
 
 
+@router.get("/logs/export")
+async def export_request_logs(
+    request: Request,
+    format: ExportFormat = Query("ndjson", description="ndjson or csv"),
+    fields: Optional[str] = Query(
+        None,
+        description=f"Comma separated subset of {', '.join(EXPORT_FIELDS)}",
+    ),
+    service_id: Optional[int] = None,
+    status_code: Optional[int] = None,
+    method: Optional[str] = None,
+    path: Optional[str] = None,
+    path_mode: Literal["contains", "prefix"] = "contains",
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    limit: int = Query(0, ge=0, description="0 exports every matching log"),
+    cursor: Optional[str] = Query(None, description="Resume after this log"),
+    mongodb: AsyncIOMotorDatabase = Depends(get_mongodb),
+    current_user: User = Depends(get_current_admin_user),
+):
+    """Stream matching logs newest first, gzipped if the client accepts it."""
+    export_fields = DEFAULT_EXPORT_FIELDS
+    if fields:
+        export_fields = tuple(field.strip() for field in fields.split(","))
+        unknown = set(export_fields) - set(EXPORT_FIELDS)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+
+    filter_params = LogFilterParams(
+        service_id=service_id,
+        status_code=status_code,
+        method=method,
+        path=path,
+        path_mode=path_mode,
+        from_date=from_date,
+        to_date=to_date,
+        limit=limit,
+        cursor=cursor,
+    )
+    try:
+        build_log_query(filter_params)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    compress = "gzip" in request.headers.get("accept-encoding", "")
+    headers = {
+        "Content-Disposition": f'attachment; filename="request_logs.{format}"',
+        "Vary": "Accept-Encoding",
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        export_logs(mongodb, filter_params, format, export_fields, compress),
+        media_type=MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+
 @router.get("/stats", response_model=LogStatsResponse)
 async def read_log_stats(
     service_id: Optional[int] = None,
@@ -59,3 +159,37 @@ async def read_log_stats(
 
     stats = await get_log_stats(mongodb, service_id, from_date, to_date)
     return stats
+
+
+@router.get("/upstreams", response_model=List[UpstreamPoolStats])
+async def read_upstream_pools(
+    current_user: User = Depends(get_current_admin_user),
+):
+    return upstream_clients.stats()
+
+
+@router.get("/caches", response_model=Dict[str, CacheStats])
+async def read_cache_stats(
+    current_user: User = Depends(get_current_admin_user),
+):
+    return cache_stats()
+
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    return {
+        "service_registry": service_registry.stats(),
+        "rate_limit_leases": local_buckets.stats(),
+        "api_keys": api_key_cache.stats(),
+        "api_keys_negative": api_key_negative_cache.stats(),
+        "users": user_cache.stats(),
+        "usernames": username_cache.stats(),
+        "tokens": token_cache.stats(),
+        "stats_results": result_cache.stats(),
+    }
+
+
+@router.get("/log-pipeline", response_model=LogPipelineStats)
+async def read_log_pipeline_stats(
+    current_user: User = Depends(get_current_admin_user),
+):
+    return log_writer.stats()
@@ -5,7 +5,14 @@ import logging
 
 from app.core.security import get_current_active_user
 from app.db.postgres import get_db
-from app.schemas.service import Service, ServiceCreate, ServiceUpdate, ServiceWithStats
+from app.core.config import settings
+from app.schemas.service import (
+    Service,
+    ServiceCreate,
+    ServiceHealth,
+    ServiceUpdate,
+    ServiceWithStats,
+)
 from app.schemas.user import User
 from app.services.service import (
     create_service,
@@ -15,6 +22,7 @@ from app.services.service import (
     delete_service,
     get_service_with_stats,
 )
+from app.services.health_checks import get_health_transitions, health_checker
 from app.models.service import ServiceStatus
 from app.schemas.utils.pagination import PaginatedResponse
 
@@ -117,6 +125,39 @@ async def read_service_stats(
     return service
 
 
+@router.get("/{service_id}/health", response_model=ServiceHealth)
+async def read_service_health(
+    service_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Get the health check state and recent health transitions of a service."""
+    service = await get_service(db, service_id)
+    if not service:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Service not found",
+        )
+
+    if (
+        service.owner_id != current_user.id
+        and not service.is_public
+        and current_user.role != "admin"
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+
+    return {
+        "service_id": service_id,
+        "checks_enabled": settings.HEALTH_CHECK_ENABLED,
+        "targets": health_checker.status(service_id),
+        "transitions": await get_health_transitions(service_id, limit),
+    }
+
+
 @router.put("/{service_id}", response_model=Service)
 async def update_existing_service(
     service_id: int,
@@ -1,5 +1,5 @@
 import os
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Literal, Optional
 from pydantic_settings import BaseSettings
 
 
@@ -8,6 +8,11 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api"
     SECRET_KEY: str = os.environ.get("SECRET_KEY", "supersecretkey")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    API_KEY_CACHE_SIZE: int = 10000  # entries per authentication cache
+    API_KEY_CACHE_TTL: int = 60  # seconds
+    API_KEY_NEGATIVE_CACHE_TTL: int = 10  # seconds
+    TOKEN_CACHE_SIZE: int = 10000  # verified bearer tokens
+    TOKEN_CACHE_TTL: int = 300  # seconds, never beyond the token expiry
 
     # PostgreSQL
     POSTGRES_USER: str = os.environ.get("POSTGRES_USER", "postgres")
@@ -19,6 +24,7 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URL: str = os.environ.get("MONGODB_URL", "mongodb://localhost:27017")
     MONGODB_DB: str = os.environ.get("MONGODB_DB", "api_gateway_logs")
+    MONGODB_RECONCILE_INDEXES: bool = True  # apply app.db.mongo_indexes at startup
 
     # Redis
     REDIS_HOST: str = os.environ.get("REDIS_HOST", "localhost")
@@ -38,13 +44,94 @@ class Settings(BaseSettings):
     # Rate Limiting
     DEFAULT_RATE_LIMIT: int = 60  # requests per minute
     DEFAULT_RATE_LIMIT_PERIOD: int = 60  # seconds
+    CLIENT_RATE_LIMIT: int = 120  # requests per client across the gateway
+    CLIENT_RATE_LIMIT_PERIOD: int = 60  # seconds
+    CLIENT_RATE_LIMIT_ALGORITHM: str = "fixed_window"
+    CLIENT_RATE_LIMIT_LEASE_SIZE: int = 0  # > 0 enables approximate mode
+
+    # Circuit breaker, per service over a rolling window of upstream calls
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_WINDOW: int = 30  # seconds
+    CIRCUIT_BUCKETS: int = 10
+    CIRCUIT_MIN_REQUESTS: int = 20  # calls in the window before it can trip
+    CIRCUIT_FAILURE_RATE: float = 0.5  # share of 5xx or connection errors
+    CIRCUIT_SLOW_CALL_MS: float = 5000
+    CIRCUIT_SLOW_RATE: float = 0.8  # share of calls slower than the above
+    CIRCUIT_OPEN_SECONDS: int = 30  # fail fast for this long once tripped
+    CIRCUIT_HALF_OPEN_REQUESTS: int = 3  # probes that must succeed to close
+
+    # Load balancing across a service's targets
+    LB_EWMA_ALPHA: float = 0.3  # weight of the newest latency in the EWMA
+    LB_EJECT_CONSECUTIVE_FAILURES: int = 5
+    LB_EJECT_SECONDS: int = 30
+
+    # Active health checks of service targets
+    HEALTH_CHECK_ENABLED: bool = False
+    HEALTH_CHECK_PATH: str = "/health"
+    HEALTH_CHECK_INTERVAL: float = 10.0  # seconds between probes of a target
+    HEALTH_CHECK_JITTER: float = 0.2  # +/- share of the interval
+    HEALTH_CHECK_TIMEOUT: float = 2.0  # seconds
+    HEALTH_CHECK_CONCURRENCY: int = 50  # probes in flight
+    HEALTH_CHECK_HEALTHY_THRESHOLD: int = 2  # successes in a row to recover
+    HEALTH_CHECK_UNHEALTHY_THRESHOLD: int = 3  # failures in a row to mark down
+    HEALTH_CHECK_HISTORY: int = 20  # probes kept per target
+    HEALTH_CHECK_RETENTION_DAYS: int = 30  # TTL on health_transitions
+
+    # Metrics
+    METRICS_ENABLED: bool = True  # serve /metrics
+    METRICS_UPSTREAM_TIMINGS: bool = True  # trace upstream connect time and TTFB
+
+    # Tracing
+    REQUEST_ID_HEADER: str = "X-Request-ID"  # propagated upstream and echoed back
+    TRACE_SAMPLE_RATE: float = 0.0  # share of requests traced, 0 disables
+    TRACE_SERVER_TIMING: bool = False  # return the spans in a Server-Timing header
+    TRACE_LOG_SPANS: bool = True  # store the spans in the request log
 
     # Logging
     LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO")
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
+    # Request log pipeline
+    LOG_QUEUE_SIZE: int = 10000  # records buffered before the overflow policy
+    LOG_BATCH_SIZE: int = 500  # records per insert_many
+    LOG_FLUSH_INTERVAL: float = 1.0  # seconds
+    LOG_WRITE_CONCERN: str = "1"  # "0", "1", ... or "majority"
+    LOG_OVERFLOW_POLICY: Literal["drop", "sample", "block"] = "drop"
+    LOG_OVERFLOW_SAMPLE_RATE: float = 0.1  # share kept under pressure
+    LOG_SHUTDOWN_TIMEOUT: float = 10.0  # seconds
+    LOG_COLLECTION: str = "request_logs"
+    LOG_STORAGE_MODE: Literal["standard", "timeseries"] = "standard"
+    LOG_RETENTION_DAYS: int = 0  # TTL on request_logs, 0 keeps logs forever
+    # Defaults of the per-service log policy
+    LOG_HEADER_ALLOWLIST: List[str] = [
+        "user-agent",
+        "content-type",
+        "content-length",
+        "accept",
+        "x-request-id",
+        "x-forwarded-for",
+    ]
+    LOG_SUCCESS_SAMPLE_RATE: float = 1.0  # share of successful requests stored
+    LOG_SLOW_REQUEST_MS: float = 1000  # slower requests are always stored
+    LOG_ROLLUPS_ENABLED: bool = True  # per-minute rollups back the stats endpoints
+    # Local spill for request logs while MongoDB is slow or down
+    LOG_SPILL_DIR: str = ""  # empty disables spilling
+    LOG_SPILL_LATENCY_MS: float = 2000  # slower flushes go to the spill
+    LOG_SPILL_RETRY_INTERVAL: float = 5.0  # seconds between replay attempts
+    LOG_SPILL_MAX_BYTES: int = 1024 * 1024 * 1024
+    LOG_SPILL_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    STATS_CACHE_TTL: int = 15  # seconds stats results are shared, 0 disables
+    STATS_CACHE_BUCKET: int = 60  # seconds windows are rounded to in cache keys
+
     # API Gateway
     PROXY_TIMEOUT: int = 60  # seconds
+    PROXY_CONNECT_TIMEOUT: float = 5.0  # seconds
+    PROXY_MAX_CONNECTIONS: int = 100  # per upstream origin
+    PROXY_MAX_KEEPALIVE_CONNECTIONS: int = 20  # per upstream origin
+    PROXY_KEEPALIVE_EXPIRY: float = 30.0  # seconds
+    PROXY_HTTP2: bool = False  # requires the optional `h2` package
+    PROXY_STREAMING: bool = True  # stream bodies instead of buffering them
+    SERVICE_REGISTRY_TTL: int = 300  # seconds between full registry reloads
 
     class Config:
         env_file = ".env"
@@ -1,17 +1,20 @@
 from datetime import datetime, timedelta, timezone
+import hashlib
 from typing import Any, Dict, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, APIKeyHeader
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import MISSING, TTLCache
 from app.core.config import settings
 from app.models.user import User, UserRole
 from app.db.postgres import get_db
 from app.schemas.auth import TokenData
 from app.services.auth import get_user_by_username, get_api_key, get_user_by_id
+from app.services.invalidation import invalidation_bus
 from app.models.api_key import APIKey
 
 oauth2_scheme = OAuth2PasswordBearer(
@@ -24,6 +27,152 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 ALGORITHM = "HS256"
 
 
+class Principal:
+    """Authenticated user detached from the database session."""
+
+    __slots__ = (
+        "id",
+        "username",
+        "email",
+        "full_name",
+        "role",
+        "is_active",
+        "created_at",
+        "updated_at",
+    )
+
+    def __init__(self, user: User):
+        for name in self.__slots__:
+            setattr(self, name, getattr(user, name))
+
+
+class APIKeyPrincipal:
+    """What a verified API key grants, without the secret itself."""
+
+    __slots__ = ("key_id", "user_id", "expires_at")
+
+    def __init__(self, api_key: APIKey):
+        self.key_id = api_key.id
+        self.user_id = api_key.user_id
+        self.expires_at = api_key.expires_at
+
+
+# Known keys and users are cached for API_KEY_CACHE_TTL seconds. Unknown or
+# inactive keys are remembered separately for API_KEY_NEGATIVE_CACHE_TTL so
+# brute-force traffic can neither reach Postgres nor evict valid entries.
+api_key_cache = TTLCache(settings.API_KEY_CACHE_SIZE, settings.API_KEY_CACHE_TTL)
+api_key_negative_cache = TTLCache(
+    settings.API_KEY_CACHE_SIZE, settings.API_KEY_NEGATIVE_CACHE_TTL
+)
+user_cache = TTLCache(settings.API_KEY_CACHE_SIZE, settings.API_KEY_CACHE_TTL)
+
+# Verified token claims, kept at most until the token expires, and the
+# immutable username to user id mapping used to resolve them.
+token_cache = TTLCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+username_cache = TTLCache(settings.TOKEN_CACHE_SIZE, settings.API_KEY_CACHE_TTL)
+
+
+def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """Verify a bearer token once and cache its claims until expiry."""
+    claims = token_cache.get(token)
+    if claims is not MISSING:
+        return claims
+
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+    expires_in = claims.get("exp", 0) - datetime.now(timezone.utc).timestamp()
+    if expires_in > 0:
+        token_cache.set(token, claims, ttl=expires_in)
+    return claims
+
+
+def _api_key_digest(api_key: str) -> str:
+    """Caches and invalidation messages never hold the key itself."""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+async def authenticate_api_key(
+    db: AsyncSession, api_key: str
+) -> Optional[APIKeyPrincipal]:
+    digest = _api_key_digest(api_key)
+    principal = api_key_cache.get(digest)
+    if principal is not MISSING:
+        return principal
+    if api_key_negative_cache.get(digest) is not MISSING:
+        return None
+
+    api_key_obj = await get_api_key(db, api_key)
+    if not api_key_obj or not api_key_obj.is_active:
+        api_key_negative_cache.set(digest, None)
+        return None
+
+    principal = APIKeyPrincipal(api_key_obj)
+    api_key_cache.set(digest, principal)
+    return principal
+
+
+async def get_user_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    principal = user_cache.get(user_id)
+    if principal is MISSING:
+        user = await get_user_by_id(db, user_id)
+        principal = Principal(user) if user else None
+        user_cache.set(user_id, principal)
+    return principal
+
+
+async def get_user_principal_by_username(
+    db: AsyncSession, username: str
+) -> Optional[Principal]:
+    user_id = username_cache.get(username)
+    if user_id is not MISSING:
+        principal = await get_user_principal(db, user_id)
+        if principal:
+            return principal
+        username_cache.pop(username)
+
+    user = await get_user_by_username(db, username=username)
+    if not user:
+        return None
+    principal = Principal(user)
+    username_cache.set(username, user.id)
+    user_cache.set(user.id, principal)
+    return principal
+
+
+async def invalidate_api_key(api_key: str) -> None:
+    digest = _api_key_digest(api_key)
+    await _drop_api_key(digest)
+    await invalidation_bus.publish("api_key", digest)
+
+
+async def invalidate_user(user_id: int) -> None:
+    await _drop_user(str(user_id))
+    await invalidation_bus.publish("user", user_id)
+
+
+async def _drop_api_key(digest: str) -> None:
+    api_key_cache.pop(digest)
+    api_key_negative_cache.pop(digest)
+
+
+async def _drop_user(user_id: str) -> None:
+    user_cache.pop(int(user_id))
+
+
+async def _clear_auth_caches() -> None:
+    api_key_cache.clear()
+    api_key_negative_cache.clear()
+    user_cache.clear()
+    username_cache.clear()
+
+
+invalidation_bus.subscribe("api_key", _drop_api_key, _clear_auth_caches)
+invalidation_bus.subscribe("user", _drop_user)
+
+
 def create_access_token(
     data: Dict[str, Any], expires_delta: Optional[timedelta] = None
 ) -> str:
@@ -65,21 +214,21 @@ async def validate_api_key(
 
 
 async def get_current_user(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     api_key: str | None = Depends(api_key_header),
     token: str | None = Depends(oauth2_scheme),
-) -> User:
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     if api_key:
-        api_key_obj = await get_api_key(db, api_key)
-        print(api_key_obj)
-        if api_key_obj and api_key_obj.is_active:
-            if api_key_obj.expires_at and api_key_obj.expires_at < datetime.now(
-                timezone.utc
+        api_key_principal = await authenticate_api_key(db, api_key)
+        if api_key_principal:
+            if api_key_principal.expires_at and api_key_principal.expires_at < (
+                datetime.now(timezone.utc)
             ):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -87,29 +236,28 @@ async def get_current_user(
                     headers={"WWW-Authenticate": "ApiKey"},
                 )
 
-            user = await get_user_by_id(db, api_key_obj.user_id)
+            user = await get_user_principal(db, api_key_principal.user_id)
             if user:
                 return user
 
     if token:
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+        # AuthenticationMiddleware has usually verified the token already.
+        payload = getattr(request.state, "token_claims", None)
+        if payload is None:
+            payload = decode_access_token(token)
+        if payload:
             username = payload.get("sub")
             if not username:
                 raise credentials_exception
 
-            user = await get_user_by_username(db, username=username)
+            user = await get_user_principal_by_username(db, username)
             if user:
                 return user
 
-        except JWTError:
-            pass
-
     raise credentials_exception
 
 
 async def get_current_active_user(current_user=Depends(get_current_user)):
-    print("get_current_active_user")
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
@@ -0,0 +1,66 @@
+import math
+from typing import Dict, Iterable, Optional, Tuple
+
+# Relative error guaranteed on every quantile. 1% keeps a latency
+# distribution from 0.01 ms to 10 minutes within about 1200 bins, and far
+# fewer in practice since only occupied bins are stored.
+RELATIVE_ACCURACY = 0.01
+MIN_VALUE = 0.01
+
+
+class LatencySketch:
+    """Mergeable quantile sketch with relative error guarantees (DDSketch).
+
+    Values are counted in logarithmically sized bins: bin ``k`` covers
+    ``(gamma^(k-1), gamma^k]`` with ``gamma = (1 + a) / (1 - a)``, so any
+    quantile read back is within ``a`` of the true value relative to it.
+    Sketches merge by adding bin counts, which is what lets per-minute
+    rollups be stored as ``$inc`` counters and combined over any window.
+    """
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.count = 0
+
+    @classmethod
+    def from_bins(
+        cls,
+        bins: Iterable[Tuple[int, int]],
+        relative_accuracy: float = RELATIVE_ACCURACY,
+    ) -> "LatencySketch":
+        sketch = cls(relative_accuracy)
+        for key, count in bins:
+            sketch.bins[int(key)] = sketch.bins.get(int(key), 0) + count
+            sketch.count += count
+        return sketch
+
+    def key(self, value: float) -> int:
+        return math.ceil(math.log(max(value, MIN_VALUE)) / self._log_gamma)
+
+    def value(self, key: int) -> float:
+        """Representative value of a bin, within the relative accuracy."""
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1) -> None:
+        key = self.key(value)
+        self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+
+    def merge(self, other: "LatencySketch") -> None:
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return self.value(key)
+        return self.value(max(self.bins))
@@ -0,0 +1,97 @@
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+# Incoming request IDs are propagated as is when they look sane, otherwise
+# a new one is generated.
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}\Z")
+
+
+class Trace:
+    """Stage timings of one sampled request.
+
+    Spans are kept as flat ``(name, start, duration)`` tuples in seconds,
+    ``start`` relative to the beginning of the request.
+    """
+
+    __slots__ = ("request_id", "started", "spans")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, name: str, duration: float, start: Optional[float] = None) -> None:
+        if start is None:
+            start = time.perf_counter() - duration
+        self.spans.append((name, start - self.started, duration))
+
+    def server_timing(self) -> str:
+        """The spans as a ``Server-Timing`` header value, in milliseconds."""
+        entries = [
+            f"{name};dur={duration * 1000:.2f}" for name, _, duration in self.spans
+        ]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+    def to_log(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": name,
+                "start_ms": round(start * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+            }
+            for name, start, duration in self.spans
+        ]
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        duration = time.perf_counter() - self.start
+        self.trace.add(self.name, duration, self.start)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """Time the enclosed block as a stage of the current request.
+
+    Outside a sampled request this returns a shared no-op context manager,
+    so unsampled requests only pay for one context variable lookup.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name)
+
+
+def request_id_from(value: Optional[str]) -> str:
+    if value and REQUEST_ID_PATTERN.match(value):
+        return value
+    return uuid.uuid4().hex
@@ -0,0 +1,174 @@
+"""Where request logs live and how their collection is laid out.
+
+``LOG_STORAGE_MODE`` picks the layout of ``LOG_COLLECTION``:
+
+* ``standard``: a regular collection with one document per request.
+* ``timeseries``: a MongoDB time-series collection with ``timestamp`` as
+  time field and ``service_id`` as meta field. Mongo groups the requests of
+  a service into compressed buckets, which shrinks storage and index memory
+  and turns time range scans into bucket scans.
+
+Readers and writers go through ``log_collection`` and work unchanged on
+either layout. Existing logs move to a new time-series collection with::
+
+    LOG_STORAGE_MODE=timeseries python -m app.db.log_storage migrate \
+        --target request_logs_ts
+
+after which ``LOG_COLLECTION`` is pointed at the target. Running the same
+command again once traffic has switched copies the logs written meanwhile.
+Mongo cannot rename time-series collections, hence the configurable name.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "log_migrations"
+
+
+def log_collection(
+    mongodb: AsyncIOMotorDatabase, name: Optional[str] = None
+) -> AsyncIOMotorCollection:
+    return mongodb[name or settings.LOG_COLLECTION]
+
+
+def timeseries_options() -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "timeseries": {
+            "timeField": "timestamp",
+            "metaField": "service_id",
+            "granularity": "seconds",
+        }
+    }
+    if settings.LOG_RETENTION_DAYS > 0:
+        options["expireAfterSeconds"] = settings.LOG_RETENTION_DAYS * 86400
+    return options
+
+
+async def is_timeseries(mongodb: AsyncIOMotorDatabase, name: str) -> Optional[bool]:
+    """Whether a collection is time-series, None if it does not exist."""
+    async for info in mongodb.list_collections(filter={"name": name}):
+        return info.get("type") == "timeseries"
+    return None
+
+
+async def ensure_log_collection(
+    mongodb: AsyncIOMotorDatabase, name: Optional[str] = None
+) -> None:
+    """Create the log collection in the configured layout if it is missing.
+
+    An existing collection is never converted. If its layout differs from
+    ``LOG_STORAGE_MODE`` a warning points at the migration tool.
+    """
+    name = name or settings.LOG_COLLECTION
+    timeseries = await is_timeseries(mongodb, name)
+    wanted = settings.LOG_STORAGE_MODE == "timeseries"
+
+    if timeseries is None:
+        if wanted:
+            await mongodb.create_collection(name, **timeseries_options())
+            logger.info(f"Created time-series log collection {name}")
+        return
+
+    if timeseries != wanted:
+        logger.warning(
+            f"Log collection {name} is not in {settings.LOG_STORAGE_MODE} mode, "
+            "run python -m app.db.log_storage migrate to move its data"
+        )
+    elif timeseries and settings.LOG_RETENTION_DAYS > 0:
+        # Time-series collections expire whole buckets, not through an index.
+        await mongodb.command(
+            "collMod",
+            name,
+            expireAfterSeconds=settings.LOG_RETENTION_DAYS * 86400,
+        )
+
+
+def compact_log(log: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop empty optional fields, readers default them."""
+    return {key: value for key, value in log.items() if value not in (None, {})}
+
+
+async def migrate_logs(
+    mongodb: AsyncIOMotorDatabase,
+    source: str,
+    target: str,
+    batch_size: int = 5000,
+) -> int:
+    """Copy every log of ``source`` into ``target`` in ``_id`` order.
+
+    ``target`` is created in the configured layout first. Progress is
+    checkpointed after each batch in ``log_migrations``, so an interrupted
+    run resumes where it stopped. Time-series collections do not enforce
+    unique ``_id``, so a crash between a batch and its checkpoint can copy
+    that one batch twice. Returns the number of logs copied by this run.
+    """
+    await ensure_log_collection(mongodb, target)
+    migrations = mongodb[MIGRATIONS_COLLECTION]
+    migration_id = f"{source}->{target}"
+    checkpoint = await migrations.find_one({"_id": migration_id})
+
+    query: Dict[str, Any] = {}
+    if checkpoint and checkpoint.get("last_id"):
+        query["_id"] = {"$gt": checkpoint["last_id"]}
+
+    copied = 0
+    batch = []
+    cursor = mongodb[source].find(query).sort("_id", 1).batch_size(batch_size)
+    async for log in cursor:
+        batch.append(compact_log(log))
+        if len(batch) >= batch_size:
+            copied += await _copy_batch(mongodb, target, migration_id, batch)
+            batch = []
+    if batch:
+        copied += await _copy_batch(mongodb, target, migration_id, batch)
+    return copied
+
+
+async def _copy_batch(
+    mongodb: AsyncIOMotorDatabase, target: str, migration_id: str, batch: list
+) -> int:
+    await mongodb[target].insert_many(batch, ordered=False)
+    await mongodb[MIGRATIONS_COLLECTION].update_one(
+        {"_id": migration_id},
+        {"$set": {"last_id": batch[-1]["_id"]}, "$inc": {"copied": len(batch)}},
+        upsert=True,
+    )
+    logger.info(f"Copied {len(batch)} logs up to {batch[-1]['_id']}")
+    return len(batch)
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    from app.db.mongodb import close_mongo_connection, connect_to_mongo, get_mongodb
+
+    parser = argparse.ArgumentParser(description="Manage request log storage")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate = subcommands.add_parser("migrate", help="copy logs to a new collection")
+    migrate.add_argument("--source", default=settings.LOG_COLLECTION)
+    migrate.add_argument("--target", required=True)
+    migrate.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    async def main() -> None:
+        logging.basicConfig(level=logging.INFO)
+        await connect_to_mongo()
+        try:
+            mongodb = await get_mongodb()
+            copied = await migrate_logs(
+                mongodb, args.source, args.target, args.batch_size
+            )
+            print(
+                f"Copied {copied} logs from {args.source} to {args.target}, "
+                f"set LOG_COLLECTION={args.target} to switch over"
+            )
+        finally:
+            await close_mongo_connection()
+
+    asyncio.run(main())
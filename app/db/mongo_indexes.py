@@ -0,0 +1,321 @@
+"""Declared MongoDB indexes and the reconciler that applies them.
+
+Every read path on ``request_logs``, ``request_rollups`` and
+``health_transitions`` has an index
+declared here. ``reconcile_indexes`` runs at startup and from the CLI::
+
+    python -m app.db.mongo_indexes           # create, update and drop indexes
+    python -m app.db.mongo_indexes --check   # explain the query shapes and
+                                             # list the ones that scan
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+
+from app.core.config import settings
+from app.db.log_storage import ensure_log_collection
+
+ROLLUP_COLLECTION = "request_rollups"
+HEALTH_COLLECTION = "health_transitions"
+
+logger = logging.getLogger(__name__)
+
+# Indexes named with this prefix are owned by the reconciler, which drops
+# them once they are no longer declared. Other indexes are left alone.
+MANAGED_PREFIX = "gw_"
+
+
+class IndexSpec(NamedTuple):
+    name: str
+    keys: Tuple[Tuple[str, int], ...]
+    unique: bool = False
+    expire_after_seconds: Optional[int] = None
+    partial_filter: Optional[Dict[str, Any]] = None
+
+    def options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = self.expire_after_seconds
+        if self.partial_filter is not None:
+            options["partialFilterExpression"] = self.partial_filter
+        return options
+
+
+def declared_indexes() -> Dict[str, List[IndexSpec]]:
+    """Indexes per collection, following the query shapes they serve."""
+    if settings.LOG_STORAGE_MODE == "timeseries":
+        # Time-series collections have no _id index, reject partial filters
+        # on measurements and expire data through the collection itself.
+        newest_first: Tuple[Tuple[str, int], ...] = (("timestamp", DESCENDING),)
+        user_filter = None
+        ttl_seconds = 0
+    else:
+        newest_first = (("timestamp", DESCENDING), ("_id", DESCENDING))
+        user_filter = {"user_id": {"$exists": True}}
+        ttl_seconds = settings.LOG_RETENTION_DAYS * 86400
+
+    request_logs = [
+        # get_logs without filters, and its keyset cursor
+        IndexSpec("gw_logs_timestamp", newest_first),
+        # get_logs / stats / get_service_with_stats per service
+        IndexSpec("gw_logs_service", (("service_id", ASCENDING),) + newest_first),
+        IndexSpec(
+            "gw_logs_user",
+            (("user_id", ASCENDING),) + newest_first,
+            partial_filter=user_filter,
+        ),
+        IndexSpec("gw_logs_status", (("status_code", ASCENDING),) + newest_first),
+        # path_mode=prefix
+        IndexSpec("gw_logs_path", (("path", ASCENDING), ("timestamp", DESCENDING))),
+    ]
+    if ttl_seconds > 0:
+        request_logs.append(
+            IndexSpec(
+                "gw_logs_ttl",
+                (("timestamp", ASCENDING),),
+                expire_after_seconds=ttl_seconds,
+            )
+        )
+
+    request_rollups = [
+        IndexSpec(
+            "gw_rollups_bucket",
+            (
+                ("service_id", ASCENDING),
+                ("minute", ASCENDING),
+                ("method", ASCENDING),
+                ("path", ASCENDING),
+            ),
+            unique=True,
+        ),
+        IndexSpec("gw_rollups_minute", (("minute", ASCENDING),)),
+    ]
+
+    health_transitions = [
+        # Health history of a service, newest first
+        IndexSpec("gw_health_service", (("service_id", ASCENDING), ("at", DESCENDING))),
+        IndexSpec(
+            "gw_health_ttl",
+            (("at", ASCENDING),),
+            expire_after_seconds=settings.HEALTH_CHECK_RETENTION_DAYS * 86400,
+        ),
+    ]
+
+    return {
+        settings.LOG_COLLECTION: request_logs,
+        ROLLUP_COLLECTION: request_rollups,
+        HEALTH_COLLECTION: health_transitions,
+    }
+
+
+def _key_of(keys: Iterable) -> Tuple[Tuple[str, int], ...]:
+    return tuple((field, int(direction)) for field, direction in keys)
+
+
+async def reconcile_collection(
+    mongodb: AsyncIOMotorDatabase, collection_name: str, specs: List[IndexSpec]
+) -> Dict[str, List[str]]:
+    """Bring a collection's indexes in line with ``specs``.
+
+    Indexes are matched on their keys. A missing index is created, a TTL
+    change is applied in place with ``collMod``, any other option change
+    rebuilds the index, and managed indexes no longer declared are dropped.
+    Only managed indexes are ever changed: an unmanaged index on the same
+    keys with other options is reported as a conflict and left alone.
+    Returns the names acted on per action.
+    """
+    collection = mongodb[collection_name]
+    existing = await collection.index_information()
+    by_key = {_key_of(info["key"]): (name, info) for name, info in existing.items()}
+    actions: Dict[str, List[str]] = {
+        "created": [],
+        "updated": [],
+        "dropped": [],
+        "conflicts": [],
+    }
+    kept = {"_id_"}
+
+    for spec in specs:
+        match = by_key.get(spec.keys)
+        if match is None:
+            await collection.create_index(list(spec.keys), **spec.options())
+            actions["created"].append(spec.name)
+            kept.add(spec.name)
+            continue
+
+        name, info = match
+        kept.add(name)
+        same_shape = (
+            bool(info.get("unique")) == spec.unique
+            and info.get("partialFilterExpression") == spec.partial_filter
+        )
+        ttl = info.get("expireAfterSeconds")
+        if same_shape and ttl == spec.expire_after_seconds:
+            continue
+
+        if not name.startswith(MANAGED_PREFIX):
+            actions["conflicts"].append(name)
+            continue
+
+        if same_shape and ttl is not None and spec.expire_after_seconds is not None:
+            await mongodb.command(
+                "collMod",
+                collection_name,
+                index={
+                    "keyPattern": dict(spec.keys),
+                    "expireAfterSeconds": spec.expire_after_seconds,
+                },
+            )
+            actions["updated"].append(name)
+            continue
+
+        await collection.drop_index(name)
+        await collection.create_index(list(spec.keys), **spec.options())
+        kept.discard(name)
+        kept.add(spec.name)
+        actions["updated"].append(spec.name)
+
+    for name in existing:
+        if name.startswith(MANAGED_PREFIX) and name not in kept:
+            await collection.drop_index(name)
+            actions["dropped"].append(name)
+
+    return actions
+
+
+async def reconcile_indexes(mongodb: AsyncIOMotorDatabase) -> None:
+    # Creating an index would create a missing log collection as a regular one.
+    await ensure_log_collection(mongodb)
+    for collection_name, specs in declared_indexes().items():
+        actions = await reconcile_collection(mongodb, collection_name, specs)
+        for action, names in actions.items():
+            if not names:
+                continue
+            if action == "conflicts":
+                logger.warning(
+                    f"{collection_name}: unmanaged indexes {', '.join(names)} "
+                    f"differ from the declared ones on the same keys, left as is"
+                )
+            else:
+                logger.info(f"{collection_name}: {action} indexes {', '.join(names)}")
+
+
+EPOCH = datetime(1970, 1, 1)
+
+# Representative queries of every read path, on the "logs", "rollups" or
+# "health" collection. check_query_shapes explains them against the live collections
+# so tests catch a path left without index.
+QUERY_SHAPES: Dict[str, Tuple[str, Dict[str, Any], Optional[List]]] = {
+    "logs": ("logs", {}, [("timestamp", -1), ("_id", -1)]),
+    "logs_by_service": (
+        "logs",
+        {"service_id": 1, "timestamp": {"$gte": EPOCH}},
+        [("timestamp", -1), ("_id", -1)],
+    ),
+    "logs_by_user": (
+        "logs",
+        {"user_id": 1},
+        [("timestamp", -1), ("_id", -1)],
+    ),
+    "logs_by_status": (
+        "logs",
+        {"status_code": 500},
+        [("timestamp", -1), ("_id", -1)],
+    ),
+    "logs_by_path_prefix": (
+        "logs",
+        {"path": {"$regex": "^http://users"}},
+        [("timestamp", -1), ("_id", -1)],
+    ),
+    "stats_window": ("logs", {"timestamp": {"$gte": EPOCH}}, None),
+    "service_stats": ("logs", {"service_id": 1}, None),
+    "rollups_window": ("rollups", {"minute": {"$gte": EPOCH}}, None),
+    "rollups_by_service": (
+        "rollups",
+        {"service_id": 1, "minute": {"$gte": EPOCH}},
+        None,
+    ),
+    "health_by_service": ("health", {"service_id": 1}, [("at", -1)]),
+}
+
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Every stage of a query plan, depth first."""
+    stages = [plan["stage"]] if "stage" in plan else []
+    children = list(plan.get("inputStages", []))
+    if "inputStage" in plan:
+        children.append(plan["inputStage"])
+    for child in children:
+        stages.extend(plan_stages(child))
+    return stages
+
+
+def _winning_plans(explain: Any) -> List[Dict[str, Any]]:
+    # Aggregations and time-series queries nest the planner output in stages.
+    if isinstance(explain, list):
+        return [plan for item in explain for plan in _winning_plans(item)]
+    if not isinstance(explain, dict):
+        return []
+    if "winningPlan" in explain:
+        return [explain["winningPlan"]]
+    return [plan for value in explain.values() for plan in _winning_plans(value)]
+
+
+def is_collection_scan(explain: Dict[str, Any]) -> bool:
+    return any(
+        "COLLSCAN" in plan_stages(plan.get("queryPlan", plan))
+        for plan in _winning_plans(explain)
+    )
+
+
+async def check_query_shapes(mongodb: AsyncIOMotorDatabase) -> List[str]:
+    """Names of the ``QUERY_SHAPES`` whose winning plan scans a collection."""
+    scans = []
+    collections = {
+        "logs": settings.LOG_COLLECTION,
+        "rollups": ROLLUP_COLLECTION,
+        "health": HEALTH_COLLECTION,
+    }
+    for name, (collection, query, sort) in QUERY_SHAPES.items():
+        cursor = mongodb[collections[collection]].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        if is_collection_scan(await cursor.explain()):
+            scans.append(name)
+    return scans
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import sys
+
+    from app.db.mongodb import close_mongo_connection, connect_to_mongo, get_mongodb
+
+    parser = argparse.ArgumentParser(description="Reconcile MongoDB indexes")
+    parser.add_argument(
+        "--check", action="store_true", help="report query shapes that scan"
+    )
+    args = parser.parse_args()
+
+    async def main() -> int:
+        logging.basicConfig(level=logging.INFO)
+        await connect_to_mongo()
+        try:
+            mongodb = await get_mongodb()
+            if not args.check:
+                await reconcile_indexes(mongodb)
+                return 0
+            scans = await check_query_shapes(mongodb)
+            for name in scans:
+                print(f"COLLSCAN: {name}")
+            return 1 if scans else 0
+        finally:
+            await close_mongo_connection()
+
+    sys.exit(asyncio.run(main()))
@@ -4,15 +4,24 @@ import time
 import logging
 from contextlib import asynccontextmanager
 
-from app.api.routers import admin, auth, monitoring, services
+from app.api.routers import admin, auth, metrics, monitoring, services
 from app.api.gateway import router as gateway_router
 from app.core.config import settings
 from app.core.logging import setup_logging
-from app.db.mongodb import connect_to_mongo, close_mongo_connection
+from app.db.mongodb import connect_to_mongo, close_mongo_connection, get_mongodb
+from app.db.mongo_indexes import reconcile_indexes
 from app.middleware.authentication import AuthenticationMiddleware
 from app.middleware.rate_limiting import RateLimitingMiddleware
 from app.middleware.logging import RequestLoggingMiddleware
+from app.middleware.tracing import TracingMiddleware
 from app.db.redis_client import redis_client
+from app.services.circuit_breaker import circuit_breakers
+from app.services.health_checks import health_checker
+from app.services.invalidation import invalidation_bus
+from app.services.log_writer import log_writer
+from app.services.proxy import upstream_clients
+from app.services.rate_limit import load_scripts
+from app.services.registry import service_registry
 
 setup_logging()
 logger = logging.getLogger("api_gateway")
@@ -22,9 +31,26 @@ logger = logging.getLogger("api_gateway")
 async def lifespan(app: FastAPI):
     try:
         await connect_to_mongo()
+        if settings.MONGODB_RECONCILE_INDEXES:
+            try:
+                await reconcile_indexes(await get_mongodb())
+            except Exception as e:
+                logger.error(f"Failed to reconcile MongoDB indexes: {str(e)}")
         await redis_client.connect()
+        await load_scripts()
+        await upstream_clients.start()
+        await service_registry.start()
+        await circuit_breakers.start()
+        await invalidation_bus.start()
+        await log_writer.start()
+        await health_checker.start()
         yield
     finally:
+        await health_checker.stop()
+        await log_writer.stop()
+        await invalidation_bus.stop()
+        await service_registry.stop()
+        await upstream_clients.close()
         await close_mongo_connection()
         await redis_client.close()
 
@@ -39,10 +65,12 @@ app.add_middleware(CORSMiddleware, **settings.CORS_CONFIG)
 app.add_middleware(RequestLoggingMiddleware)
 app.add_middleware(RateLimitingMiddleware)
 app.add_middleware(AuthenticationMiddleware)
+app.add_middleware(TracingMiddleware)
 
 app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(services.router, prefix="/api/services", tags=["services"])
 app.include_router(monitoring.router, prefix="/api/monitoring", tags=["monitoring"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+app.include_router(metrics.router, tags=["metrics"])
 
 app.include_router(gateway_router, prefix="/gateway")
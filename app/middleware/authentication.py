@@ -1,55 +1,47 @@
 # app/middleware/authentication.py
-from fastapi import Request, Response
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.status import HTTP_401_UNAUTHORIZED
 import logging
-import jwt
 from typing import Optional
-from jwt.exceptions import InvalidTokenError
 
-from app.core.config import settings
-from app.core.security import ALGORITHM
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-logger = logging.getLogger(__name__)
+from app.core.security import decode_access_token
+from app.core.tracing import span
+from app.middleware.paths import PathMatcher
 
+logger = logging.getLogger(__name__)
 
-class AuthenticationMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if (
-            request.url.path.startswith("/auth")
-            or request.url.path.startswith("/docs")
-            or request.url.path.startswith("/redoc")
-            or request.url.path.startswith("/openapi.json")
-        ):
-            return await call_next(request)
+EXCLUDED_PATHS = PathMatcher(prefixes=("/auth", "/docs", "/redoc", "/openapi.json"))
 
-        auth_header = request.headers.get("Authorization")
-        token = None
 
-        if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header.replace("Bearer ", "")
+class AuthenticationMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-        api_key = request.headers.get("X-API-Key")
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or EXCLUDED_PATHS(scope["path"]):
+            return await self.app(scope, receive, send)
 
-        if not token and not api_key:
-            return await call_next(request)
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                if value.startswith(b"Bearer "):
+                    token = value[7:].decode("latin-1")
+                break
 
         if token:
-            user_id = self._validate_token(token)
+            with span("auth"):
+                user_id = self._validate_token(scope, token)
             if user_id:
-                request.state.user_id = user_id
-
-        return await call_next(request)
-
-    def _validate_token(self, token: str) -> Optional[int]:
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
-            username: str = payload.get("sub")
-            if username:
-                return username
-        except InvalidTokenError as e:
-            logger.warning(f"Invalid token: {str(e)}")
+                scope.setdefault("state", {})["user_id"] = user_id
+
+        await self.app(scope, receive, send)
+
+    def _validate_token(self, scope: Scope, token: str) -> Optional[str]:
+        """Verify the token and keep its claims for get_current_user."""
+        claims = decode_access_token(token)
+        if claims is None:
+            logger.warning("Invalid token")
             return None
 
-        return None
+        scope.setdefault("state", {})["token_claims"] = claims
+        return claims.get("sub")
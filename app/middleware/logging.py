@@ -1,48 +1,80 @@
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+import json
 import logging
 import time
-from typing import Callable
-import json
+
+from starlette.datastructures import QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import REQUEST_DURATION, REQUESTS
+from app.middleware.paths import PathMatcher
+from app.services.rollups import status_class
 
 logger = logging.getLogger(__name__)
 
+EXCLUDED_PATHS = PathMatcher(
+    prefixes=("/static/", "/api/docs", "/api/redoc", "/api/openapi.json")
+)
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
 
-        try:
-            response = await call_next(request)
-            process_time = time.time() - start_time
+class RequestLoggingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-            self._log_request(request, response, process_time)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
 
-            return response
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            process_time = time.time() - start_time
             logger.exception(f"Request failed: {str(e)}")
             raise
 
-    def _log_request(self, request: Request, response: Response, process_time: float):
+        process_time = time.perf_counter() - start_time
+        self._observe(scope, status_code, process_time)
+        self._log_request(scope, status_code, process_time)
+
+    @staticmethod
+    def _observe(scope: Scope, status_code: int, process_time: float) -> None:
+        # The gateway names the service it routed to, other routes have none.
+        labels = (
+            scope.get("state", {}).get("service_name", ""),
+            scope["method"],
+            status_class(status_code),
+        )
+        REQUESTS.labels(*labels).inc()
+        REQUEST_DURATION.labels(*labels).observe(process_time)
+
+    def _log_request(self, scope: Scope, status_code: int, process_time: float):
         """Log request details."""
-        if request.url.path.startswith(
-            ("/static/", "/api/docs", "/api/redoc", "/api/openapi.json")
-        ):
+        if EXCLUDED_PATHS(scope["path"]):
             return
 
+        client = scope.get("client")
         log_dict = {
-            "method": request.method,
-            "path": request.url.path,
-            "status_code": response.status_code,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status_code": status_code,
             "duration_ms": round(process_time * 1000, 2),
-            "client_ip": request.client.host,
+            "client_ip": client[0] if client else None,
         }
 
-        if request.query_params:
-            log_dict["query_params"] = dict(request.query_params)
+        if scope["query_string"]:
+            log_dict["query_params"] = dict(QueryParams(scope["query_string"]))
 
-        if hasattr(request.state, "user_id") and request.state.user_id:
-            log_dict["user_id"] = request.state.user_id
+        state = scope.get("state", {})
+        if state.get("user_id"):
+            log_dict["user_id"] = state["user_id"]
+        if state.get("request_id"):
+            log_dict["request_id"] = state["request_id"]
 
         logger.info(json.dumps(log_dict))
@@ -0,0 +1,21 @@
+import re
+from typing import Iterable
+
+
+class PathMatcher:
+    """Matches a request path against a fixed set of exclusions in one call.
+
+    ``prefixes`` match any path starting with them and ``exact`` only the
+    path itself. Both are compiled into a single anchored regex at import
+    time instead of chaining ``startswith`` checks on every request.
+    """
+
+    def __init__(self, prefixes: Iterable[str] = (), exact: Iterable[str] = ()):
+        alternatives = [re.escape(prefix) for prefix in prefixes]
+        alternatives += [re.escape(path) + r"\Z" for path in exact]
+        # Longest first so a prefix never shadows a longer alternative.
+        alternatives.sort(key=len, reverse=True)
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    def __call__(self, path: str) -> bool:
+        return self._pattern is not None and self._pattern.match(path) is not None
@@ -1,57 +1,63 @@
-from fastapi import Request, Response
+import logging
+
+from fastapi import Request
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.status import HTTP_429_TOO_MANY_REQUESTS
-import logging
-from app.db.redis_client import redis_client
-import time
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.tracing import span
+from app.middleware.paths import PathMatcher
+from app.services.rate_limit import check_rate_limits, client_policy, get_client_id
 
 logger = logging.getLogger(__name__)
 
+EXCLUDED_PATHS = PathMatcher(
+    prefixes=(
+        "/api/docs",
+        "/api/redoc",
+        "/api/openapi.json",
+    ),
+    exact=("/api/health", "/metrics"),
+)
+
+# For a verified token the gateway checks the client limit together with the
+# service limit in a single Redis call. Other gateway requests are checked
+# here, so that ones failing authentication are still limited per client.
+GATEWAY_PATHS = PathMatcher(prefixes=("/gateway/",))
+
+
+class RateLimitingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-class RateLimitingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if (
-            request.url.path.startswith("/api/docs")
-            or request.url.path.startswith("/api/redoc")
-            or request.url.path.startswith("/api/openapi.json")
-            or request.url.path == "/api/health"
-        ):
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or EXCLUDED_PATHS(scope["path"]):
+            return await self.app(scope, receive, send)
 
-        client_id = self._get_client_id(request)
+        state = scope.setdefault("state", {})
+        if GATEWAY_PATHS(scope["path"]):
+            if state.get("user_id"):
+                return await self.app(scope, receive, send)
+            state["client_limit_checked"] = True
 
-        is_limited, retry_after = await self._is_rate_limited(client_id)
+        client_id = get_client_id(Request(scope))
+
+        with span("ratelimit"):
+            is_limited, retry_after = await self._is_rate_limited(client_id)
         if is_limited:
             headers = {"Retry-After": str(retry_after)}
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=HTTP_429_TOO_MANY_REQUESTS,
                 content={"detail": "Rate limit exceeded"},
                 headers=headers,
             )
+            return await response(scope, receive, send)
 
-        return await call_next(request)
-
-    def _get_client_id(self, request: Request) -> str:
-        if hasattr(request.state, "user_id") and request.state.user_id:
-            return f"user:{request.state.user_id}"
-
-        return f"ip:{request.client.host}"
+        await self.app(scope, receive, send)
 
     async def _is_rate_limited(self, client_id: str) -> tuple[bool, int]:
-        now = int(time.time())
-        window_key = f"ratelimit:{client_id}:{now // 60}"
-
-        if not redis_client.client:
-            return False, 0
-
-        count = await redis_client.client.incr(window_key)
-        if count == 1:
-            await redis_client.client.expire(window_key, 120)
-        limit = 120
-
-        if count > limit:
-            retry_after = 60 - (now % 60)
-            return True, retry_after
+        result = await check_rate_limits([client_policy(client_id)])
+        if result is not None:
+            return True, max(result.retry_after, 1)
 
         return False, 0
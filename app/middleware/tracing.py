@@ -0,0 +1,55 @@
+import random
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.tracing import Trace, current_trace, request_id_from
+
+
+class TracingMiddleware:
+    """Assigns every request an ID and traces a sample of them.
+
+    The request ID is taken from the incoming ``REQUEST_ID_HEADER`` when
+    present, kept in ``scope["state"]["request_id"]`` and echoed on the
+    response. A ``TRACE_SAMPLE_RATE`` share of requests also gets a
+    ``Trace`` that the stages record spans into, returned in a
+    ``Server-Timing`` header when ``TRACE_SERVER_TIMING`` is set.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.header = settings.REQUEST_ID_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                incoming = value.decode("latin-1")
+                break
+        request_id = request_id_from(incoming)
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        rate = settings.TRACE_SAMPLE_RATE
+        trace = token = None
+        if rate > 0 and (rate >= 1 or random.random() < rate):
+            trace = Trace(request_id)
+            token = current_trace.set(trace)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                # Replaces any copy an upstream echoed back through the proxy
+                headers[settings.REQUEST_ID_HEADER] = request_id
+                if trace is not None and settings.TRACE_SERVER_TIMING:
+                    headers.append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if token is not None:
+                current_trace.reset(token)
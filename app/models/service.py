@@ -18,6 +18,12 @@ class ServiceStatus(str, enum.Enum):
 	MAINTENANCE = "maintenance"
 
 
+class RateLimitAlgorithm(str, enum.Enum):
+	FIXED_WINDOW = "fixed_window"
+	GCRA = "gcra"
+	SLIDING_WINDOW_LOG = "sliding_window_log"
+
+
 class Service(Base):
 	__tablename__ = "services"
 	
@@ -32,6 +38,14 @@ class Service(Base):
 	# Rate limiting
 	rate_limit = Column(Integer, default=60)  # requests per minute
 	rate_limit_duration = Column(Integer, default=60)  # seconds
+	rate_limit_algorithm = Column(
+		Enum(RateLimitAlgorithm), default=RateLimitAlgorithm.FIXED_WINDOW
+	)
+	# Tokens leased per worker in approximate mode, unset for exact limiting
+	rate_limit_lease_size = Column(Integer, nullable=True)
+	
+	# Upstream timeout in seconds, falls back to PROXY_TIMEOUT when unset
+	timeout = Column(Integer, nullable=True)
 	
 	# Authentication/Security
 	require_authentication = Column(Boolean, default=True)
@@ -40,6 +54,14 @@ class Service(Base):
 	# Headers to forward
 	forward_headers = Column(JSON, default=list)
 	
+	# Weighted upstream targets [{"url": ..., "weight": ...}] balanced by the
+	# gateway, base_url alone is used when unset
+	targets = Column(JSON, nullable=True)
+	
+	# Request logging policy (app.schemas.service.ServiceLogPolicy), gateway
+	# defaults apply when unset
+	log_policy = Column(JSON, nullable=True)
+	
 	# Owner
 	owner_id = Column(Integer, ForeignKey("users.id"))
 	
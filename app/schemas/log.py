@@ -1,4 +1,4 @@
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Literal, Optional, List
 from datetime import datetime
 from pydantic import BaseModel, Field
 
@@ -9,10 +9,12 @@ class LogFilterParams(BaseModel):
     status_code: Optional[int] = None
     method: Optional[str] = None
     path: Optional[str] = None
+    path_mode: Literal["contains", "prefix"] = "contains"
     from_date: Optional[datetime] = None
     to_date: Optional[datetime] = None
     limit: int = 100
     skip: int = 0
+    cursor: Optional[str] = None
 
 
 class LogResponse(BaseModel):
@@ -28,7 +30,12 @@ class LogResponse(BaseModel):
     timestamp: datetime
     headers: Dict[str, str] = Field(default_factory=dict)
     query_params: Dict[str, Any] = Field(default_factory=dict)
+    request_body: Optional[str] = None
+    response_size: Optional[int] = None
     error: Optional[str] = None
+    request_id: Optional[str] = None
+    target: Optional[str] = None
+    spans: Optional[List[Dict[str, Any]]] = None
 
     class Config:
         populate_by_name = True
@@ -39,5 +46,8 @@ class LogStatsResponse(BaseModel):
     average_response_time: float
     success_rate: float
     requests_per_minute: float
+    p50_response_time: float = 0.0
+    p95_response_time: float = 0.0
+    p99_response_time: float = 0.0
     top_endpoints: List[Dict[str, Any]]
     status_code_distribution: Dict[str, int]
\ No newline at end of file
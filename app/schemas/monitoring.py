@@ -0,0 +1,40 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class UpstreamPoolStats(BaseModel):
+    origin: str
+    http2: bool
+    connections: Optional[int] = None  # None when the pool cannot be inspected
+    in_use: Optional[int] = None
+    idle: Optional[int] = None
+    waiting: Optional[int] = None
+    total_requests: int
+
+
+class CacheStats(BaseModel):
+    size: int
+    hits: int
+    misses: int
+    hit_ratio: float
+    invalidations: int = 0
+    age_seconds: Optional[float] = None
+    coalesced: Optional[int] = None  # requests that shared a computation
+    in_flight: Optional[int] = None
+
+
+class LogPipelineStats(BaseModel):
+    running: bool
+    queue_depth: int
+    queue_capacity: int
+    overflow_policy: str
+    enqueued: int
+    dropped: int
+    written: int
+    duplicates: int = 0  # already stored, from batches written twice
+    failed: int
+    sampled_out: int = 0
+    batches: int
+    spilling: bool = False
+    spilled: int = 0
+    replayed: int = 0
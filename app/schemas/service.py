@@ -2,7 +2,31 @@ from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field, field_validator
 
-from app.models.service import ServiceType, ServiceStatus
+from app.models.service import RateLimitAlgorithm, ServiceType, ServiceStatus
+
+
+class ServiceLogPolicy(BaseModel):
+    # Header names stored with each log, None for LOG_HEADER_ALLOWLIST and
+    # ["*"] for all. Authorization, X-API-Key and cookies are always redacted.
+    headers: Optional[List[str]] = None
+    redact_headers: List[str] = Field(default_factory=list)
+    query_params: bool = True
+    redact_query_params: List[str] = Field(default_factory=list)
+    # None falls back to LOG_SUCCESS_SAMPLE_RATE / LOG_SLOW_REQUEST_MS
+    success_sample_rate: Optional[float] = Field(None, ge=0, le=1)
+    slow_request_ms: Optional[float] = Field(None, ge=0)
+    max_body_bytes: int = Field(0, ge=0)
+
+
+class ServiceTarget(BaseModel):
+    url: str
+    weight: int = Field(1, ge=1, le=1000)
+
+    @field_validator("url")
+    def url_must_be_valid(cls, v):
+        if not v.startswith(("http://", "https://", "grpc://")):
+            raise ValueError("url must be a valid URL")
+        return v
 
 
 class ServiceBase(BaseModel):
@@ -14,9 +38,15 @@ class ServiceBase(BaseModel):
     is_public: bool = False
     rate_limit: int = 60
     rate_limit_duration: int = 60
+    rate_limit_algorithm: RateLimitAlgorithm = RateLimitAlgorithm.FIXED_WINDOW
+    rate_limit_lease_size: Optional[int] = Field(None, ge=0)
+    timeout: Optional[int] = Field(None, gt=0)
     require_authentication: bool = True
     auth_header_name: Optional[str] = None
     forward_headers: List[str] = Field(default_factory=list)
+    log_policy: Optional[ServiceLogPolicy] = None
+    # Load balanced instead of base_url when set
+    targets: Optional[List[ServiceTarget]] = None
 
     @field_validator("base_url")
     def base_url_must_be_valid(cls, v):
@@ -38,9 +68,14 @@ class ServiceUpdate(BaseModel):
     is_public: Optional[bool] = None
     rate_limit: Optional[int] = None
     rate_limit_duration: Optional[int] = None
+    rate_limit_algorithm: Optional[RateLimitAlgorithm] = None
+    rate_limit_lease_size: Optional[int] = Field(None, ge=0)
+    timeout: Optional[int] = Field(None, gt=0)
     require_authentication: Optional[bool] = None
     auth_header_name: Optional[str] = None
     forward_headers: Optional[List[str]] = None
+    log_policy: Optional[ServiceLogPolicy] = None
+    targets: Optional[List[ServiceTarget]] = None
 
 
 class ServiceInDBBase(ServiceBase):
@@ -57,7 +92,63 @@ class Service(ServiceInDBBase):
     pass
 
 
+class CircuitBreakerStatus(BaseModel):
+    state: str = "closed"
+    requests: int = 0  # in the rolling window of this worker
+    failure_rate: float = 0.0
+    slow_call_rate: float = 0.0
+    retry_after: int = 0  # seconds until half open
+    trips: int = 0
+
+
+class TargetStatus(BaseModel):
+    url: str
+    weight: int
+    inflight: int = 0
+    ewma_ms: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    ejected: bool = False
+    ejections: int = 0
+    healthy: bool = True
+
+
 class ServiceWithStats(Service):
     total_requests: int = 0
     success_rate: float = 0.0
     avg_response_time: float = 0.0
+    p50_response_time: float = 0.0
+    p95_response_time: float = 0.0
+    p99_response_time: float = 0.0
+    circuit: CircuitBreakerStatus = Field(default_factory=CircuitBreakerStatus)
+    # Per-target balancing stats of this worker
+    target_stats: List[TargetStatus] = Field(default_factory=list)
+
+
+class HealthProbe(BaseModel):
+    at: datetime
+    ok: bool
+    latency_ms: float
+    detail: str  # status code or exception name
+
+
+class TargetHealthStatus(BaseModel):
+    url: str
+    healthy: bool
+    changed_at: Optional[datetime] = None
+    history: List[HealthProbe] = Field(default_factory=list)
+
+
+class HealthTransition(BaseModel):
+    url: str
+    healthy: bool
+    detail: str
+    at: datetime
+
+
+class ServiceHealth(BaseModel):
+    service_id: int
+    checks_enabled: bool
+    # Probes of this worker, most recent last
+    targets: List[TargetHealthStatus] = Field(default_factory=list)
+    transitions: List[HealthTransition] = Field(default_factory=list)
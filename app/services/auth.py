@@ -53,7 +53,7 @@ async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
 
 
 async def update_user(db: AsyncSession, user: User, user_in: UserUpdate) -> User:
-    from app.core.security import get_password_hash
+    from app.core.security import get_password_hash, invalidate_user
 
     if user_in.email is not None:
         user.email = user_in.email
@@ -68,19 +68,25 @@ async def update_user(db: AsyncSession, user: User, user_in: UserUpdate) -> User
 
     await db.commit()
     await db.refresh(user)
+    await invalidate_user(user.id)
     return user
 
 
 async def delete_user(db: AsyncSession, user_id: int) -> bool:
+    from app.core.security import invalidate_user
+
     stmt = delete(User).where(User.id == user_id)
     result = await db.execute(stmt)
     await db.commit()
+    await invalidate_user(user_id)
     return result.rowcount > 0
 
 
 async def create_api_key(
     db: AsyncSession, user_id: int, api_key_in: APIKeyCreate, api_key_value: str
 ) -> APIKey:
+    from app.core.security import invalidate_api_key
+
     expires_at = (
         datetime.fromisoformat(api_key_in.expires_at) if api_key_in.expires_at else None
     )
@@ -95,6 +101,7 @@ async def create_api_key(
     db.add(api_key)
     await db.commit()
     await db.refresh(api_key)
+    await invalidate_api_key(api_key_value)
     return api_key
 
 
@@ -121,6 +128,8 @@ async def get_api_key(db: AsyncSession, api_key: str) -> Optional[APIKey]:
 
 
 async def deactivate_api_key(db: AsyncSession, api_key_id: int, user_id: int) -> bool:
+    from app.core.security import invalidate_api_key
+
     query = select(APIKey).where(APIKey.id == api_key_id, APIKey.user_id == user_id)
     result = await db.execute(query)
     api_key = result.scalars().first()
@@ -130,4 +139,5 @@ async def deactivate_api_key(db: AsyncSession, api_key_id: int, user_id: int) ->
 
     api_key.is_active = False
     await db.commit()
+    await invalidate_api_key(api_key.key)
     return True
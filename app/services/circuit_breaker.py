@@ -0,0 +1,230 @@
+import enum
+import logging
+import math
+import time
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.errors import ServiceUnavailableError
+from app.db.redis_client import redis_client
+from app.services.invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, enum.Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Breaker of one service over a rolling window of upstream outcomes.
+
+    The last ``CIRCUIT_WINDOW`` seconds are split into ``CIRCUIT_BUCKETS``
+    buckets of (requests, failures, slow calls), recycled as time moves on.
+    Once the window holds ``CIRCUIT_MIN_REQUESTS`` requests, a failure rate
+    of ``CIRCUIT_FAILURE_RATE`` or a slow call rate of ``CIRCUIT_SLOW_RATE``
+    opens the breaker for ``CIRCUIT_OPEN_SECONDS``. It then goes half open
+    and lets ``CIRCUIT_HALF_OPEN_REQUESTS`` probes through: one failing or
+    slow probe opens it again, all of them succeeding closes it.
+
+    ``opened_until`` is wall clock time so it can be shared across workers.
+    """
+
+    def __init__(self):
+        self.state = CircuitState.CLOSED
+        self.opened_until = 0.0
+        self.trips = 0
+        self._width = settings.CIRCUIT_WINDOW / settings.CIRCUIT_BUCKETS
+        self._ticks = [-1] * settings.CIRCUIT_BUCKETS
+        self._buckets = [[0, 0, 0] for _ in range(settings.CIRCUIT_BUCKETS)]
+        self._probes = 0
+        self._probe_successes = 0
+
+    def allow(self, now: float) -> Optional[float]:
+        """None when a request may go upstream, else seconds to wait."""
+        if self.state is CircuitState.OPEN:
+            if now < self.opened_until:
+                return self.opened_until - now
+            self.state = CircuitState.HALF_OPEN
+            self._probes = self._probe_successes = 0
+
+        if self.state is CircuitState.HALF_OPEN:
+            if self._probes >= settings.CIRCUIT_HALF_OPEN_REQUESTS:
+                if now < self.opened_until + settings.CIRCUIT_OPEN_SECONDS:
+                    return 1.0
+                # Probes that never reported back, let new ones through
+                self._probes = self._probe_successes = 0
+            self._probes += 1
+        return None
+
+    def record(
+        self, failed: bool, latency_ms: float, now: float
+    ) -> Optional[CircuitState]:
+        """Count an outcome and return the new state if it changed."""
+        slow = latency_ms >= settings.CIRCUIT_SLOW_CALL_MS
+        if self.state is CircuitState.HALF_OPEN:
+            if failed or slow:
+                self.open(now + settings.CIRCUIT_OPEN_SECONDS)
+                return self.state
+            self._probe_successes += 1
+            if self._probe_successes >= settings.CIRCUIT_HALF_OPEN_REQUESTS:
+                self.close()
+                return self.state
+            return None
+        if self.state is CircuitState.OPEN:
+            # Sent before the breaker opened
+            return None
+
+        bucket = self._bucket(time.monotonic())
+        bucket[0] += 1
+        bucket[1] += failed
+        bucket[2] += slow
+
+        requests, failures, slow_calls = self.totals()
+        if requests >= settings.CIRCUIT_MIN_REQUESTS and (
+            failures >= requests * settings.CIRCUIT_FAILURE_RATE
+            or slow_calls >= requests * settings.CIRCUIT_SLOW_RATE
+        ):
+            self.open(now + settings.CIRCUIT_OPEN_SECONDS)
+            return self.state
+        return None
+
+    def open(self, until: float) -> None:
+        if self.state is not CircuitState.OPEN:
+            self.trips += 1
+        self.state = CircuitState.OPEN
+        self.opened_until = until
+        self._reset_window()
+
+    def close(self) -> None:
+        self.state = CircuitState.CLOSED
+        self.opened_until = 0.0
+        self._reset_window()
+
+    def totals(self) -> List[int]:
+        tick = int(time.monotonic() / self._width)
+        totals = [0, 0, 0]
+        for bucket_tick, bucket in zip(self._ticks, self._buckets):
+            if tick - bucket_tick < len(self._buckets):
+                totals[0] += bucket[0]
+                totals[1] += bucket[1]
+                totals[2] += bucket[2]
+        return totals
+
+    def _bucket(self, monotonic: float) -> List[int]:
+        tick = int(monotonic / self._width)
+        index = tick % len(self._buckets)
+        bucket = self._buckets[index]
+        if self._ticks[index] != tick:
+            self._ticks[index] = tick
+            bucket[0] = bucket[1] = bucket[2] = 0
+        return bucket
+
+    def _reset_window(self) -> None:
+        self._ticks = [-1] * len(self._buckets)
+
+
+class CircuitBreakerRegistry:
+    """Per-worker breakers of every service, kept in step across workers.
+
+    A worker that opens a breaker stores ``opened_until`` under
+    ``circuit:<service id>`` in Redis, expiring with it, and announces it on
+    the invalidation bus. So does a worker whose probes close the breaker,
+    by deleting the key. The others then load the key and adopt the state.
+    Outcomes themselves are counted per worker.
+    """
+
+    TOPIC = "circuit"
+    KEY_PREFIX = "circuit:"
+
+    def __init__(self):
+        self._breakers: Dict[int, CircuitBreaker] = {}
+
+    async def start(self) -> None:
+        invalidation_bus.subscribe(self.TOPIC, self._on_invalidation, self.load)
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Failed to load circuit breaker states: {str(e)}")
+
+    async def load(self) -> None:
+        """Adopt every breaker currently open in Redis."""
+        if not redis_client.client:
+            return
+        async for key in redis_client.client.scan_iter(match=f"{self.KEY_PREFIX}*"):
+            await self._on_invalidation(key[len(self.KEY_PREFIX) :])
+
+    def get(self, service_id: int) -> CircuitBreaker:
+        breaker = self._breakers.get(service_id)
+        if breaker is None:
+            breaker = self._breakers[service_id] = CircuitBreaker()
+        return breaker
+
+    def forget(self, service_id: int) -> None:
+        self._breakers.pop(service_id, None)
+
+    def check(self, service) -> None:
+        """Raise ``ServiceUnavailableError`` while the service's breaker is open."""
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            return
+        wait = self.get(service.id).allow(time.time())
+        if wait is not None:
+            retry_after = max(math.ceil(wait), 1)
+            raise ServiceUnavailableError(
+                detail=f"Service '{service.name}' is unavailable, circuit breaker is open",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    async def record(self, service_id: int, failed: bool, latency_ms: float) -> None:
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            return
+        breaker = self.get(service_id)
+        state = breaker.record(failed, latency_ms, time.time())
+        if state is not None:
+            logger.warning(f"Circuit breaker of service {service_id} is {state.value}")
+            await self._share(service_id, breaker)
+
+    def status(self, service_id: int) -> Dict:
+        breaker = self._breakers.get(service_id) or CircuitBreaker()
+        requests, failures, slow_calls = breaker.totals()
+        return {
+            "state": breaker.state.value,
+            "requests": requests,
+            "failure_rate": round(failures / requests, 4) if requests else 0.0,
+            "slow_call_rate": round(slow_calls / requests, 4) if requests else 0.0,
+            "retry_after": (
+                max(math.ceil(breaker.opened_until - time.time()), 0)
+                if breaker.state is CircuitState.OPEN
+                else 0
+            ),
+            "trips": breaker.trips,
+        }
+
+    async def _share(self, service_id: int, breaker: CircuitBreaker) -> None:
+        if not redis_client.client:
+            return
+        key = f"{self.KEY_PREFIX}{service_id}"
+        try:
+            if breaker.state is CircuitState.OPEN:
+                ttl = max(math.ceil(breaker.opened_until - time.time()), 1)
+                await redis_client.client.set(key, breaker.opened_until, ex=ttl)
+            else:
+                await redis_client.client.delete(key)
+        except Exception as e:
+            logger.error(f"Failed to share circuit breaker {service_id}: {str(e)}")
+            return
+        await invalidation_bus.publish(self.TOPIC, service_id)
+
+    async def _on_invalidation(self, key: str) -> None:
+        service_id = int(key)
+        opened_until = await redis_client.client.get(f"{self.KEY_PREFIX}{service_id}")
+        breaker = self.get(service_id)
+        if opened_until is not None:
+            breaker.open(float(opened_until))
+        elif breaker.state is not CircuitState.CLOSED:
+            breaker.close()
+
+
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,243 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.db.mongo_indexes import HEALTH_COLLECTION
+from app.db.mongodb import get_mongodb
+from app.services.load_balancer import load_balancer
+from app.services.proxy import upstream_clients
+from app.services.registry import service_registry
+from app.services.routing import upstream_url
+
+logger = logging.getLogger(__name__)
+
+TargetKey = Tuple[int, str]
+
+
+class TargetHealth:
+    """Health of one service target, with its most recent probes.
+
+    A target turns unhealthy after ``HEALTH_CHECK_UNHEALTHY_THRESHOLD``
+    failed probes in a row and healthy again after
+    ``HEALTH_CHECK_HEALTHY_THRESHOLD`` successful ones.
+    """
+
+    __slots__ = ("service_id", "url", "healthy", "streak", "history", "changed_at")
+
+    def __init__(self, service_id: int, url: str):
+        self.service_id = service_id
+        self.url = url
+        self.healthy = True
+        self.streak = 0  # probes in a row disagreeing with ``healthy``
+        self.history: Deque[Dict[str, Any]] = deque(
+            maxlen=settings.HEALTH_CHECK_HISTORY
+        )
+        self.changed_at: Optional[datetime] = None
+
+    def record(self, ok: bool, latency_ms: float, detail: str) -> bool:
+        """Add a probe result and return whether the health changed."""
+        self.history.append(
+            {
+                "at": datetime.utcnow(),
+                "ok": ok,
+                "latency_ms": round(latency_ms, 2),
+                "detail": detail,
+            }
+        )
+        if ok == self.healthy:
+            self.streak = 0
+            return False
+
+        self.streak += 1
+        threshold = (
+            settings.HEALTH_CHECK_HEALTHY_THRESHOLD
+            if ok
+            else settings.HEALTH_CHECK_UNHEALTHY_THRESHOLD
+        )
+        if self.streak < threshold:
+            return False
+        self.healthy = ok
+        self.streak = 0
+        self.changed_at = datetime.utcnow()
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "changed_at": self.changed_at,
+            "history": list(self.history),
+        }
+
+
+class HealthChecker:
+    """Probes every target of every active service in the background.
+
+    Probes are kept in a heap ordered by due time, so the scheduler only
+    ever looks at the next one whatever the number of targets. Each target
+    is first scheduled at a random offset within ``HEALTH_CHECK_INTERVAL``
+    and then every interval give or take ``HEALTH_CHECK_JITTER``, which
+    spreads probes evenly instead of firing them in bursts. At most
+    ``HEALTH_CHECK_CONCURRENCY`` probes run at once; beyond that the
+    scheduler waits for a slot.
+
+    Verdicts go to the load balancer, which skips unhealthy targets, and
+    every change of health is stored in ``health_transitions``.
+    """
+
+    # Seconds between syncs of the probed targets with the service registry
+    SYNC_INTERVAL = 5.0
+
+    def __init__(self):
+        self._targets: Dict[TargetKey, TargetHealth] = {}
+        self._heap: List[Tuple[float, int, TargetKey]] = []
+        self._sequence = 0
+        self._task: Optional[asyncio.Task] = None
+        self._probes: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.probes = 0
+
+    async def start(self) -> None:
+        if settings.HEALTH_CHECK_ENABLED and self._task is None:
+            self._semaphore = asyncio.Semaphore(settings.HEALTH_CHECK_CONCURRENCY)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        for probe in list(self._probes):
+            probe.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def status(self, service_id: int) -> List[Dict[str, Any]]:
+        return [
+            health.status()
+            for (owner, _), health in self._targets.items()
+            if owner == service_id
+        ]
+
+    def sync(self, now: float) -> None:
+        """Start probing new targets and forget the ones that went away."""
+        current: Set[TargetKey] = set()
+        for service in service_registry.all():
+            if service.status != "active":
+                continue
+            for url, _ in service.upstream_targets:
+                current.add((service.id, url))
+
+        for key in current - self._targets.keys():
+            self._targets[key] = TargetHealth(*key)
+            self._schedule(key, now + random.uniform(0, settings.HEALTH_CHECK_INTERVAL))
+        for key in self._targets.keys() - current:
+            # Its heap entry is dropped when it comes due
+            del self._targets[key]
+            load_balancer.mark(*key, healthy=True)
+
+    def _schedule(self, key: TargetKey, due: float) -> None:
+        self._sequence += 1
+        heapq.heappush(self._heap, (due, self._sequence, key))
+
+    def _next_due(self, due: float, now: float) -> float:
+        interval = settings.HEALTH_CHECK_INTERVAL
+        jitter = interval * settings.HEALTH_CHECK_JITTER
+        # Keep the cadence from the planned time unless we fell behind
+        return max(due, now - interval) + interval + random.uniform(-jitter, jitter)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_sync = 0.0
+        while True:
+            now = loop.time()
+            if now >= next_sync:
+                try:
+                    self.sync(now)
+                except Exception as e:
+                    logger.error(f"Failed to sync health checks: {str(e)}")
+                next_sync = now + self.SYNC_INTERVAL
+
+            if not self._heap or self._heap[0][0] > now:
+                wake = self._heap[0][0] if self._heap else next_sync
+                await asyncio.sleep(max(min(wake, next_sync) - now, 0))
+                continue
+
+            due, _, key = heapq.heappop(self._heap)
+            health = self._targets.get(key)
+            if health is None:
+                continue
+            self._schedule(key, self._next_due(due, now))
+
+            await self._semaphore.acquire()
+            probe = asyncio.create_task(self._probe(health))
+            self._probes.add(probe)
+            probe.add_done_callback(self._probe_done)
+
+    def _probe_done(self, probe: asyncio.Task) -> None:
+        self._probes.discard(probe)
+        self._semaphore.release()
+
+    async def _probe(self, health: TargetHealth) -> None:
+        self.probes += 1
+        url = upstream_url(health.url, settings.HEALTH_CHECK_PATH.lstrip("/"))
+        started = time.perf_counter()
+        try:
+            client = upstream_clients.get_client(health.url, count=False)
+            response = await client.get(url, timeout=settings.HEALTH_CHECK_TIMEOUT)
+            ok = response.status_code < 400
+            detail = str(response.status_code)
+        except Exception as e:
+            ok = False
+            detail = type(e).__name__
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        if not health.record(ok, latency_ms, detail):
+            return
+        if self._targets.get((health.service_id, health.url)) is not health:
+            return  # removed while probing
+        logger.warning(
+            f"Target {health.url} of service {health.service_id} is "
+            f"{'healthy' if health.healthy else 'unhealthy'} ({detail})"
+        )
+        load_balancer.mark(health.service_id, health.url, health.healthy)
+        await self._store_transition(health, detail)
+
+    async def _store_transition(self, health: TargetHealth, detail: str) -> None:
+        try:
+            mongodb = await get_mongodb()
+            await mongodb[HEALTH_COLLECTION].insert_one(
+                {
+                    "service_id": health.service_id,
+                    "url": health.url,
+                    "healthy": health.healthy,
+                    "detail": detail,
+                    "at": health.changed_at,
+                }
+            )
+        except Exception as e:
+            logger.error(f"Failed to store health transition: {str(e)}")
+
+
+async def get_health_transitions(
+    service_id: int, limit: int = 50
+) -> List[Dict[str, Any]]:
+    mongodb = await get_mongodb()
+    cursor = (
+        mongodb[HEALTH_COLLECTION]
+        .find({"service_id": service_id}, {"_id": 0})
+        .sort("at", -1)
+        .limit(limit)
+    )
+    return await cursor.to_list(limit)
+
+
+health_checker = HealthChecker()
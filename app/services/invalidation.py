@@ -0,0 +1,102 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.db.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str], Awaitable[None]]
+ResyncHandler = Callable[[], Awaitable[None]]
+
+
+class InvalidationBus:
+    """Fan-out of cache invalidations to every worker over Redis pub/sub.
+
+    Messages carry a topic and a key. Each worker ignores its own messages,
+    since the publisher already updated its local state. When the
+    subscription drops, resync handlers run after reconnecting because
+    messages published in the meantime are lost.
+    """
+
+    CHANNEL = "gateway:invalidations"
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._resync_handlers: List[ResyncHandler] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(
+        self, topic: str, handler: Handler, resync: Optional[ResyncHandler] = None
+    ) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+        if resync:
+            self._resync_handlers.append(resync)
+
+    async def publish(self, topic: str, key) -> None:
+        if not redis_client.client:
+            return
+        message = json.dumps({"topic": topic, "key": str(key), "from": self.worker_id})
+        try:
+            await redis_client.client.publish(self.CHANNEL, message)
+        except Exception as e:
+            logger.error(f"Failed to publish invalidation {topic}:{key}: {str(e)}")
+
+    async def start(self) -> None:
+        if redis_client.client and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        reconnecting = False
+        while True:
+            pubsub = redis_client.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                if reconnecting:
+                    await self._resync()
+                    reconnecting = False
+                async for message in pubsub.listen():
+                    await self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Invalidation subscription failed: {str(e)}")
+                reconnecting = True
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+    async def _dispatch(self, data: str) -> None:
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if message.get("from") == self.worker_id:
+            return
+        for handler in self._handlers.get(message.get("topic"), []):
+            try:
+                await handler(message.get("key"))
+            except Exception as e:
+                logger.error(f"Invalidation handler failed: {str(e)}")
+
+    async def _resync(self) -> None:
+        for handler in self._resync_handlers:
+            try:
+                await handler()
+            except Exception as e:
+                logger.error(f"Invalidation resync failed: {str(e)}")
+
+
+invalidation_bus = InvalidationBus()
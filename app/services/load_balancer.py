@@ -0,0 +1,233 @@
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from app.core.config import settings
+
+Targets = Tuple[Tuple[str, int], ...]
+
+
+class Target:
+    """One upstream of a service and what the balancer knows about it."""
+
+    __slots__ = (
+        "url",
+        "weight",
+        "inflight",
+        "ewma_ms",
+        "requests",
+        "failures",
+        "consecutive_failures",
+        "ejections",
+        "ejected_until",
+        "healthy",
+    )
+
+    def __init__(self, url: str, weight: int):
+        self.url = url
+        self.weight = weight
+        self.inflight = 0
+        self.ewma_ms = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.healthy = True  # from the active health checks
+
+    def available(self, now: float) -> bool:
+        return self.healthy and self.ejected_until <= now
+
+    def cost(self) -> float:
+        # Unknown latency counts as 1 ms so new targets get probed quickly
+        return (self.inflight + 1) * (self.ewma_ms or 1.0)
+
+    def status(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "inflight": self.inflight,
+            "ewma_ms": round(self.ewma_ms, 2),
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.ejected_until > now,
+            "ejections": self.ejections,
+            "healthy": self.healthy,
+        }
+
+
+def build_alias_table(weights: Sequence[int]) -> Tuple[List[float], List[int]]:
+    """Vose's alias tables to draw an index proportionally to ``weights``."""
+    count = len(weights)
+    total = sum(weights)
+    scaled = [weight * count / total for weight in weights]
+    probability = [1.0] * count
+    alias = list(range(count))
+    small = [i for i, value in enumerate(scaled) if value < 1]
+    large = [i for i, value in enumerate(scaled) if value >= 1]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        probability[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1 - scaled[less]
+        (small if scaled[more] < 1 else large).append(more)
+    return probability, alias
+
+
+class TargetPool:
+    """Weighted power-of-two-choices over a service's targets.
+
+    Each pick draws two targets in proportion to their weights with the
+    alias method and keeps the one with the lower ``(inflight + 1) * EWMA
+    latency``, so a request costs O(1) whatever the number of targets.
+    ``LB_EJECT_CONSECUTIVE_FAILURES`` failures in a row eject a target for
+    ``LB_EJECT_SECONDS``, unless it is the last one available. Targets
+    failing their active health checks are skipped the same way. Only when
+    redraws keep hitting unavailable targets does a pick scan the pool. When
+    every target is out, a pick fails open on the targets that were only
+    ejected, but never returns one the health checks marked down: with no
+    healthy target left there is nothing to pick.
+    """
+
+    def __init__(self, targets: Targets):
+        self.key = targets
+        self.targets = [Target(url, weight) for url, weight in targets]
+        self._probability, self._alias = build_alias_table(
+            [weight for _, weight in targets]
+        )
+
+    def _draw(self) -> Target:
+        index = int(random.random() * len(self.targets))
+        if random.random() >= self._probability[index]:
+            index = self._alias[index]
+        return self.targets[index]
+
+    @property
+    def healthy(self) -> bool:
+        return any(target.healthy for target in self.targets)
+
+    def pick(self) -> Optional[Target]:
+        """The target for the next request, None when all are marked down."""
+        if len(self.targets) == 1:
+            target = self.targets[0]
+            return target if target.healthy else None
+
+        now = time.monotonic()
+        first, second = self._draw(), self._draw()
+        for _ in range(2):
+            if first.available(now) and second.available(now):
+                return first if first.cost() <= second.cost() else second
+            # Redraw unavailable candidates a bounded number of times
+            if not first.available(now):
+                first = self._draw()
+            if not second.available(now):
+                second = self._draw()
+        if first.available(now):
+            return first
+        if second.available(now):
+            return second
+
+        # Most targets are out, fall back to a scan
+        available = [target for target in self.targets if target.available(now)]
+        if available:
+            return min(available, key=Target.cost)
+        healthy = [target for target in self.targets if target.healthy]
+        if not healthy:
+            return None
+        return min(healthy, key=lambda target: target.ejected_until)
+
+    def acquire(self) -> Optional[Target]:
+        target = self.pick()
+        if target is not None:
+            target.inflight += 1
+        return target
+
+    def release(self, target: Target, failed: bool, latency_ms: float) -> None:
+        target.inflight -= 1
+        target.requests += 1
+        alpha = settings.LB_EWMA_ALPHA
+        if target.ewma_ms:
+            target.ewma_ms += alpha * (latency_ms - target.ewma_ms)
+        else:
+            target.ewma_ms = latency_ms
+        if not failed:
+            target.consecutive_failures = 0
+            return
+
+        target.failures += 1
+        target.consecutive_failures += 1
+        if target.consecutive_failures >= settings.LB_EJECT_CONSECUTIVE_FAILURES:
+            self._eject(target)
+
+    def _eject(self, target: Target) -> None:
+        now = time.monotonic()
+        others = [t for t in self.targets if t is not target and t.available(now)]
+        if not others:
+            return
+        target.consecutive_failures = 0
+        target.ejections += 1
+        target.ejected_until = now + settings.LB_EJECT_SECONDS
+
+
+class LoadBalancer:
+    """Target pools of every service, rebuilt when its targets change.
+
+    Health check verdicts are kept here too, so a pool built after a
+    target went down starts with it marked unhealthy.
+    """
+
+    def __init__(self):
+        self._pools: Dict[int, TargetPool] = {}
+        self._unhealthy: Set[Tuple[int, str]] = set()
+
+    def mark(self, service_id: int, url: str, healthy: bool) -> None:
+        if healthy:
+            self._unhealthy.discard((service_id, url))
+        else:
+            self._unhealthy.add((service_id, url))
+        pool = self._pools.get(service_id)
+        if pool is not None:
+            for target in pool.targets:
+                if target.url == url:
+                    target.healthy = healthy
+
+    def forget(self, service_id: int) -> None:
+        """Drop the pool and health verdicts of a deleted service."""
+        self._pools.pop(service_id, None)
+        self._unhealthy = {key for key in self._unhealthy if key[0] != service_id}
+
+    def pool(self, service) -> TargetPool:
+        targets = service.upstream_targets
+        pool = self._pools.get(service.id)
+        if pool is None or pool.key is not targets:
+            if pool is None or pool.key != targets:
+                pool = self._pools[service.id] = self._new_pool(service.id, targets)
+            else:
+                # Same targets in a reloaded snapshot, keep the stats
+                pool.key = targets
+        return pool
+
+    def status(self, service_id: int, targets: Targets) -> List[Dict[str, Any]]:
+        pool = self._pools.get(service_id)
+        if pool is None or pool.key != targets:
+            pool = self._new_pool(service_id, targets)
+        now = time.monotonic()
+        return [target.status(now) for target in pool.targets]
+
+    def _new_pool(self, service_id: int, targets: Targets) -> TargetPool:
+        pool = TargetPool(targets)
+        for target in pool.targets:
+            target.healthy = (service_id, target.url) not in self._unhealthy
+        return pool
+
+
+def upstream_targets(service) -> Targets:
+    """``(url, weight)`` of each target, ``base_url`` alone when none are set."""
+    if service.targets:
+        return tuple(
+            (target["url"], int(target.get("weight", 1))) for target in service.targets
+        )
+    return ((service.base_url, 1),)
+
+
+load_balancer = LoadBalancer()
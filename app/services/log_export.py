@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Literal, Sequence
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.db.log_storage import log_collection
+from app.schemas.log import LogFilterParams
+from app.services.log_service import build_log_query
+
+ExportFormat = Literal["ndjson", "csv"]
+
+EXPORT_FIELDS = (
+    "_id",
+    "timestamp",
+    "method",
+    "path",
+    "status_code",
+    "response_time",
+    "client_ip",
+    "user_id",
+    "api_key_id",
+    "service_id",
+    "response_size",
+    "error",
+    "request_id",
+    "target",
+    "headers",
+    "query_params",
+    "request_body",
+    "spans",
+)
+DEFAULT_EXPORT_FIELDS = EXPORT_FIELDS[:14]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Bytes of encoded rows gathered before a chunk is sent.
+CHUNK_SIZE = 64 * 1024
+CURSOR_BATCH_SIZE = 1000
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class _Encoder:
+    def __init__(self, export_format: ExportFormat, fields: Sequence[str]):
+        self.export_format = export_format
+        self.fields = fields
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer) if export_format == "csv" else None
+
+    def header(self) -> None:
+        if self._csv:
+            self._csv.writerow(self.fields)
+
+    def row(self, log: Dict[str, Any]) -> None:
+        if self._csv:
+            self._csv.writerow([_csv_value(log.get(field)) for field in self.fields])
+        else:
+            self._buffer.write(json.dumps(log, default=_json_default))
+            self._buffer.write("\n")
+
+    def size(self) -> int:
+        return self._buffer.tell()
+
+    def take(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+async def export_logs(
+    mongodb: AsyncIOMotorDatabase,
+    filter_params: LogFilterParams,
+    export_format: ExportFormat = "ndjson",
+    fields: Sequence[str] = DEFAULT_EXPORT_FIELDS,
+    compress: bool = False,
+) -> AsyncIterator[bytes]:
+    """Stream the logs matching ``filter_params`` as NDJSON or CSV.
+
+    Only ``fields`` are read from Mongo. Logs are encoded batch by batch
+    straight off the cursor into chunks of about ``CHUNK_SIZE`` bytes,
+    gzipped on the fly when ``compress`` is set, so memory stays flat
+    whatever the export size. ``filter_params.limit`` of 0 exports
+    everything.
+    """
+    projection = {field: 1 for field in fields}
+    if "_id" not in projection:
+        projection["_id"] = 0
+
+    cursor = (
+        log_collection(mongodb)
+        .find(build_log_query(filter_params), projection)
+        .sort([("timestamp", -1), ("_id", -1)])
+        .batch_size(CURSOR_BATCH_SIZE)
+    )
+    if filter_params.limit:
+        cursor = cursor.limit(filter_params.limit)
+
+    encoder = _Encoder(export_format, fields)
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def emit(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    encoder.header()
+    async for log in cursor:
+        encoder.row(log)
+        if encoder.size() >= CHUNK_SIZE:
+            chunk = emit(encoder.take())
+            if chunk:
+                yield chunk
+
+    chunk = emit(encoder.take())
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
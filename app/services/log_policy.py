@@ -0,0 +1,89 @@
+import random
+from typing import Any, Dict, Mapping, Optional
+
+from app.core.config import settings
+
+REDACTED = "[REDACTED]"
+
+# Credentials are never written to logs, whatever a service allows.
+ALWAYS_REDACTED = frozenset(
+    {"authorization", "proxy-authorization", "x-api-key", "cookie", "set-cookie"}
+)
+
+
+class LogPolicy:
+    """A service's ``log_policy`` compiled for the request path.
+
+    Built once per service snapshot: header names are lowercased into sets,
+    defaults are resolved from the settings and the checks made per request
+    are plain set lookups and comparisons.
+
+    Sampling only thins the stored raw logs. Every request still feeds the
+    rollups, so stats read from them stay exact.
+    """
+
+    __slots__ = (
+        "allow_all_headers",
+        "headers",
+        "redact_headers",
+        "query_params",
+        "redact_query_params",
+        "success_sample_rate",
+        "slow_request_ms",
+        "max_body_bytes",
+    )
+
+    def __init__(self, policy: Optional[Mapping[str, Any]] = None):
+        policy = policy or {}
+        headers = policy.get("headers")
+        if headers is None:
+            headers = settings.LOG_HEADER_ALLOWLIST
+        names = frozenset(name.lower() for name in headers)
+        self.allow_all_headers = "*" in names
+        self.headers = names - {"*"}
+        self.redact_headers = ALWAYS_REDACTED | frozenset(
+            name.lower() for name in policy.get("redact_headers") or ()
+        )
+        self.query_params = policy.get("query_params", True)
+        self.redact_query_params = frozenset(policy.get("redact_query_params") or ())
+
+        sample_rate = policy.get("success_sample_rate")
+        slow_request_ms = policy.get("slow_request_ms")
+        self.success_sample_rate = (
+            settings.LOG_SUCCESS_SAMPLE_RATE if sample_rate is None else sample_rate
+        )
+        self.slow_request_ms = (
+            settings.LOG_SLOW_REQUEST_MS if slow_request_ms is None else slow_request_ms
+        )
+        self.max_body_bytes = policy.get("max_body_bytes") or 0
+
+    def keep(self, status_code: int, response_time: float) -> bool:
+        """Whether the raw log is stored. Errors and slow requests always are."""
+        if status_code >= 400 or response_time >= self.slow_request_ms:
+            return True
+        return self.success_sample_rate >= 1 or (
+            random.random() < self.success_sample_rate
+        )
+
+    def filter_headers(self, headers: Mapping[str, str]) -> Dict[str, str]:
+        if self.allow_all_headers:
+            names = headers.keys()
+        else:
+            names = [name for name in self.headers if name in headers]
+        return {
+            name: REDACTED if name in self.redact_headers else headers[name]
+            for name in names
+        }
+
+    def filter_query_params(self, params: Mapping[str, str]) -> Dict[str, str]:
+        if not self.query_params:
+            return {}
+        return {
+            name: REDACTED if name in self.redact_query_params else value
+            for name, value in params.items()
+        }
+
+    def capture_body(self, body: bytes) -> Optional[str]:
+        if not self.max_body_bytes or not body:
+            return None
+        return body[: self.max_body_bytes].decode("utf-8", errors="replace")
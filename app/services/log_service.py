@@ -1,9 +1,26 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import base64
+import json
 import logging
+import math
+import re
+from app.core.config import settings
+from app.db.log_storage import log_collection
 from app.db.mongodb import get_mongodb
 from app.schemas.log import LogFilterParams
+from app.services.log_writer import ROLLUP_ONLY, log_writer
+from app.services.result_cache import result_cache
+from app.core.sketch import MIN_VALUE, LatencySketch
+from app.services.rollups import (
+    latency_percentiles,
+    merge_rollup_sketches,
+    rollup_match,
+    summarize_rollups,
+    top_rollup_endpoints,
+    write_rollups,
+)
 from bson import ObjectId
 
 logger = logging.getLogger(__name__)
@@ -21,22 +38,37 @@ async def log_request(
     headers: Dict[str, str] = None,
     query_params: Dict[str, Any] = None,
     error: Optional[str] = None,
+    response_size: Optional[int] = None,
+    request_body: Optional[str] = None,
+    keep: bool = True,
+    request_id: Optional[str] = None,
+    spans: Optional[List[Dict[str, Any]]] = None,
+    target: Optional[str] = None,
 ) -> None:
-    """Log a request to MongoDB."""
-    try:
-        mongodb = await get_mongodb()
+    """Queue a request log for the background writer.
 
+    Falls back to a direct insert when the writer is not running. A log
+    with ``keep`` unset was sampled out by the service's log policy: it
+    still counts in the rollups but is not stored. ``target`` is the
+    upstream the load balancer picked, when it is not the ``base_url``.
+    """
+    try:
         log_data = {
+            # Assigned here so a batch written twice (spill replay) dedupes
+            "_id": ObjectId(),
             "method": method,
             "path": path,
             "status_code": status_code,
             "response_time": response_time,
             "client_ip": client_ip,
             "timestamp": datetime.utcnow(),
-            "headers": headers or {},
-            "query_params": query_params or {},
         }
 
+        if headers:
+            log_data["headers"] = headers
+        if query_params:
+            log_data["query_params"] = query_params
+
         if user_id:
             log_data["user_id"] = user_id
         if api_key_id:
@@ -45,16 +77,33 @@ async def log_request(
             log_data["service_id"] = service_id
         if error:
             log_data["error"] = error
+        if response_size is not None:
+            log_data["response_size"] = response_size
+        if request_body is not None:
+            log_data["request_body"] = request_body
+        if request_id:
+            log_data["request_id"] = request_id
+        if spans:
+            log_data["spans"] = spans
+        if target:
+            log_data["target"] = target
+        if not keep:
+            log_data[ROLLUP_ONLY] = True
 
-        await mongodb["request_logs"].insert_one(log_data)
+        if log_writer.running:
+            await log_writer.put(log_data)
+        else:
+            mongodb = await get_mongodb()
+            if log_data.pop(ROLLUP_ONLY, False) is False:
+                await log_collection(mongodb).insert_one(log_data)
+            if settings.LOG_ROLLUPS_ENABLED:
+                await write_rollups(mongodb, [log_data])
     except Exception as e:
         logger.error(f"Failed to log request: {str(e)}")
 
 
-async def get_logs(
-    mongodb: AsyncIOMotorDatabase,
-    filter_params: LogFilterParams,
-) -> List[Dict[str, Any]]:
+def build_log_query(filter_params: LogFilterParams) -> Dict[str, Any]:
+    """Mongo filter for ``filter_params``. Raises ValueError on a bad cursor."""
     query = {}
 
     if filter_params.service_id:
@@ -66,7 +115,11 @@ async def get_logs(
     if filter_params.method:
         query["method"] = filter_params.method
     if filter_params.path:
-        query["path"] = {"$regex": filter_params.path, "$options": "i"}
+        if filter_params.path_mode == "prefix":
+            # Anchored and case sensitive, so Mongo can bound an index scan.
+            query["path"] = {"$regex": "^" + re.escape(filter_params.path)}
+        else:
+            query["path"] = {"$regex": filter_params.path, "$options": "i"}
 
     if filter_params.from_date or filter_params.to_date:
         query["timestamp"] = {}
@@ -75,19 +128,74 @@ async def get_logs(
         if filter_params.to_date:
             query["timestamp"]["$lte"] = filter_params.to_date
 
+    if filter_params.cursor:
+        # Resume right after the log the cursor points to, in the
+        # (timestamp, _id) descending order logs are read in.
+        timestamp, log_id = decode_log_cursor(filter_params.cursor)
+        after = {
+            "$or": [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": log_id}},
+            ]
+        }
+        query = {"$and": [query, after]} if query else after
+
+    return query
+
+
+def encode_log_cursor(log: Dict[str, Any]) -> str:
+    """Opaque continuation token pointing just after ``log``."""
+    position = {"t": log["timestamp"].isoformat(), "id": str(log["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_log_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(position["t"]), ObjectId(position["id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+async def get_logs_page(
+    mongodb: AsyncIOMotorDatabase,
+    filter_params: LogFilterParams,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """A page of logs, newest first, and the cursor of the next page.
+
+    With ``filter_params.cursor`` the page starts right after the log the
+    cursor points to, which costs the same at any depth. Without it the old
+    ``skip`` offset applies. The next cursor is None on the last page.
+    """
+    query = build_log_query(filter_params)
     cursor = (
-        mongodb["request_logs"]
+        log_collection(mongodb)
         .find(query)
-        .sort("timestamp", -1)
-        .skip(filter_params.skip)
+        .sort([("timestamp", -1), ("_id", -1)])
         .limit(filter_params.limit)
     )
+    if not filter_params.cursor:
+        cursor = cursor.skip(filter_params.skip)
 
     logs = []
     async for log in cursor:
-        log["_id"] = str(log["_id"])
         logs.append(log)
 
+    next_cursor = None
+    if len(logs) == filter_params.limit:
+        next_cursor = encode_log_cursor(logs[-1])
+
+    for log in logs:
+        log["_id"] = str(log["_id"])
+
+    return logs, next_cursor
+
+
+async def get_logs(
+    mongodb: AsyncIOMotorDatabase,
+    filter_params: LogFilterParams,
+) -> List[Dict[str, Any]]:
+    logs, _ = await get_logs_page(mongodb, filter_params)
     return logs
 
 
@@ -97,6 +205,73 @@ async def get_log_stats(
     from_date: Optional[datetime] = None,
     to_date: Optional[datetime] = None,
 ) -> Dict[str, Any]:
+    """Traffic stats for a service or the whole gateway over a window.
+
+    Results are cached for ``STATS_CACHE_TTL`` seconds under the filter with
+    both bounds rounded down to ``STATS_CACHE_BUCKET`` seconds, so callers
+    whose windows only differ within one bucket share a result.
+    """
+    key = "log_stats:" + ":".join(
+        [
+            str(service_id or "all"),
+            _time_bucket(from_date),
+            _time_bucket(to_date),
+            "rollups" if settings.LOG_ROLLUPS_ENABLED else "raw",
+        ]
+    )
+
+    async def compute() -> Dict[str, Any]:
+        if settings.LOG_ROLLUPS_ENABLED:
+            return await get_rollup_stats(mongodb, service_id, from_date, to_date)
+        return await get_raw_log_stats(mongodb, service_id, from_date, to_date)
+
+    return await result_cache.get_or_compute(key, settings.STATS_CACHE_TTL, compute)
+
+
+def _time_bucket(value: Optional[datetime]) -> str:
+    if value is None:
+        return "-"
+    return str(int(value.timestamp()) // settings.STATS_CACHE_BUCKET)
+
+
+# Status class of a log ("2xx", ...) computed arithmetically, clamped like
+# app.services.rollups.status_class.
+STATUS_CLASS_EXPRESSION = {
+    "$concat": [
+        {
+            "$toString": {
+                "$toInt": {
+                    "$min": [
+                        {"$max": [{"$floor": {"$divide": ["$status_code", 100]}}, 1]},
+                        5,
+                    ]
+                }
+            }
+        },
+        "xx",
+    ]
+}
+
+
+def _sketch_bin_expression() -> Dict[str, Any]:
+    """The ``LatencySketch`` bin of a log's response time, computed by Mongo."""
+    return {
+        "$ceil": {
+            "$divide": [
+                {"$ln": {"$max": ["$response_time", MIN_VALUE]}},
+                math.log(LatencySketch().gamma),
+            ]
+        }
+    }
+
+
+async def get_raw_log_stats(
+    mongodb: AsyncIOMotorDatabase,
+    service_id: Optional[int] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Stats computed from raw logs in a single ``$facet`` pass."""
     match_query = {}
     if service_id:
         match_query["service_id"] = service_id
@@ -111,20 +286,46 @@ async def get_log_stats(
     pipeline = [
         {"$match": match_query},
         {
-            "$group": {
-                "_id": None,
-                "total_requests": {"$sum": 1},
-                "average_response_time": {"$avg": "$response_time"},
-                "success_count": {
-                    "$sum": {"$cond": [{"$lt": ["$status_code", 400]}, 1, 0]}
-                },
+            "$facet": {
+                "totals": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "total_requests": {"$sum": 1},
+                            "average_response_time": {"$avg": "$response_time"},
+                            "success_count": {
+                                "$sum": {
+                                    "$cond": [{"$lt": ["$status_code", 400]}, 1, 0]
+                                }
+                            },
+                        }
+                    }
+                ],
+                "top_endpoints": [
+                    {
+                        "$group": {
+                            "_id": {"method": "$method", "path": "$path"},
+                            "count": {"$sum": 1},
+                            "avg_time": {"$avg": "$response_time"},
+                        }
+                    },
+                    {"$sort": {"count": -1}},
+                    {"$limit": 5},
+                ],
+                "status_classes": [
+                    {"$group": {"_id": STATUS_CLASS_EXPRESSION, "count": {"$sum": 1}}}
+                ],
+                "latency_bins": [
+                    {"$group": {"_id": _sketch_bin_expression(), "count": {"$sum": 1}}}
+                ],
             }
         },
     ]
 
-    result = await mongodb["request_logs"].aggregate(pipeline).to_list(1)
+    result = await log_collection(mongodb).aggregate(pipeline).to_list(1)
+    facets = result[0] if result else {}
 
-    if not result:
+    if not facets.get("totals"):
         return {
             "total_requests": 0,
             "average_response_time": 0,
@@ -132,36 +333,16 @@ async def get_log_stats(
             "requests_per_minute": 0,
             "top_endpoints": [],
             "status_code_distribution": {},
+            **latency_percentiles(LatencySketch()),
         }
 
-    stats = result[0]
+    stats = facets["totals"][0]
     total = stats["total_requests"]
     success_rate = (stats["success_count"] / total) * 100 if total > 0 else 0
+    requests_per_minute = _requests_per_minute(total, from_date, to_date)
 
-    time_diff = (
-        (to_date - from_date).total_seconds() / 60 if from_date and to_date else 1440
-    )
-    requests_per_minute = total / time_diff if time_diff > 0 else 0
-
-    endpoint_pipeline = [
-        {"$match": match_query},
-        {
-            "$group": {
-                "_id": {"method": "$method", "path": "$path"},
-                "count": {"$sum": 1},
-                "avg_time": {"$avg": "$response_time"},
-            }
-        },
-        {"$sort": {"count": -1}},
-        {"$limit": 5},
-    ]
-
-    top_endpoints = (
-        await mongodb["request_logs"].aggregate(endpoint_pipeline).to_list(5)
-    )
     top_endpoints_result = []
-
-    for endpoint in top_endpoints:
+    for endpoint in facets["top_endpoints"]:
         top_endpoints_result.append(
             {
                 "method": endpoint["_id"]["method"],
@@ -171,52 +352,14 @@ async def get_log_stats(
             }
         )
 
-    status_pipeline = [
-        {"$match": match_query},
-        {
-            "$group": {
-                "_id": {
-                    "$concat": [
-                        {
-                            "$cond": [
-                                {"$lt": ["$status_code", 200]},
-                                "1xx",
-                                {
-                                    "$cond": [
-                                        {"$lt": ["$status_code", 300]},
-                                        "2xx",
-                                        {
-                                            "$cond": [
-                                                {"$lt": ["$status_code", 400]},
-                                                "3xx",
-                                                {
-                                                    "$cond": [
-                                                        {"$lt": ["$status_code", 500]},
-                                                        "4xx",
-                                                        "5xx",
-                                                    ]
-                                                },
-                                            ]
-                                        },
-                                    ]
-                                },
-                            ]
-                        }
-                    ]
-                },
-                "count": {"$sum": 1},
-            }
-        },
-    ]
-
-    status_results = (
-        await mongodb["request_logs"].aggregate(status_pipeline).to_list(10)
-    )
     status_distribution = {}
-
-    for status in status_results:
+    for status in facets["status_classes"]:
         status_distribution[status["_id"]] = status["count"]
 
+    sketch = LatencySketch.from_bins(
+        (row["_id"], row["count"]) for row in facets["latency_bins"]
+    )
+
     return {
         "total_requests": total,
         "average_response_time": round(stats["average_response_time"], 2),
@@ -224,4 +367,72 @@ async def get_log_stats(
         "requests_per_minute": round(requests_per_minute, 2),
         "top_endpoints": top_endpoints_result,
         "status_code_distribution": status_distribution,
+        **latency_percentiles(sketch),
+    }
+
+
+async def raw_latency_sketch(
+    mongodb: AsyncIOMotorDatabase, match_query: Dict[str, Any]
+) -> LatencySketch:
+    """Build a latency sketch from raw logs, binning on the server.
+
+    Used when rollups are disabled. Mongo computes each log's sketch bin and
+    only one row per occupied bin is returned, so nothing is sorted.
+    """
+    pipeline = [
+        {"$match": match_query},
+        {"$group": {"_id": _sketch_bin_expression(), "count": {"$sum": 1}}},
+    ]
+    bins = await log_collection(mongodb).aggregate(pipeline).to_list(None)
+    return LatencySketch.from_bins((row["_id"], row["count"]) for row in bins)
+
+
+def _requests_per_minute(
+    total: int, from_date: Optional[datetime], to_date: Optional[datetime]
+) -> float:
+    time_diff = (
+        (to_date - from_date).total_seconds() / 60 if from_date and to_date else 1440
+    )
+    return total / time_diff if time_diff > 0 else 0
+
+
+async def get_rollup_stats(
+    mongodb: AsyncIOMotorDatabase,
+    service_id: Optional[int] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Same figures as ``get_log_stats``, read from the per-minute rollups.
+
+    The cost depends on the number of buckets in the window rather than the
+    number of requests. The window is widened to whole minutes.
+    """
+    match_query = rollup_match(service_id, from_date, to_date)
+    totals = await summarize_rollups(mongodb, match_query)
+    total = totals["count"]
+    if not total:
+        return {
+            "total_requests": 0,
+            "average_response_time": 0,
+            "success_rate": 0,
+            "requests_per_minute": 0,
+            "top_endpoints": [],
+            "status_code_distribution": {},
+            **latency_percentiles(LatencySketch()),
+        }
+
+    status = totals["status"]
+    success_count = status["1xx"] + status["2xx"] + status["3xx"]
+    return {
+        "total_requests": total,
+        "average_response_time": round(totals["latency_sum"] / total, 2),
+        "success_rate": round(success_count / total * 100, 2),
+        "requests_per_minute": round(
+            _requests_per_minute(total, from_date, to_date), 2
+        ),
+        "top_endpoints": await top_rollup_endpoints(mongodb, match_query),
+        "status_code_distribution": {
+            status_class: count for status_class, count in status.items() if count
+        },
+        **latency_percentiles(await merge_rollup_sketches(mongodb, match_query)),
     }
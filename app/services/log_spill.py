@@ -0,0 +1,167 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import bson
+from bson.errors import InvalidBSON
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".bson"
+
+
+class LogSpill:
+    """Append-only on-disk buffer for request logs Mongo could not take.
+
+    Records are appended as length-prefixed BSON documents to segment files
+    under ``directory``, rolling over to a new segment every
+    ``LOG_SPILL_SEGMENT_BYTES``. Each append is flushed and fsynced, so a
+    crash loses at most the append in flight, and a torn record at the end
+    of a segment is skipped on replay.
+
+    ``replay`` drains segments oldest first. The offset reached in a segment
+    is checkpointed in a ``.offset`` sidecar after every batch, and a
+    segment is deleted once fully replayed. A batch can still be written
+    twice, after a crash or when a timed out insert landed anyway, so the
+    writer has to tolerate logs that are already stored: records carry
+    their ``_id`` from enqueue time, which the writer deduplicates on.
+
+    File access is blocking, so callers run ``append``, ``seal``,
+    ``read_batch`` and ``commit`` through ``asyncio.to_thread``. A lock
+    keeps an append from writing to a segment while it is being sealed.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.active = False
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self._segment: Optional[str] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def segments(self) -> List[str]:
+        names = sorted(
+            name
+            for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+    def size(self) -> int:
+        return sum(os.path.getsize(path) for path in self.segments())
+
+    def append(self, records: List[Dict[str, Any]]) -> bool:
+        """Write ``records`` to the current segment, False if the spill is full."""
+        data = b"".join(bson.encode(record) for record in records)
+        with self._lock:
+            return self._append(data, len(records))
+
+    def _append(self, data: bytes, count: int) -> bool:
+        if self.size() + len(data) > settings.LOG_SPILL_MAX_BYTES:
+            self.dropped += count
+            return False
+
+        if (
+            self._segment is None
+            or not os.path.exists(self._segment)
+            or os.path.getsize(self._segment) >= settings.LOG_SPILL_SEGMENT_BYTES
+        ):
+            self._segment = os.path.join(
+                self.directory, f"{SEGMENT_PREFIX}{time.time_ns()}{SEGMENT_SUFFIX}"
+            )
+
+        with open(self._segment, "ab") as segment:
+            segment.write(data)
+            segment.flush()
+            os.fsync(segment.fileno())
+        self.spilled += count
+        return True
+
+    def seal(self) -> List[str]:
+        """Make the next append start a new segment.
+
+        Returns the segments sealed so far, listed under the same lock so a
+        segment opened by a later append is never among them.
+        """
+        with self._lock:
+            self._segment = None
+            return self.segments()
+
+    def read_batch(
+        self, path: str, batch_size: int
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Up to ``batch_size`` records from the checkpointed offset of ``path``.
+
+        Returns the records and the offset right after them.
+        """
+        offset = self._read_offset(path)
+        records = []
+        with open(path, "rb") as segment:
+            segment.seek(offset)
+            while len(records) < batch_size:
+                header = segment.read(4)
+                if len(header) < 4:
+                    break
+                length = int.from_bytes(header, "little")
+                body = segment.read(length - 4)
+                if len(body) < length - 4:
+                    logger.warning(f"Skipping torn record at the end of {path}")
+                    break
+                try:
+                    records.append(bson.decode(header + body))
+                except InvalidBSON:
+                    logger.warning(f"Skipping corrupt record in {path}")
+                offset += length
+        return records, offset
+
+    def commit(self, path: str, offset: int, done: bool) -> None:
+        if done:
+            os.remove(path)
+            if os.path.exists(path + ".offset"):
+                os.remove(path + ".offset")
+        else:
+            with open(path + ".offset", "w") as checkpoint:
+                checkpoint.write(str(offset))
+
+    async def replay(
+        self,
+        write: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        run: Callable[..., Awaitable[Any]],
+    ) -> int:
+        """Write every spilled record back through ``write``, oldest first.
+
+        ``run`` executes the blocking file calls, normally
+        ``asyncio.to_thread``. Stops at the first failing ``write``, whose
+        batch is replayed again next time.
+        """
+        # Seal the segment being appended to so appends made while replaying
+        # go to a new segment, which is left for the next replay.
+        replayed = 0
+        for path in await run(self.seal):
+            while True:
+                records, offset = await run(
+                    self.read_batch, path, settings.LOG_BATCH_SIZE
+                )
+                if records:
+                    await write(records)
+                    replayed += len(records)
+                    self.replayed += len(records)
+                done = len(records) < settings.LOG_BATCH_SIZE
+                await run(self.commit, path, offset, done)
+                if done:
+                    break
+        return replayed
+
+    def _read_offset(self, path: str) -> int:
+        try:
+            with open(path + ".offset") as checkpoint:
+                return int(checkpoint.read() or 0)
+        except FileNotFoundError:
+            return 0
@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Dict, List, Optional
+
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.db.log_storage import log_collection
+from app.db.mongodb import get_mongodb
+from app.services.log_spill import LogSpill
+from app.services.rollups import write_rollups
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Marks a record sampled out by its log policy, counted in rollups only.
+ROLLUP_ONLY = "_rollup_only"
+# Marks a spilled record whose log was stored but not yet folded into rollups.
+STORED = "_stored"
+
+
+class RequestLogWriter:
+    """Background pipeline that batches request logs into MongoDB.
+
+    ``put`` hands a record to a bounded queue and returns without touching
+    Mongo. A single writer task drains the queue and flushes with unordered
+    ``insert_many`` once ``LOG_BATCH_SIZE`` records are collected or
+    ``LOG_FLUSH_INTERVAL`` seconds have passed since the first one.
+
+    When the queue is full, ``LOG_OVERFLOW_POLICY`` decides what happens:
+    ``drop`` discards the record, ``block`` waits for room and ``sample``
+    keeps a ``LOG_OVERFLOW_SAMPLE_RATE`` share of records once the queue is
+    more than half full and drops the rest when it is full.
+
+    Each flush also folds the batch into the per-minute ``request_rollups``
+    buckets the stats endpoints read from.
+
+    With ``LOG_SPILL_DIR`` set, a flush that fails or takes longer than
+    ``LOG_SPILL_LATENCY_MS`` goes to a ``LogSpill`` on disk instead, and so
+    do the following ones until Mongo answers a ping again. The spilled logs
+    are then replayed into Mongo in the background. The insert and the
+    rollups are separate stages: when only the rollups fail, the records go
+    to the spill marked ``STORED`` so replaying them folds them into the
+    rollups without inserting them again. A rollup write that times out but
+    still lands in Mongo is counted twice once replayed.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._spill: Optional[LogSpill] = None
+        self._recovery: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.sampled_out = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self._task is None:
+            if settings.LOG_SPILL_DIR and self._spill is None:
+                self._spill = LogSpill(settings.LOG_SPILL_DIR)
+            self._queue = asyncio.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+            self._task = asyncio.create_task(self._run())
+            if self._spill and await asyncio.to_thread(self._spill.segments):
+                # Logs spilled before a restart
+                self._start_recovery()
+
+    async def stop(self) -> None:
+        """Flush everything still queued and stop the writer task."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, settings.LOG_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Log writer did not flush in time, {self._queue.qsize()} records lost"
+            )
+            self._task.cancel()
+        self._task = None
+        if self._recovery:
+            self._recovery.cancel()
+            self._recovery = None
+
+    async def put(self, record: Dict[str, Any]) -> None:
+        policy = settings.LOG_OVERFLOW_POLICY
+        if policy == "block":
+            await self._queue.put(record)
+            self.enqueued += 1
+            return
+
+        if (
+            policy == "sample"
+            and self._queue.qsize() * 2 >= self._queue.maxsize
+            and random.random() >= settings.LOG_OVERFLOW_SAMPLE_RATE
+        ):
+            self.dropped += 1
+            return
+
+        try:
+            self._queue.put_nowait(record)
+            self.enqueued += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": settings.LOG_QUEUE_SIZE,
+            "overflow_policy": settings.LOG_OVERFLOW_POLICY,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "sampled_out": self.sampled_out,
+            "batches": self.batches,
+            "spilling": bool(self._spill and self._spill.active),
+            "spilled": self._spill.spilled if self._spill else 0,
+            "replayed": self._spill.replayed if self._spill else 0,
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            record = await self._queue.get()
+            if record is _STOP:
+                break
+
+            batch = [record]
+            deadline = loop.time() + settings.LOG_FLUSH_INTERVAL
+            while len(batch) < settings.LOG_BATCH_SIZE:
+                try:
+                    record = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        self.batches += 1
+        if self._spill and self._spill.active:
+            await self._spill_batch(batch)
+            return
+
+        stored = False
+        try:
+            await self._timed(self._insert(batch))
+            stored = True
+            await self._timed(self._fold(batch))
+        except Exception as e:
+            if self._spill:
+                logger.error(
+                    f"MongoDB unavailable or slow, spilling request logs: {e!r}"
+                )
+                self._spill.active = True
+                if stored:
+                    batch = [{**record, STORED: True} for record in batch]
+                await self._spill_batch(batch)
+                self._start_recovery()
+            elif stored:
+                logger.error(
+                    f"Failed to fold {len(batch)} request logs into rollups: {str(e)}"
+                )
+            else:
+                self.failed += len(batch)
+                logger.error(f"Failed to write {len(batch)} request logs: {str(e)}")
+
+    async def _timed(self, stage: Awaitable[None]) -> None:
+        if self._spill:
+            await asyncio.wait_for(stage, settings.LOG_SPILL_LATENCY_MS / 1000)
+        else:
+            await stage
+
+    async def _store(self, batch: List[Dict[str, Any]]) -> None:
+        """Insert a batch and fold it into the rollups, raising on failure."""
+        await self._insert(batch)
+        await self._fold(batch)
+
+    async def _replay(self, batch: List[Dict[str, Any]]) -> None:
+        """``_store`` for a spilled batch, which may be partly stored already."""
+        await self._insert(batch, replay=True)
+        await self._fold(batch)
+
+    async def _insert(self, batch: List[Dict[str, Any]], replay: bool = False) -> None:
+        """Insert the logs of a batch that are not stored yet.
+
+        Records carry their ``_id`` from enqueue time, so duplicates from a
+        batch written twice are ignored and counted apart. Time-series
+        collections have no unique ``_id`` index, so there a replayed batch
+        is first checked for the logs already stored.
+        """
+        logs = [
+            record
+            for record in batch
+            if not record.get(ROLLUP_ONLY) and not record.get(STORED)
+        ]
+        if logs:
+            mongodb = await get_mongodb()
+            collection = log_collection(mongodb).with_options(
+                write_concern=WriteConcern(w=_write_concern(settings.LOG_WRITE_CONCERN))
+            )
+            if replay and settings.LOG_STORAGE_MODE == "timeseries":
+                logs = await self._unstored(collection, logs)
+        if logs:
+            try:
+                await collection.insert_many(logs, ordered=False)
+                self.written += len(logs)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                duplicates = sum(1 for error in errors if error.get("code") == 11000)
+                self.written += e.details.get("nInserted", 0)
+                self.duplicates += duplicates
+                if duplicates < len(errors) or e.details.get("writeConcernErrors"):
+                    raise
+
+        self.sampled_out += sum(1 for record in batch if record.get(ROLLUP_ONLY))
+
+    async def _unstored(
+        self, collection, logs: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        # The time range lets Mongo read only the buckets that can hold them
+        timestamps = [log["timestamp"] for log in logs]
+        query = {
+            "timestamp": {"$gte": min(timestamps), "$lte": max(timestamps)},
+            "_id": {"$in": [log["_id"] for log in logs]},
+        }
+        stored = {log["_id"] async for log in collection.find(query, {"_id": 1})}
+        self.duplicates += len(stored)
+        return [log for log in logs if log["_id"] not in stored]
+
+    async def _fold(self, batch: List[Dict[str, Any]]) -> None:
+        if settings.LOG_ROLLUPS_ENABLED:
+            await write_rollups(await get_mongodb(), batch)
+
+    async def _spill_batch(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            if not await asyncio.to_thread(self._spill.append, batch):
+                self.failed += len(batch)
+                logger.error(f"Log spill is full, {len(batch)} request logs lost")
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to spill {len(batch)} request logs: {str(e)}")
+
+    def _start_recovery(self) -> None:
+        if self._recovery is None or self._recovery.done():
+            self._recovery = asyncio.create_task(self._recover())
+
+    async def _recover(self) -> None:
+        """Wait for Mongo to answer again, then replay the spilled logs."""
+        while True:
+            await asyncio.sleep(settings.LOG_SPILL_RETRY_INTERVAL)
+            try:
+                mongodb = await get_mongodb()
+                await asyncio.wait_for(
+                    mongodb.command("ping"), settings.LOG_SPILL_LATENCY_MS / 1000
+                )
+                self._spill.active = False
+                replayed = await self._spill.replay(self._replay, asyncio.to_thread)
+                if replayed:
+                    logger.info(f"Replayed {replayed} spilled request logs")
+                if not await asyncio.to_thread(self._spill.segments):
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._spill.active = True
+                logger.warning(f"Request log spill replay postponed: {e!r}")
+
+
+def _write_concern(value: str):
+    return int(value) if value.isdigit() else value
+
+
+log_writer = RequestLogWriter()
@@ -1,50 +1,293 @@
-from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
-from typing import Dict, Optional
+import importlib.util
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 import logging
-from urllib.parse import urljoin
 from app.models.service import Service
 from app.models.user import User
 from app.models.api_key import APIKey
 from app.core.config import settings
 from app.core.errors import ProxyError
+from app.core.metrics import UPSTREAM_CONNECT, UPSTREAM_TTFB
+from app.core.tracing import Trace, current_trace
+from app.services.routing import upstream_url
 
 logger = logging.getLogger(__name__)
 
+HOP_BY_HOP_HEADERS = frozenset(
+    {
+        "connection",
+        "keep-alive",
+        "proxy-authenticate",
+        "proxy-authorization",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+    }
+)
+
+
+class UpstreamClientRegistry:
+    """Long-lived, pooled httpx clients keyed by upstream origin.
+
+    Each origin (scheme, host, port) gets its own client so connection pool
+    limits apply per upstream and keep-alive connections are reused across
+    gateway requests.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._requests: Dict[str, int] = {}
+        self._http2 = False
+
+    async def start(self):
+        self._http2 = settings.PROXY_HTTP2
+        if self._http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("PROXY_HTTP2 is enabled but `h2` is not installed")
+            self._http2 = False
+
+    async def close(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    def get_client(self, url: str, count: bool = True) -> httpx.AsyncClient:
+        """Client of the origin of ``url``, counting a request unless ``count``."""
+        origin = self.origin(url)
+        client = self._clients.get(origin)
+        if client is None:
+            client = httpx.AsyncClient(
+                http2=self._http2,
+                limits=httpx.Limits(
+                    max_connections=settings.PROXY_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.PROXY_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.PROXY_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(
+                    settings.PROXY_TIMEOUT, connect=settings.PROXY_CONNECT_TIMEOUT
+                ),
+            )
+            self._clients[origin] = client
+            self._requests[origin] = 0
+        if count:
+            self._requests[origin] += 1
+        return client
+
+    @staticmethod
+    def origin(url: str) -> str:
+        parsed = httpx.URL(url)
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        return f"{parsed.scheme}://{parsed.host}:{port}"
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Snapshot of connection pool usage for every upstream origin."""
+        result = []
+        for origin, client in self._clients.items():
+            usage = self._pool_usage(client)
+            connections, idle, waiting = usage if usage else (None, None, None)
+            result.append(
+                {
+                    "origin": origin,
+                    "http2": self._http2,
+                    "connections": connections,
+                    "in_use": connections - idle if usage else None,
+                    "idle": idle,
+                    "waiting": waiting,
+                    "total_requests": self._requests.get(origin, 0),
+                }
+            )
+        return result
+
+    @staticmethod
+    def _pool_usage(client: httpx.AsyncClient) -> Optional[Tuple[int, int, int]]:
+        """(connections, idle, waiting) of the client's httpcore pool.
+
+        These are httpx and httpcore internals, so when they cannot be read
+        (another version, another transport) the counts are left out instead
+        of failing the whole endpoint.
+        """
+        try:
+            pool = client._transport._pool
+            connections = list(pool.connections)
+            idle = sum(1 for connection in connections if connection.is_idle())
+            waiting = sum(1 for request in pool._requests if request.is_queued())
+        except Exception:
+            return None
+        return len(connections), idle, waiting
+
+
+upstream_clients = UpstreamClientRegistry()
+
+
+class UpstreamTimings:
+    """httpx ``trace`` extension timing one upstream exchange.
+
+    ``connect`` is only set when the request opened a new connection (TCP
+    and TLS), ``ttfb`` runs from sending the request headers to receiving
+    the response headers.
+    """
+
+    __slots__ = ("connect", "ttfb", "_connect_started", "_sent")
+
+    def __init__(self):
+        self.connect: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self._connect_started = 0.0
+        self._sent = 0.0
+
+    async def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        if event.endswith(".started"):
+            if event == "connection.connect_tcp.started":
+                self._connect_started = time.perf_counter()
+            elif event.endswith("send_request_headers.started"):
+                self._sent = time.perf_counter()
+        elif event.endswith("receive_response_headers.complete"):
+            self.ttfb = time.perf_counter() - self._sent
+        elif event in (
+            "connection.connect_tcp.complete",
+            "connection.start_tls.complete",
+        ):
+            self.connect = time.perf_counter() - self._connect_started
+
+    def observe(self, service_name: str) -> None:
+        if self.connect is not None:
+            UPSTREAM_CONNECT.labels(service_name).observe(self.connect)
+        if self.ttfb is not None:
+            UPSTREAM_TTFB.labels(service_name).observe(self.ttfb)
+
+    def add_spans(self, trace: Trace) -> None:
+        if self.connect is not None:
+            trace.add("upstream.connect", self.connect, self._connect_started)
+        if self.ttfb is not None:
+            trace.add("upstream.ttfb", self.ttfb, self._sent)
+
+
+def get_timeout(service: Service) -> httpx.Timeout:
+    return httpx.Timeout(
+        service.timeout or settings.PROXY_TIMEOUT,
+        connect=settings.PROXY_CONNECT_TIMEOUT,
+    )
+
 
 async def proxy_request(
     request: Request,
     service: Service,
     user: Optional[User] = None,
-) -> JSONResponse:
-    body = await request.body()
+    path: str = "",
+    body_capture: Optional[bytearray] = None,
+    capture_limit: int = 0,
+    base_url: Optional[str] = None,
+) -> Response:
+    """Forward the request to the service and relay its response.
+
+    ``base_url`` is the target picked by the load balancer, the service's
+    ``base_url`` by default. When ``body_capture`` is given, the first
+    ``capture_limit`` bytes of the request body are copied into it as they
+    are sent.
+    """
+    base_url = base_url or service.base_url
+    url = httpx.URL(upstream_url(base_url, path))
+    query = request.scope.get("query_string")
+    if query:
+        # As sent, so repeated keys and their encoding reach the upstream
+        url = url.copy_with(query=query)
     headers = prepare_headers(request, service, user)
-    params = dict(request.query_params)
+    trace = current_trace.get()
+    timings = (
+        UpstreamTimings()
+        if settings.METRICS_UPSTREAM_TIMINGS or trace is not None
+        else None
+    )
 
     try:
-        async with httpx.AsyncClient(timeout=settings.PROXY_TIMEOUT) as client:
-            response = await client.request(
-                method=request.method,
-                url=service.base_url,
-                headers=headers,
-                params=params,
-                content=body,
-            )
+        client = upstream_clients.get_client(base_url)
+        upstream_request = client.build_request(
+            method=request.method,
+            url=url,
+            headers=headers,
+            content=await request_content(request, body_capture, capture_limit),
+            timeout=get_timeout(service),
+            extensions={"trace": timings} if timings else None,
+        )
+        response = await client.send(upstream_request, stream=True)
+        if timings:
+            if settings.METRICS_UPSTREAM_TIMINGS:
+                timings.observe(service.name)
+            if trace is not None:
+                timings.add_spans(trace)
 
-            return JSONResponse(
-                content=response.json(),
-                status_code=response.status_code,
-                headers={"Content-Type": "application/json"},
-            )
+        if not settings.PROXY_STREAMING:
+            try:
+                body = b"".join([chunk async for chunk in response.aiter_raw()])
+            finally:
+                await response.aclose()
+            proxied_response = Response(content=body, status_code=response.status_code)
+            proxied_response.raw_headers = encode_headers(response)
+            return proxied_response
 
     except httpx.TimeoutException:
-        logger.error(f"Timeout when connecting to {service.base_url}")
+        logger.error(f"Timeout when connecting to {url}")
         raise ProxyError(detail="Service timeout")
     except httpx.RequestError as e:
-        logger.error(f"Error connecting to {service.base_url}: {str(e)}")
+        logger.error(f"Error connecting to {url}: {str(e)}")
         raise ProxyError(detail=f"Connection error: {str(e)}")
 
+    streaming_response = StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        background=BackgroundTask(response.aclose),
+    )
+    streaming_response.raw_headers = encode_headers(response)
+    return streaming_response
+
+
+async def request_content(
+    request: Request,
+    capture: Optional[bytearray] = None,
+    capture_limit: int = 0,
+) -> Union[bytes, AsyncIterator[bytes], None]:
+    """Body to send upstream: a stream in streaming mode, bytes otherwise."""
+    if capture is None or capture_limit <= 0:
+        capture = None
+
+    if not settings.PROXY_STREAMING:
+        body = await request.body()
+        if capture is not None:
+            capture += body[:capture_limit]
+        return body
+    if "content-length" in request.headers or "transfer-encoding" in request.headers:
+        if capture is None:
+            return request.stream()
+        return _capturing(request.stream(), capture, capture_limit)
+    return None
+
+
+async def _capturing(
+    stream: AsyncIterator[bytes], capture: bytearray, limit: int
+) -> AsyncIterator[bytes]:
+    async for chunk in stream:
+        if len(capture) < limit:
+            capture += chunk[: limit - len(capture)]
+        yield chunk
+
+
+def encode_headers(response: httpx.Response) -> List[Tuple[bytes, bytes]]:
+    """Upstream response headers minus hop-by-hop ones, repeated names kept.
+
+    Bodies are relayed undecoded, so Content-Encoding and Content-Length stay
+    valid for the client.
+    """
+    return [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in response.headers.multi_items()
+        if name not in HOP_BY_HOP_HEADERS
+    ]
+
 
 def prepare_headers(
     request: Request,
@@ -53,7 +296,7 @@ def prepare_headers(
     api_key: Optional[APIKey] = None,
 ) -> Dict[str, str]:
     """Prepare headers to be forwarded to the target service."""
-    headers = dict(request.headers)
+    headers = {k: v for k, v in request.headers.items() if k not in HOP_BY_HOP_HEADERS}
     headers.pop("host", None)
 
     if service.forward_headers:
@@ -67,6 +310,11 @@ def prepare_headers(
         elif api_key:
             headers[service.auth_header_name] = f"ApiKey {api_key.key}"
 
+    request_id = getattr(request.state, "request_id", None)
+    if request_id:
+        headers.pop(settings.REQUEST_ID_HEADER.lower(), None)
+        headers[settings.REQUEST_ID_HEADER] = request_id
+
     headers["X-API-Gateway"] = "true"
 
     return headers
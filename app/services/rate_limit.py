@@ -1,27 +1,449 @@
+import asyncio
+import logging
+import math
 import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set
+
+from fastapi import Request
+from redis.exceptions import NoScriptError
+
+from app.core.config import settings
+from app.core.metrics import RATE_LIMIT_REJECTIONS
 from app.db.redis_client import redis_client
 from app.core.errors import RateLimitError
+from app.models.service import RateLimitAlgorithm
+
+logger = logging.getLogger(__name__)
+
+# Evaluates every policy of a request in a single round trip and returns the
+# tightest verdict as {allowed, remaining, retry_after_ms, policy_index}.
+# KEYS holds one key per policy and ARGV is the policy count followed by
+# (algorithm, limit, period in seconds, unique member) per policy. Nothing
+# is consumed unless every policy allows the request, so a request denied
+# by one limit does not eat into the others. Time comes from the Redis
+# server so gateway clock skew does not matter.
+RATE_LIMIT_SCRIPT = """
+local n = tonumber(ARGV[1])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local allowed = 1
+local remaining = -1
+local retry_after = 0
+local tightest = 0
+local blocking = 0
+local tats = {}
+
+for i = 1, n do
+    local base = 1 + (i - 1) * 4
+    local algorithm = ARGV[base + 1]
+    local limit = tonumber(ARGV[base + 2])
+    local period = tonumber(ARGV[base + 3]) * 1000
+    local key = KEYS[i]
+    local ok = true
+    local left = 0
+    local wait = 0
+
+    if algorithm == 'gcra' then
+        local interval = period / limit
+        local tat = tonumber(redis.call('GET', key)) or now
+        if tat < now then
+            tat = now
+        end
+        local new_tat = tat + interval
+        local allow_at = new_tat - period
+        if allow_at > now then
+            ok = false
+            wait = math.ceil(allow_at - now)
+        else
+            left = math.floor((period - (new_tat - now)) / interval)
+            tats[i] = new_tat
+        end
+    elseif algorithm == 'sliding_window_log' then
+        redis.call('ZREMRANGEBYSCORE', key, '-inf', now - period)
+        local count = redis.call('ZCARD', key)
+        if count >= limit then
+            ok = false
+            local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+            wait = math.ceil(tonumber(oldest[2]) + period - now)
+        else
+            left = limit - count - 1
+        end
+    else
+        local count = tonumber(redis.call('GET', key)) or 0
+        if count >= limit then
+            ok = false
+            wait = redis.call('PTTL', key)
+            if wait < 0 then
+                wait = period
+            end
+        else
+            left = limit - count - 1
+        end
+    end
+
+    if not ok then
+        allowed = 0
+        if blocking == 0 or wait > retry_after then
+            retry_after = wait
+            blocking = i
+        end
+    elseif remaining < 0 or left < remaining then
+        remaining = left
+        tightest = i
+    end
+end
+
+if allowed == 0 then
+    return {0, 0, retry_after, blocking}
+end
+
+for i = 1, n do
+    local base = 1 + (i - 1) * 4
+    local algorithm = ARGV[base + 1]
+    local period = tonumber(ARGV[base + 3]) * 1000
+    local key = KEYS[i]
+
+    if algorithm == 'gcra' then
+        redis.call('SET', key, tats[i], 'PX', math.ceil(tats[i] - now))
+    elseif algorithm == 'sliding_window_log' then
+        redis.call('ZADD', key, now, ARGV[base + 4])
+        redis.call('PEXPIRE', key, period)
+    else
+        if redis.call('INCR', key) == 1 then
+            redis.call('PEXPIRE', key, period)
+        end
+    end
+end
+
+return {1, remaining, 0, tightest}
+"""
+
+# Leases up to ARGV[3] tokens from the budget of the current fixed window,
+# aligned on the Redis clock so every worker shares it. KEYS[1] is the budget
+# key prefix and ARGV = limit, period in seconds, wanted tokens. Returns
+# {granted, ms until the window ends, window number}.
+LEASE_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2]) * 1000
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local window = math.floor(now / period)
+local key = KEYS[1] .. ':' .. window
+local used = tonumber(redis.call('GET', key)) or 0
+local grant = math.min(tonumber(ARGV[3]), limit - used)
+local window_left = (window + 1) * period - now
+if grant <= 0 then
+    return {0, window_left, window}
+end
+if redis.call('INCRBY', key, grant) == grant then
+    redis.call('PEXPIRE', key, period * 2)
+end
+return {grant, window_left, window}
+"""
+
+SCRIPTS = {"limit": RATE_LIMIT_SCRIPT, "lease": LEASE_SCRIPT}
+
+_script_shas: Dict[str, str] = {}
+
+
+class RateLimitPolicy(NamedTuple):
+    key: str
+    limit: int
+    duration: int  # seconds
+    algorithm: RateLimitAlgorithm = RateLimitAlgorithm.FIXED_WINDOW
+    lease_size: int = 0  # > 0 serves the policy from local token leases
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: int  # seconds
+    policy: Optional[RateLimitPolicy] = None  # the policy that decided
+
+
+class _Lease:
+    __slots__ = ("tokens", "expires_at", "exhausted", "window", "refill")
+
+    def __init__(self, tokens: int, expires_at: float, exhausted: bool, window: int):
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.exhausted = exhausted  # the window budget has no tokens left
+        self.window = window  # the budget window the tokens were leased from
+        self.refill: Optional[asyncio.Task] = None
+
+
+class LocalTokenBuckets:
+    """Approximate limiter that serves hot keys from per-worker token leases.
+
+    Instead of one Redis call per request, a worker leases ``lease_size``
+    tokens at a time from a fixed window budget shared by every worker and
+    spends them locally. When a lease runs low, the next batch is fetched in
+    the background. A request that finds the lease empty while the budget
+    may still have tokens waits for that fetch, or starts it again if the
+    last one failed. The window budget is never exceeded, so the limit can't
+    be overshot. Tokens left unspent at the end of a window are lost, which
+    can reject at most ``lease_size`` requests per worker per window too
+    early. The lease size is therefore the accuracy knob.
+
+    At most ``MAX_KEYS`` leases are kept. Past that the least recently used
+    one is evicted and its unspent tokens are given back to the budget.
+    """
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._leases: "OrderedDict[str, _Lease]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._giving_back: Set[asyncio.Task] = set()
+        self.local_hits = 0
+        self.leases = 0
+
+    async def acquire(self, policy: RateLimitPolicy) -> RateLimitResult:
+        lease = self._leases.get(policy.key)
+        if lease is None or lease.expires_at <= time.monotonic():
+            lease = await self._lease(policy)
+        else:
+            self._leases.move_to_end(policy.key)
+
+        if lease.tokens <= 0 and not lease.exhausted:
+            # Spent before the refill landed, or the refill failed
+            if lease.refill is None:
+                lease.refill = asyncio.create_task(self._refill(policy, lease))
+            await asyncio.shield(lease.refill)
 
+        if lease.tokens <= 0:
+            retry_after = math.ceil(lease.expires_at - time.monotonic())
+            return RateLimitResult(False, 0, max(retry_after, 1), policy)
 
-async def check_rate_limit(key: str, limit: int, duration: int) -> None:
+        lease.tokens -= 1
+        self.local_hits += 1
+        if lease.tokens * 4 <= policy.lease_size and lease.refill is None:
+            lease.refill = asyncio.create_task(self._refill(policy, lease))
+        return RateLimitResult(True, lease.tokens, 0, policy)
+
+    def release(self, policy: RateLimitPolicy) -> None:
+        """Give back a token taken by ``acquire`` for a request denied later."""
+        lease = self._leases.get(policy.key)
+        if lease is not None and lease.expires_at > time.monotonic():
+            lease.tokens += 1
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.local_hits + self.leases
+        return {
+            "size": len(self._leases),
+            "hits": self.local_hits,
+            "misses": self.leases,
+            "hit_ratio": round(self.local_hits / lookups, 4) if lookups else 0.0,
+        }
+
+    async def _lease(self, policy: RateLimitPolicy) -> _Lease:
+        pending = self._pending.get(policy.key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[policy.key] = future
+        try:
+            granted, window_left_ms, window = await self._fetch(policy)
+            lease = _Lease(
+                granted,
+                time.monotonic() + window_left_ms / 1000,
+                granted < policy.lease_size,
+                window,
+            )
+            self._leases[policy.key] = lease
+            self._leases.move_to_end(policy.key)
+            if len(self._leases) > self.MAX_KEYS:
+                self._evict()
+            future.set_result(lease)
+            return lease
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it, don't warn if there are none
+            raise
+        finally:
+            del self._pending[policy.key]
+
+    def _evict(self) -> None:
+        """Drop least recently used leases down to ``MAX_KEYS``."""
+        now = time.monotonic()
+        unspent = []
+        for _ in range(len(self._leases)):
+            if len(self._leases) <= self.MAX_KEYS:
+                break
+            key, lease = self._leases.popitem(last=False)
+            if lease.refill is not None:
+                # Its refill still lands on this lease, keep it for now
+                self._leases[key] = lease
+                continue
+            if lease.expires_at > now and lease.tokens > 0:
+                unspent.append((f"rate:lease:{key}:{lease.window}", lease.tokens))
+        if unspent:
+            task = asyncio.create_task(self._give_back(unspent))
+            self._giving_back.add(task)
+            task.add_done_callback(self._giving_back.discard)
+
+    async def _give_back(self, unspent: List[tuple]) -> None:
+        try:
+            async with redis_client.client.pipeline(transaction=False) as pipe:
+                for key, tokens in unspent:
+                    pipe.decrby(key, tokens)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to give back evicted lease tokens: {str(e)}")
+
+    async def _refill(self, policy: RateLimitPolicy, lease: _Lease) -> None:
+        try:
+            granted, window_left_ms, window = await self._fetch(policy)
+            expires_at = time.monotonic() + window_left_ms / 1000
+            if expires_at - lease.expires_at > 0.5:
+                # The window rolled over, unspent tokens are void.
+                lease.tokens = 0
+                lease.expires_at = expires_at
+                lease.window = window
+            lease.tokens += granted
+            lease.exhausted = granted < policy.lease_size
+        except Exception as e:
+            logger.error(f"Failed to refill rate limit lease {policy.key}: {str(e)}")
+        finally:
+            lease.refill = None
+
+    async def _fetch(self, policy: RateLimitPolicy) -> tuple:
+        self.leases += 1
+        keys = [f"rate:lease:{policy.key}"]
+        args = [policy.limit, policy.duration, policy.lease_size]
+        granted, window_left_ms, window = await _evalsha("lease", keys, args)
+        return int(granted), int(window_left_ms), int(window)
+
+
+local_buckets = LocalTokenBuckets()
+
+
+async def load_scripts() -> None:
+    """Register the limiter scripts and cache their SHAs for EVALSHA."""
     if not redis_client.client:
         return
+    for name, script in SCRIPTS.items():
+        _script_shas[name] = await redis_client.client.script_load(script)
 
-    now = int(time.time())
-    redis_key = f"rate:{key}:{now // duration}"
 
-    count = await redis_client.client.incr(redis_key)
+async def _evalsha(name: str, keys: List[str], args: List):
+    if name not in _script_shas:
+        await load_scripts()
+    try:
+        return await redis_client.client.evalsha(
+            _script_shas[name], len(keys), *keys, *args
+        )
+    except NoScriptError:
+        await load_scripts()
+        return await redis_client.client.evalsha(
+            _script_shas[name], len(keys), *keys, *args
+        )
+
 
-    if count == 1:
-        await redis_client.client.expire(redis_key, duration * 2)
-    if count > limit:
-        retry_after = duration - (now % duration)
+def get_client_id(request: Request) -> str:
+    user_id = getattr(request.state, "user_id", None)
+    if user_id:
+        return f"user:{user_id}"
 
-        ttl = await redis_client.client.ttl(redis_key)
-        if ttl > 0:
-            retry_after = min(retry_after, ttl)
+    return f"ip:{request.client.host}"
 
+
+def client_policy(client_id: str) -> RateLimitPolicy:
+    """The gateway-wide limit every client is subject to."""
+    return RateLimitPolicy(
+        key=f"client:{client_id}",
+        limit=settings.CLIENT_RATE_LIMIT,
+        duration=settings.CLIENT_RATE_LIMIT_PERIOD,
+        algorithm=RateLimitAlgorithm(settings.CLIENT_RATE_LIMIT_ALGORITHM),
+        lease_size=settings.CLIENT_RATE_LIMIT_LEASE_SIZE,
+    )
+
+
+async def evaluate_rate_limits(
+    policies: Sequence[RateLimitPolicy],
+) -> RateLimitResult:
+    keys: List[str] = []
+    args: List = [len(policies)]
+    member = uuid.uuid4().hex
+    for policy in policies:
+        algorithm = policy.algorithm or RateLimitAlgorithm.FIXED_WINDOW
+        keys.append(f"rate:{algorithm.value}:{policy.key}")
+        args.extend([algorithm.value, policy.limit, policy.duration, member])
+
+    result = await _evalsha("limit", keys, args)
+    allowed, remaining, retry_after_ms, index = result
+    return RateLimitResult(
+        allowed=bool(allowed),
+        remaining=max(int(remaining), 0),
+        retry_after=math.ceil(int(retry_after_ms) / 1000),
+        policy=policies[int(index) - 1] if index else None,
+    )
+
+
+async def check_rate_limits(
+    policies: Sequence[RateLimitPolicy],
+) -> Optional[RateLimitResult]:
+    """Verdict of the tightest policy that denies, None when all allow.
+
+    Policies with a lease size are answered from local token leases, the
+    rest are evaluated together in one Redis call. Lease tokens taken for a
+    request the Redis policies then deny are given back, so like in the
+    script nothing is consumed unless every policy allows.
+    """
+    if not redis_client.client or not policies:
+        return None
+
+    leased: List[RateLimitPolicy] = []
+    exact: List[RateLimitPolicy] = []
+    denied: Optional[RateLimitResult] = None
+    for policy in policies:
+        if policy.lease_size <= 0:
+            exact.append(policy)
+            continue
+        result = await local_buckets.acquire(policy)
+        if not result.allowed:
+            denied = result
+            break
+        leased.append(policy)
+
+    if denied is None and exact:
+        result = await evaluate_rate_limits(exact)
+        if not result.allowed:
+            denied = result
+
+    if denied is not None:
+        for policy in leased:
+            local_buckets.release(policy)
+        RATE_LIMIT_REJECTIONS.labels(denied.policy.key.split(":", 1)[0]).inc()
+    return denied
+
+
+async def enforce_rate_limits(policies: Sequence[RateLimitPolicy]) -> None:
+    """Raise ``RateLimitError`` for the tightest policy that denies."""
+    result = await check_rate_limits(policies)
+    if result is not None:
+        policy = result.policy
+        retry_after = max(result.retry_after, 1)
         raise RateLimitError(
-            detail=f"Rate limit exceeded. {limit} requests allowed per {duration} seconds. Retry after {retry_after} seconds.",
+            detail=f"Rate limit exceeded. {policy.limit} requests allowed per {policy.duration} seconds. Retry after {retry_after} seconds.",
             retry_after=retry_after,
         )
+
+
+async def check_rate_limit(
+    key: str,
+    limit: int,
+    duration: int,
+    algorithm: Optional[RateLimitAlgorithm] = None,
+) -> None:
+    await enforce_rate_limits(
+        [
+            RateLimitPolicy(
+                key, limit, duration, algorithm or RateLimitAlgorithm.FIXED_WINDOW
+            )
+        ]
+    )
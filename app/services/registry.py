@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.postgres import SessionLocal
+from app.models.service import Service
+from app.services.circuit_breaker import circuit_breakers
+from app.services.invalidation import invalidation_bus
+from app.services.load_balancer import load_balancer, upstream_targets
+from app.services.log_policy import LogPolicy
+from app.services.routing import RouteTrie
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceSnapshot:
+    """Immutable copy of a ``Service`` row used on the gateway hot path.
+
+    ``log_rules`` holds the service's log policy, compiled once here, and
+    ``upstream_targets`` its ``(url, weight)`` targets.
+    """
+
+    _COLUMNS = tuple(column.name for column in Service.__table__.columns)
+    __slots__ = _COLUMNS + ("log_rules", "upstream_targets")
+
+    def __init__(self, service: Service):
+        for name in self._COLUMNS:
+            value = getattr(service, name)
+            if isinstance(value, list):
+                value = tuple(value)
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "log_rules", LogPolicy(service.log_policy))
+        object.__setattr__(self, "upstream_targets", upstream_targets(service))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return f"ServiceSnapshot(id={self.id}, name={self.name!r})"
+
+
+class ServiceRegistry:
+    """Per-worker cache of service configs and the gateway route table.
+
+    The registry is loaded at startup and kept current through invalidations
+    published by ``create_service``, ``update_service`` and
+    ``delete_service``. A full reload every ``SERVICE_REGISTRY_TTL`` seconds
+    bounds staleness if an invalidation is ever missed. Invalidations applied
+    while a reload queries the database are newer than what it read, so they
+    are applied again on top of the reloaded services. Load balancer and
+    circuit breaker state of a deleted service is dropped with it.
+    """
+
+    TOPIC = "service"
+
+    def __init__(self):
+        self._services: Dict[int, ServiceSnapshot] = {}
+        self._trie: RouteTrie[ServiceSnapshot] = RouteTrie()
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Changes applied during each reload in progress
+        self._changes: List[Dict[int, Optional[ServiceSnapshot]]] = []
+        self.loaded_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    async def start(self) -> None:
+        invalidation_bus.subscribe(self.TOPIC, self._on_invalidation, self.load)
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Failed to load service registry: {str(e)}")
+        self._refresh_task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def load(self, db: Optional[AsyncSession] = None) -> None:
+        if db is None:
+            async with SessionLocal() as session:
+                return await self.load(session)
+
+        changes: Dict[int, Optional[ServiceSnapshot]] = {}
+        self._changes.append(changes)
+        try:
+            result = await db.execute(select(Service))
+            rows = result.scalars().all()
+        finally:
+            self._changes.remove(changes)
+
+        services = {}
+        for service in rows:
+            snapshot = ServiceSnapshot(service)
+            services[snapshot.id] = snapshot
+        for service_id, snapshot in changes.items():
+            if snapshot is None:
+                services.pop(service_id, None)
+            else:
+                services[service_id] = snapshot
+        trie: RouteTrie[ServiceSnapshot] = RouteTrie()
+        for snapshot in services.values():
+            trie.insert(snapshot.name, snapshot.owner_id, snapshot)
+
+        removed = self._services.keys() - services.keys()
+        self._services, self._trie = services, trie
+        self.loaded_at = time.monotonic()
+        for service_id in removed:
+            self._forget(service_id)
+        logger.info(f"Loaded {len(services)} services into the registry")
+
+    def get(self, service_id: int) -> Optional[ServiceSnapshot]:
+        return self._services.get(service_id)
+
+    def all(self) -> List[ServiceSnapshot]:
+        return list(self._services.values())
+
+    def resolve(
+        self, path: str, owner_id: int
+    ) -> Optional[Tuple[ServiceSnapshot, str]]:
+        route = self._trie.match(path, owner_id)
+        if route is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return route
+
+    async def invalidate(self, service_id: int, service: Optional[Service] = None):
+        """Apply a change locally and tell every other worker to refresh."""
+        self._apply(service_id, ServiceSnapshot(service) if service else None)
+        await invalidation_bus.publish(self.TOPIC, service_id)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._services),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "age_seconds": (
+                round(time.monotonic() - self.loaded_at, 2) if self.loaded else 0.0
+            ),
+        }
+
+    def _apply(self, service_id: int, snapshot: Optional[ServiceSnapshot]) -> None:
+        self.invalidations += 1
+        for changes in self._changes:
+            changes[service_id] = snapshot
+        previous = self._services.pop(service_id, None)
+        if previous:
+            self._trie.remove(previous.name, previous.owner_id)
+        if snapshot:
+            self._services[service_id] = snapshot
+            self._trie.insert(snapshot.name, snapshot.owner_id, snapshot)
+        elif previous:
+            self._forget(service_id)
+
+    @staticmethod
+    def _forget(service_id: int) -> None:
+        load_balancer.forget(service_id)
+        circuit_breakers.forget(service_id)
+
+    async def _on_invalidation(self, key: str) -> None:
+        service_id = int(key)
+        async with SessionLocal() as db:
+            result = await db.execute(select(Service).where(Service.id == service_id))
+            service = result.scalars().first()
+        self._apply(service_id, ServiceSnapshot(service) if service else None)
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.SERVICE_REGISTRY_TTL)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error(f"Failed to refresh service registry: {str(e)}")
+
+
+service_registry = ServiceRegistry()
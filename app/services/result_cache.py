@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from app.db.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Shares expensive query results between requests and workers.
+
+    Results are stored as JSON in Redis for a short TTL. Concurrent misses
+    for the same key within a worker are coalesced onto a single
+    computation, so a burst of identical dashboard refreshes costs one
+    query per worker at most, and one overall once the first result lands
+    in Redis.
+
+    ``stats`` reports as ``size`` the results this worker stored that have
+    not expired yet, ``in_flight`` the computations running and
+    ``coalesced`` the requests that waited on another one's computation.
+    """
+
+    PREFIX = "cache:"
+    MAX_TRACKED = 1024  # stored keys tracked before expired ones are pruned
+
+    def __init__(self):
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._expiries: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_compute(
+        self, key: str, ttl: int, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            result = await self._load(key)
+            if result is None:
+                self.misses += 1
+                result = await compute()
+                await self._store(key, ttl, result)
+            else:
+                self.hits += 1
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it, don't warn if there are none
+            raise
+        finally:
+            del self._pending[key]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        self._prune()
+        return {
+            "size": len(self._expiries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": 0,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._pending),
+        }
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key, expires_at in list(self._expiries.items()):
+            if expires_at <= now:
+                del self._expiries[key]
+
+    async def _load(self, key: str) -> Any:
+        if not redis_client.client:
+            return None
+        try:
+            cached = await redis_client.client.get(self.PREFIX + key)
+        except Exception as e:
+            logger.warning(f"Failed to read cached result {key}: {str(e)}")
+            return None
+        return json.loads(cached) if cached is not None else None
+
+    async def _store(self, key: str, ttl: int, result: Any) -> None:
+        if not redis_client.client or ttl <= 0:
+            return
+        try:
+            await redis_client.client.set(self.PREFIX + key, json.dumps(result), ex=ttl)
+        except Exception as e:
+            logger.warning(f"Failed to cache result {key}: {str(e)}")
+            return
+        self._expiries[key] = time.monotonic() + ttl
+        if len(self._expiries) > self.MAX_TRACKED:
+            self._prune()
+
+
+result_cache = ResultCache()
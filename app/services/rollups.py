@@ -0,0 +1,291 @@
+import logging
+import re
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from app.core.sketch import LatencySketch
+from app.db.log_storage import log_collection
+from app.db.mongo_indexes import ROLLUP_COLLECTION, reconcile_indexes
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in ms of the coarse latency histogram kept per bucket. Slower
+# requests land in the "inf" bin.
+LATENCY_BINS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+PERCENTILES = (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+# Route templates keep this many path segments, deeper ones collapse into "*"
+ROUTE_MAX_SEGMENTS = 4
+# Path segments that identify a resource rather than a route: numbers, UUIDs,
+# long hex or base64-ish tokens
+_ID_SEGMENT = re.compile(
+    r"^(\d+|[0-9a-fA-F-]{32,36}|[0-9a-fA-F]{12,}|[A-Za-z0-9_=-]{24,})$"
+)
+
+_sketch = LatencySketch()
+
+
+def minute_of(timestamp: datetime) -> datetime:
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def latency_bin(response_time: float) -> str:
+    index = bisect_left(LATENCY_BINS, response_time)
+    return str(LATENCY_BINS[index]) if index < len(LATENCY_BINS) else "inf"
+
+
+def status_class(status_code: int) -> str:
+    return f"{min(max(status_code // 100, 1), 5)}xx"
+
+
+def route_template(path: str) -> str:
+    """Low cardinality route of a logged path, e.g. ``/api/orders/{id}``.
+
+    The scheme, host and query are dropped, segments that look like ids
+    become ``{id}`` and anything past ``ROUTE_MAX_SEGMENTS`` becomes ``*``.
+    """
+    segments = [segment for segment in urlsplit(path).path.split("/") if segment]
+    route = [
+        "{id}" if _ID_SEGMENT.match(segment) else segment
+        for segment in segments[:ROUTE_MAX_SEGMENTS]
+    ]
+    if len(segments) > ROUTE_MAX_SEGMENTS:
+        route.append("*")
+    return "/" + "/".join(route)
+
+
+def build_rollup_updates(records: Iterable[Dict[str, Any]]) -> List[UpdateOne]:
+    """Fold request logs into one ``$inc`` upsert per rollup bucket.
+
+    A bucket covers one minute of traffic for a (service, method, route)
+    triple, where the route is the ``route_template`` of the logged path,
+    stored in the bucket's ``path`` field. Keying on raw paths would make
+    one bucket per distinct URL. A batch of logs turns into as many updates
+    as distinct buckets it touches. Besides the counters, each bucket keeps
+    the bins of a ``LatencySketch`` under ``sketch.<bin>`` so percentiles
+    can be merged over any window.
+    """
+    buckets: Dict[tuple, Dict[str, float]] = {}
+    for record in records:
+        key = (
+            record.get("service_id"),
+            minute_of(record["timestamp"]),
+            record["method"],
+            route_template(record["path"]),
+        )
+        counters = buckets.setdefault(key, {})
+        response_time = record["response_time"]
+        for field, value in (
+            ("count", 1),
+            (f"status.{status_class(record['status_code'])}", 1),
+            ("latency_sum", response_time),
+            (f"latency.{latency_bin(response_time)}", 1),
+            (f"sketch.{_sketch.key(response_time)}", 1),
+            ("bytes", record.get("response_size") or 0),
+        ):
+            counters[field] = counters.get(field, 0) + value
+
+    return [
+        UpdateOne(
+            {
+                "service_id": service_id,
+                "minute": minute,
+                "method": method,
+                "path": path,
+            },
+            {"$inc": counters},
+            upsert=True,
+        )
+        for (service_id, minute, method, path), counters in buckets.items()
+    ]
+
+
+async def write_rollups(
+    mongodb: AsyncIOMotorDatabase, records: List[Dict[str, Any]]
+) -> None:
+    updates = build_rollup_updates(records)
+    if updates:
+        await mongodb[ROLLUP_COLLECTION].bulk_write(updates, ordered=False)
+
+
+def rollup_match(
+    service_id: Optional[int] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Match rollup buckets overlapping the window, at minute granularity."""
+    match_query: Dict[str, Any] = {}
+    if service_id:
+        match_query["service_id"] = service_id
+    if from_date or to_date:
+        match_query["minute"] = {}
+        if from_date:
+            match_query["minute"]["$gte"] = minute_of(from_date)
+        if to_date:
+            match_query["minute"]["$lte"] = to_date
+    return match_query
+
+
+async def summarize_rollups(
+    mongodb: AsyncIOMotorDatabase, match_query: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Totals over the matching buckets.
+
+    Returns the request count, latency sum, bytes and per status class
+    counts, all zero when nothing matches.
+    """
+    group: Dict[str, Any] = {
+        "_id": None,
+        "count": {"$sum": "$count"},
+        "latency_sum": {"$sum": "$latency_sum"},
+        "bytes": {"$sum": "$bytes"},
+    }
+    for status in STATUS_CLASSES:
+        group[status] = {"$sum": f"$status.{status}"}
+
+    pipeline = [{"$match": match_query}, {"$group": group}]
+    result = await mongodb[ROLLUP_COLLECTION].aggregate(pipeline).to_list(1)
+    totals = result[0] if result else {}
+    return {
+        "count": totals.get("count", 0),
+        "latency_sum": totals.get("latency_sum", 0.0),
+        "bytes": totals.get("bytes", 0),
+        "status": {status: totals.get(status, 0) for status in STATUS_CLASSES},
+    }
+
+
+async def top_rollup_endpoints(
+    mongodb: AsyncIOMotorDatabase, match_query: Dict[str, Any], limit: int = 5
+) -> List[Dict[str, Any]]:
+    pipeline = [
+        {"$match": match_query},
+        {
+            "$group": {
+                "_id": {"method": "$method", "path": "$path"},
+                "count": {"$sum": "$count"},
+                "latency_sum": {"$sum": "$latency_sum"},
+            }
+        },
+        {"$sort": {"count": -1}},
+        {"$limit": limit},
+    ]
+    endpoints = await mongodb[ROLLUP_COLLECTION].aggregate(pipeline).to_list(limit)
+
+    results = []
+    for endpoint in endpoints:
+        sketch = await merge_rollup_sketches(
+            mongodb, {**match_query, **endpoint["_id"]}
+        )
+        results.append(
+            {
+                "method": endpoint["_id"]["method"],
+                "path": endpoint["_id"]["path"],
+                "count": endpoint["count"],
+                "avg_response_time": round(
+                    endpoint["latency_sum"] / endpoint["count"], 2
+                ),
+                **latency_percentiles(sketch),
+            }
+        )
+    return results
+
+
+async def merge_rollup_sketches(
+    mongodb: AsyncIOMotorDatabase, match_query: Dict[str, Any]
+) -> LatencySketch:
+    """Merge the latency sketches of the matching buckets server side.
+
+    Only one row per occupied bin comes back, whatever the window size.
+    """
+    pipeline = [
+        {"$match": match_query},
+        {"$project": {"_id": 0, "bins": {"$objectToArray": "$sketch"}}},
+        {"$unwind": "$bins"},
+        {"$group": {"_id": "$bins.k", "count": {"$sum": "$bins.v"}}},
+    ]
+    bins = await mongodb[ROLLUP_COLLECTION].aggregate(pipeline).to_list(None)
+    return LatencySketch.from_bins((row["_id"], row["count"]) for row in bins)
+
+
+def latency_percentiles(sketch: LatencySketch) -> Dict[str, float]:
+    """``p50_response_time`` and friends, 0 when there is no traffic."""
+    percentiles = {}
+    for name, q in PERCENTILES:
+        value = sketch.quantile(q)
+        percentiles[f"{name}_response_time"] = round(value, 2) if value else 0.0
+    return percentiles
+
+
+async def rebuild_rollups(
+    mongodb: AsyncIOMotorDatabase,
+    from_date: datetime,
+    to_date: datetime,
+    batch_size: int = 5000,
+) -> int:
+    """Recompute the rollups of whole minutes in [from_date, to_date).
+
+    Used to backfill rollups from raw logs written before they existed.
+    Buckets in the window are dropped first so rebuilding is repeatable.
+    Returns the number of raw logs folded in.
+    """
+    from_date, to_date = minute_of(from_date), minute_of(to_date)
+    await mongodb[ROLLUP_COLLECTION].delete_many(
+        {"minute": {"$gte": from_date, "$lt": to_date}}
+    )
+
+    cursor = log_collection(mongodb).find(
+        {"timestamp": {"$gte": from_date, "$lt": to_date}},
+        {
+            "_id": 0,
+            "service_id": 1,
+            "timestamp": 1,
+            "method": 1,
+            "path": 1,
+            "status_code": 1,
+            "response_time": 1,
+            "response_size": 1,
+        },
+        batch_size=batch_size,
+    )
+    total = 0
+    batch: List[Dict[str, Any]] = []
+    async for record in cursor:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            await write_rollups(mongodb, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        await write_rollups(mongodb, batch)
+        total += len(batch)
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    from app.db.mongodb import close_mongo_connection, connect_to_mongo, get_mongodb
+
+    parser = argparse.ArgumentParser(description="Rebuild request rollups")
+    parser.add_argument("--days", type=int, default=1, help="days to rebuild")
+    args = parser.parse_args()
+
+    async def main() -> None:
+        await connect_to_mongo()
+        try:
+            mongodb = await get_mongodb()
+            await reconcile_indexes(mongodb)
+            to_date = datetime.utcnow() + timedelta(minutes=1)
+            from_date = to_date - timedelta(days=args.days)
+            total = await rebuild_rollups(mongodb, from_date, to_date)
+            print(f"Folded {total} request logs into rollups")
+        finally:
+            await close_mongo_connection()
+
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+from typing import Dict, Generic, Optional, Tuple, TypeVar
+from urllib.parse import unquote
+
+T = TypeVar("T")
+
+
+class _Node(Generic[T]):
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node[T]"] = {}
+        self.values: Dict[int, T] = {}
+
+
+class RouteTrie(Generic[T]):
+    """Trie over path segments mapping service names to values per owner.
+
+    A lookup walks the request path once and returns the value registered
+    under the longest matching name together with the unmatched remainder,
+    so matching costs O(path length) whatever the number of services.
+    """
+
+    def __init__(self):
+        self._root: _Node[T] = _Node()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _segments(name: str) -> list:
+        return [segment for segment in name.strip("/").split("/") if segment]
+
+    def insert(self, name: str, owner_id: int, value: T) -> None:
+        node = self._root
+        for segment in self._segments(name):
+            node = node.children.setdefault(segment, _Node())
+        if owner_id not in node.values:
+            self._size += 1
+        node.values[owner_id] = value
+
+    def remove(self, name: str, owner_id: int) -> None:
+        path = [self._root]
+        for segment in self._segments(name):
+            node = path[-1].children.get(segment)
+            if node is None:
+                return
+            path.append(node)
+
+        if path[-1].values.pop(owner_id, None) is None:
+            return
+        self._size -= 1
+
+        segments = self._segments(name)
+        for depth in range(len(segments), 0, -1):
+            node = path[depth]
+            if node.values or node.children:
+                break
+            del path[depth - 1].children[segments[depth - 1]]
+
+    def match(self, path: str, owner_id: int) -> Optional[Tuple[T, str]]:
+        """Longest-prefix match of the percent-encoded ``path`` for ``owner_id``.
+
+        Segments are decoded one at a time before lookup. Returns the matched
+        value and the still-encoded rest of the path (without the leading
+        slash, trailing slash preserved) or None.
+        """
+        node = self._root
+        best = None
+        position = 0
+        length = len(path)
+
+        while position < length and path[position] == "/":
+            position += 1
+
+        while position < length:
+            end = path.find("/", position)
+            if end == -1:
+                end = length
+            node = node.children.get(unquote(path[position:end]))
+            if node is None:
+                break
+            position = end
+            while position < length and path[position] == "/":
+                position += 1
+            value = node.values.get(owner_id)
+            if value is not None:
+                best = (value, path[position:])
+
+        return best
+
+
+def upstream_url(base_url: str, path: str) -> str:
+    """Append the unmatched request path to a service's base URL."""
+    if not path:
+        return base_url
+    return f"{base_url.rstrip('/')}/{path}"
+
+
+def is_safe_path(path: str) -> bool:
+    """Whether a percent-encoded path has no ``.`` or ``..`` segment.
+
+    Segments are checked decoded, including ones hidden behind an encoded
+    slash, since upstreams may decode ``%2F`` and ``%2E`` themselves.
+    """
+    return not any(
+        part in (".", "..")
+        for segment in path.split("/")
+        for part in unquote(segment).split("/")
+    )
@@ -4,9 +4,21 @@ from sqlalchemy.sql import func
 from typing import List, Optional
 from datetime import datetime
 
+from app.core.config import settings
 from app.models.service import Service, ServiceStatus
 from app.schemas.service import ServiceCreate, ServiceUpdate, ServiceWithStats
+from app.db.log_storage import log_collection
 from app.db.mongodb import get_mongodb
+from app.services.circuit_breaker import circuit_breakers
+from app.services.load_balancer import load_balancer, upstream_targets
+from app.services.registry import service_registry
+from app.services.log_service import raw_latency_sketch
+from app.services.rollups import (
+    latency_percentiles,
+    merge_rollup_sketches,
+    rollup_match,
+    summarize_rollups,
+)
 
 
 async def create_service(
@@ -21,14 +33,26 @@ async def create_service(
         is_public=service_in.is_public,
         rate_limit=service_in.rate_limit,
         rate_limit_duration=service_in.rate_limit_duration,
+        rate_limit_algorithm=service_in.rate_limit_algorithm,
+        rate_limit_lease_size=service_in.rate_limit_lease_size,
+        timeout=service_in.timeout,
         require_authentication=service_in.require_authentication,
         auth_header_name=service_in.auth_header_name,
         forward_headers=service_in.forward_headers,
+        log_policy=(
+            service_in.log_policy.model_dump() if service_in.log_policy else None
+        ),
+        targets=(
+            [target.model_dump() for target in service_in.targets]
+            if service_in.targets
+            else None
+        ),
         owner_id=owner_id,
     )
     db.add(service)
     await db.commit()
     await db.refresh(service)
+    await service_registry.invalidate(service.id, service)
     return service
 
 
@@ -88,6 +112,7 @@ async def update_service(
 
     await db.commit()
     await db.refresh(service)
+    await service_registry.invalidate(service.id, service)
     return service
 
 
@@ -95,6 +120,7 @@ async def delete_service(db: AsyncSession, service_id: int) -> bool:
     stmt = delete(Service).where(Service.id == service_id)
     result = await db.execute(stmt)
     await db.commit()
+    await service_registry.invalidate(service_id)
     return result.rowcount > 0
 
 
@@ -109,10 +135,25 @@ async def get_service_with_stats(
         "total_requests": 0,
         "success_rate": 0.0,
         "avg_response_time": 0.0,
+        "circuit": circuit_breakers.status(service_id),
+        "target_stats": load_balancer.status(service_id, upstream_targets(service)),
     }
 
     mongodb = await get_mongodb()
 
+    if settings.LOG_ROLLUPS_ENABLED:
+        totals = await summarize_rollups(mongodb, rollup_match(service_id))
+        total = totals["count"]
+        if total:
+            status = totals["status"]
+            success_count = status["1xx"] + status["2xx"] + status["3xx"]
+            service_dict["total_requests"] = total
+            service_dict["success_rate"] = round(success_count / total * 100, 2)
+            service_dict["avg_response_time"] = round(totals["latency_sum"] / total, 2)
+            sketch = await merge_rollup_sketches(mongodb, rollup_match(service_id))
+            service_dict.update(latency_percentiles(sketch))
+        return ServiceWithStats(**service_dict)
+
     pipeline = [
         {"$match": {"service_id": service_id}},
         {
@@ -127,7 +168,7 @@ async def get_service_with_stats(
         },
     ]
 
-    result = await mongodb["request_logs"].aggregate(pipeline).to_list(1)
+    result = await log_collection(mongodb).aggregate(pipeline).to_list(1)
 
     if result:
         stats = result[0]
@@ -138,5 +179,7 @@ async def get_service_with_stats(
             else 0.0
         )
         service_dict["avg_response_time"] = round(stats["avg_response_time"], 2)
+        sketch = await raw_latency_sketch(mongodb, {"service_id": service_id})
+        service_dict.update(latency_percentiles(sketch))
 
     return ServiceWithStats(**service_dict)
@@ -0,0 +1,115 @@
+"""Per-request overhead of the gateway middleware stack.
+
+Drives the ASGI apps in-process, without a server or network, and compares:
+
+* ``bare``: the endpoint with no middleware at all
+* ``base_http``: three pass-through ``BaseHTTPMiddleware`` layers, which is
+  what the stack cost before the middlewares were rewritten as raw ASGI
+* ``gateway``: the gateway's authentication, rate limiting and request
+  logging middlewares with an authenticated request
+
+Redis is not connected, so the rate limiter takes its no-op path and the
+numbers only reflect middleware plumbing. Run with::
+
+    python -m benchmarks.middleware_overhead [requests]
+"""
+import asyncio
+import logging
+import sys
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.security import create_access_token
+from app.middleware.authentication import AuthenticationMiddleware
+from app.middleware.logging import RequestLoggingMiddleware
+from app.middleware.rate_limiting import RateLimitingMiddleware
+
+
+class PassThroughMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+
+def build_app(middlewares) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    async def ping():
+        return PlainTextResponse("pong")
+
+    for middleware in middlewares:
+        app.add_middleware(middleware)
+    return app
+
+
+async def measure(app: FastAPI, headers, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/ping",
+        "raw_path": b"/api/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+
+    disconnected = asyncio.Event()
+
+    async def request():
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                # The client stays connected until the response is sent.
+                await disconnected.wait()
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        await app(dict(scope), receive, send)
+
+    async def send(message):
+        pass
+
+    for _ in range(min(requests, 1000)):
+        await request()
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await request()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def main(requests: int) -> None:
+    logging.disable(logging.INFO)
+    token = create_access_token({"sub": "benchmark"})
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+
+    stacks = {
+        "bare": [],
+        "base_http": [PassThroughMiddleware] * 3,
+        "gateway": [
+            RequestLoggingMiddleware,
+            RateLimitingMiddleware,
+            AuthenticationMiddleware,
+        ],
+    }
+    baseline = None
+    for name, middlewares in stacks.items():
+        per_request = await measure(build_app(middlewares), headers, requests)
+        if baseline is None:
+            baseline = per_request
+        overhead = per_request - baseline
+        print(f"{name:>10}: {per_request:8.1f} us/request ({overhead:+.1f} us)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,26 @@
+"""add service timeout
+
+Revision ID: 3b9d2e6a1c47
+Revises: 5f37ade049f9
+Create Date: 2026-10-17 09:12:03.418226
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "3b9d2e6a1c47"
+down_revision: Union[str, None] = "5f37ade049f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("services", sa.Column("timeout", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("services", "timeout")
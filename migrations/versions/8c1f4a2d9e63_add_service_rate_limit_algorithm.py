@@ -0,0 +1,40 @@
+"""add service rate limit algorithm
+
+Revision ID: 8c1f4a2d9e63
+Revises: 3b9d2e6a1c47
+Create Date: 2026-10-17 11:40:27.905114
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "8c1f4a2d9e63"
+down_revision: Union[str, None] = "3b9d2e6a1c47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+rate_limit_algorithm = sa.Enum(
+    "FIXED_WINDOW", "GCRA", "SLIDING_WINDOW_LOG", name="ratelimitalgorithm"
+)
+
+
+def upgrade() -> None:
+    rate_limit_algorithm.create(op.get_bind(), checkfirst=True)
+    op.add_column(
+        "services",
+        sa.Column(
+            "rate_limit_algorithm",
+            rate_limit_algorithm,
+            server_default="FIXED_WINDOW",
+            nullable=True,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("services", "rate_limit_algorithm")
+    rate_limit_algorithm.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,26 @@
+"""add service log policy
+
+Revision ID: a6e3c9b72d14
+Revises: d47e0b8a5f12
+Create Date: 2026-10-17 16:42:08.512093
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "a6e3c9b72d14"
+down_revision: Union[str, None] = "d47e0b8a5f12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("services", sa.Column("log_policy", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("services", "log_policy")
@@ -0,0 +1,28 @@
+"""add service rate limit lease size
+
+Revision ID: d47e0b8a5f12
+Revises: 8c1f4a2d9e63
+Create Date: 2026-10-17 13:05:51.226470
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "d47e0b8a5f12"
+down_revision: Union[str, None] = "8c1f4a2d9e63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "services", sa.Column("rate_limit_lease_size", sa.Integer(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("services", "rate_limit_lease_size")
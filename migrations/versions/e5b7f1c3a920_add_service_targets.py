@@ -0,0 +1,26 @@
+"""add service targets
+
+Revision ID: e5b7f1c3a920
+Revises: a6e3c9b72d14
+Create Date: 2026-10-17 19:05:31.204417
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e5b7f1c3a920"
+down_revision: Union[str, None] = "a6e3c9b72d14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("services", sa.Column("targets", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("services", "targets")
@@ -0,0 +1,34 @@
+import time
+
+from app.core.cache import MISSING, TTLCache
+
+
+def test_negative_entries_are_distinct_from_misses():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("unknown-key", None)
+
+    assert cache.get("unknown-key") is None
+    assert cache.get("other-key") is MISSING
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is MISSING
+    assert cache.get("c") == 3
+
+
+def test_entries_expire(monkeypatch):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1, ttl=5)
+    now = time.monotonic()
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 6)
+
+    assert cache.get("a") is MISSING
+    assert cache.stats()["misses"] == 1
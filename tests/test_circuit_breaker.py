@@ -0,0 +1,77 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.core.errors import ServiceUnavailableError
+from app.services.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    CircuitState,
+)
+
+
+@pytest.fixture(autouse=True)
+def breaker_settings(monkeypatch):
+    monkeypatch.setattr(settings, "CIRCUIT_MIN_REQUESTS", 4)
+    monkeypatch.setattr(settings, "CIRCUIT_FAILURE_RATE", 0.5)
+    monkeypatch.setattr(settings, "CIRCUIT_SLOW_CALL_MS", 1000)
+    monkeypatch.setattr(settings, "CIRCUIT_SLOW_RATE", 0.8)
+    monkeypatch.setattr(settings, "CIRCUIT_OPEN_SECONDS", 30)
+    monkeypatch.setattr(settings, "CIRCUIT_HALF_OPEN_REQUESTS", 2)
+
+
+def test_trips_on_error_rate_once_the_window_has_enough_requests():
+    breaker = CircuitBreaker()
+    now = time.time()
+
+    assert breaker.record(True, 10, now) is None
+    assert breaker.record(True, 10, now) is None
+    assert breaker.record(False, 10, now) is None
+    assert breaker.record(False, 10, now) is CircuitState.OPEN
+    assert breaker.allow(now + 1) == pytest.approx(29)
+
+
+def test_trips_on_slow_calls():
+    breaker = CircuitBreaker()
+    now = time.time()
+    for _ in range(3):
+        breaker.record(False, 5000, now)
+
+    assert breaker.record(False, 10, now) is None
+    assert breaker.record(False, 5000, now) is CircuitState.OPEN
+
+
+def test_half_open_probes_close_or_reopen():
+    breaker = CircuitBreaker()
+    now = time.time()
+    breaker.open(now)
+
+    assert breaker.allow(now) is None
+    assert breaker.state is CircuitState.HALF_OPEN
+    assert breaker.allow(now) is None
+    assert breaker.allow(now) == 1.0  # probes exhausted
+    assert breaker.record(False, 10, now) is None
+    assert breaker.record(False, 10, now) is CircuitState.CLOSED
+
+    breaker.open(now)
+    breaker.allow(now)
+    assert breaker.record(True, 10, now) is CircuitState.OPEN
+    assert breaker.opened_until == now + 30
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_fails_fast_with_retry_after():
+    registry = CircuitBreakerRegistry()
+    service = SimpleNamespace(id=3, name="orders")
+    for _ in range(4):
+        await registry.record(service.id, True, 10)
+
+    with pytest.raises(ServiceUnavailableError) as error:
+        registry.check(service)
+    assert error.value.headers["Retry-After"] == "30"
+
+    status = registry.status(service.id)
+    assert status["state"] == "open"
+    assert status["trips"] == 1
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services import health_checks
+from app.services.health_checks import HealthChecker, TargetHealth
+from app.services.load_balancer import LoadBalancer
+
+
+@pytest.fixture(autouse=True)
+def health_settings(monkeypatch):
+    monkeypatch.setattr(settings, "HEALTH_CHECK_INTERVAL", 10.0)
+    monkeypatch.setattr(settings, "HEALTH_CHECK_JITTER", 0.2)
+    monkeypatch.setattr(settings, "HEALTH_CHECK_HEALTHY_THRESHOLD", 2)
+    monkeypatch.setattr(settings, "HEALTH_CHECK_UNHEALTHY_THRESHOLD", 3)
+
+
+def test_health_flips_only_after_consecutive_results():
+    health = TargetHealth(1, "http://a")
+
+    assert not health.record(False, 5, "503")
+    assert not health.record(True, 5, "200")  # resets the streak
+    assert not health.record(False, 5, "503")
+    assert not health.record(False, 5, "503")
+    assert health.record(False, 5, "ConnectError")
+    assert not health.healthy
+
+    assert not health.record(True, 5, "200")
+    assert health.record(True, 5, "200")
+    assert health.healthy
+    assert len(health.history) == 7
+
+
+def test_new_targets_are_spread_over_the_interval(monkeypatch):
+    services = [
+        SimpleNamespace(
+            id=service_id,
+            status="active",
+            upstream_targets=(("http://a", 1), ("http://b", 1)),
+        )
+        for service_id in range(500)
+    ]
+    services.append(
+        SimpleNamespace(id=999, status="inactive", upstream_targets=(("http://c", 1),))
+    )
+    monkeypatch.setattr(health_checks.service_registry, "all", lambda: services)
+    checker = HealthChecker()
+
+    checker.sync(100.0)
+
+    dues = sorted(due for due, _, _ in checker._heap)
+    assert len(dues) == 1000
+    assert 100.0 <= dues[0] and dues[-1] <= 110.0
+    # No second of the interval gets more than a small share of the probes
+    per_second = [
+        sum(1 for due in dues if int(due) == second) for second in range(100, 110)
+    ]
+    assert max(per_second) < 160
+
+    services.pop(0)
+    checker.sync(105.0)
+    assert (0, "http://a") not in checker._targets
+
+
+def test_next_probe_keeps_cadence_with_jitter():
+    checker = HealthChecker()
+
+    assert 18.0 <= checker._next_due(10.0, 10.5) <= 22.0
+    # Far behind schedule, the next probe is planned from now
+    assert checker._next_due(10.0, 100.0) >= 98.0
+
+
+@pytest.mark.asyncio
+async def test_failed_probes_take_the_target_out_of_rotation(monkeypatch):
+    balancer = LoadBalancer()
+    monkeypatch.setattr(health_checks, "load_balancer", balancer)
+    transport = httpx.MockTransport(lambda request: httpx.Response(503))
+    client = httpx.AsyncClient(transport=transport)
+    monkeypatch.setattr(
+        health_checks.upstream_clients, "get_client", lambda url, count=True: client
+    )
+    transitions = []
+
+    async def store(health, detail):
+        transitions.append((health.url, health.healthy, detail))
+
+    checker = HealthChecker()
+    monkeypatch.setattr(checker, "_store_transition", store)
+    health = checker._targets[(1, "http://a")] = TargetHealth(1, "http://a")
+
+    for _ in range(3):
+        await checker._probe(health)
+
+    assert transitions == [("http://a", False, "503")]
+    service = SimpleNamespace(id=1, upstream_targets=(("http://a", 1), ("http://b", 1)))
+    pool = balancer.pool(service)
+    assert [target.healthy for target in pool.targets] == [False, True]
+    assert all(pool.pick().url == "http://b" for _ in range(20))
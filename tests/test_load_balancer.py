@@ -0,0 +1,156 @@
+import asyncio
+import random
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Request
+
+from app.api import gateway
+from app.core.config import settings
+from app.core.errors import ProxyError
+from app.models.service import Service, ServiceStatus
+from app.services.load_balancer import (
+    LoadBalancer,
+    TargetPool,
+    build_alias_table,
+    upstream_targets,
+)
+from app.services.registry import ServiceRegistry
+
+
+def test_alias_table_draws_in_proportion_to_weights():
+    random.seed(7)
+    pool = TargetPool((("http://a", 1), ("http://b", 3)))
+    draws = Counter(pool._draw().url for _ in range(20000))
+
+    assert draws["http://b"] / draws["http://a"] == pytest.approx(3, rel=0.1)
+
+
+def test_alias_table_of_equal_weights_never_aliases():
+    probability, _ = build_alias_table([2, 2, 2])
+
+    assert probability == [1.0, 1.0, 1.0]
+
+
+def test_pick_prefers_idle_fast_targets():
+    random.seed(1)
+    pool = TargetPool((("http://a", 1), ("http://b", 1)))
+    slow, fast = pool.targets
+    slow.ewma_ms, fast.ewma_ms = 200.0, 20.0
+
+    picks = Counter(pool.pick().url for _ in range(1000))
+    assert picks["http://b"] > picks["http://a"]
+
+    fast.inflight = 50
+    draws = iter([fast, slow])
+    pool._draw = lambda: next(draws)
+    assert pool.pick() is slow
+
+
+def test_consecutive_failures_eject_but_never_the_last_target(monkeypatch):
+    monkeypatch.setattr(settings, "LB_EJECT_CONSECUTIVE_FAILURES", 2)
+    pool = TargetPool((("http://a", 1), ("http://b", 1)))
+    first, second = pool.targets
+
+    for target in (first, first):
+        target.inflight += 1
+        pool.release(target, True, 5.0)
+    assert first.ejections == 1
+    assert all(pool.pick() is second for _ in range(50))
+
+    for target in (second, second):
+        target.inflight += 1
+        pool.release(target, True, 5.0)
+    assert second.ejections == 0
+
+
+def test_pools_keep_stats_across_reloaded_snapshots():
+    balancer = LoadBalancer()
+    service = SimpleNamespace(
+        id=1, base_url="http://a", targets=[{"url": "http://b", "weight": 2}]
+    )
+    service.upstream_targets = upstream_targets(service)
+    target = balancer.pool(service).acquire()
+
+    reloaded = SimpleNamespace(id=1, upstream_targets=upstream_targets(service))
+    assert balancer.pool(reloaded).targets[0] is target
+    assert balancer.status(1, reloaded.upstream_targets)[0]["inflight"] == 1
+
+    changed = SimpleNamespace(id=1, upstream_targets=(("http://c", 1),))
+    assert balancer.pool(changed).targets[0].url == "http://c"
+
+
+def test_targets_marked_down_are_never_picked():
+    balancer = LoadBalancer()
+    single = SimpleNamespace(id=1, upstream_targets=(("http://a", 1),))
+    balancer.mark(1, "http://a", False)
+
+    pool = balancer.pool(single)
+    assert not pool.healthy
+    assert pool.acquire() is None
+
+    balancer.mark(1, "http://a", True)
+    assert pool.healthy and pool.pick().url == "http://a"
+
+    both = SimpleNamespace(id=2, upstream_targets=(("http://a", 1), ("http://b", 1)))
+    balancer.mark(2, "http://a", False)
+    balancer.mark(2, "http://b", False)
+    assert balancer.pool(both).pick() is None
+
+
+def test_only_ejected_targets_fail_open():
+    pool = TargetPool((("http://a", 1), ("http://b", 1)))
+    first, second = pool.targets
+    first.ejected_until = second.ejected_until = float("inf")
+    first.healthy = False
+
+    assert all(pool.pick() is second for _ in range(20))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [asyncio.CancelledError, RuntimeError])
+async def test_gateway_releases_the_target_whatever_ends_the_request(
+    monkeypatch, error
+):
+    registry = ServiceRegistry()
+    registry.loaded_at = 0.0
+    await registry.invalidate(
+        1,
+        Service(
+            id=1,
+            name="orders",
+            base_url="http://orders",
+            status=ServiceStatus.ACTIVE,
+            owner_id=7,
+        ),
+    )
+    balancer = LoadBalancer()
+
+    async def proxy_request(**kwargs):
+        raise error()
+
+    monkeypatch.setattr(gateway, "service_registry", registry)
+    monkeypatch.setattr(gateway, "load_balancer", balancer)
+    monkeypatch.setattr(gateway, "proxy_request", proxy_request)
+    request = Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/gateway/orders/1",
+            "raw_path": b"/gateway/orders/1",
+            "query_string": b"",
+            "headers": [],
+            "client": ("127.0.0.1", 1234),
+            "state": {},
+        }
+    )
+
+    with pytest.raises((asyncio.CancelledError, ProxyError)):
+        await gateway.gateway_endpoint(
+            request, "orders", "1", db=None, current_user=SimpleNamespace(id=7)
+        )
+
+    (target,) = balancer.pool(registry.resolve("orders", 7)[0]).targets
+    assert target.inflight == 0
+    assert target.requests == 1
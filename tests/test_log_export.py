@@ -0,0 +1,92 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.schemas.log import LogFilterParams
+from app.services import log_export
+
+
+class FakeCursor:
+    def __init__(self, docs, projection):
+        self.docs = [
+            {key: value for key, value in doc.items() if projection.get(key)}
+            for doc in docs
+        ]
+
+    def sort(self, *args):
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def limit(self, limit):
+        self.docs = self.docs[:limit]
+        return self
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+
+        return iterate()
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return FakeCursor(self.docs, projection)
+
+
+LOGS = [
+    {
+        "_id": ObjectId(),
+        "timestamp": datetime(2024, 1, 1, 12, 0, second),
+        "method": "GET",
+        "path": "http://users/1",
+        "status_code": 200,
+        "headers": {"user-agent": "curl"},
+    }
+    for second in range(3)
+]
+
+
+async def collect(monkeypatch, **kwargs):
+    monkeypatch.setattr(log_export, "log_collection", lambda db: FakeCollection(LOGS))
+    chunks = [
+        chunk
+        async for chunk in log_export.export_logs(
+            None, LogFilterParams(limit=0), **kwargs
+        )
+    ]
+    return b"".join(chunks)
+
+
+@pytest.mark.asyncio
+async def test_ndjson_export_projects_fields(monkeypatch):
+    body = await collect(monkeypatch, fields=("timestamp", "status_code"))
+
+    rows = [json.loads(line) for line in body.decode().splitlines()]
+    assert rows[0] == {"timestamp": "2024-01-01T12:00:00", "status_code": 200}
+    assert len(rows) == 3
+
+
+@pytest.mark.asyncio
+async def test_gzipped_csv_export(monkeypatch):
+    body = await collect(
+        monkeypatch,
+        export_format="csv",
+        fields=("_id", "method", "headers"),
+        compress=True,
+    )
+
+    rows = list(csv.reader(io.StringIO(gzip.decompress(body).decode())))
+    assert rows[0] == ["_id", "method", "headers"]
+    assert rows[1] == [str(LOGS[0]["_id"]), "GET", '{"user-agent": "curl"}']
+    assert len(rows) == 4
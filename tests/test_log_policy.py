@@ -0,0 +1,50 @@
+from starlette.datastructures import Headers, QueryParams
+
+from app.services.log_policy import REDACTED, LogPolicy
+
+
+def test_headers_are_allowlisted_and_credentials_redacted():
+    headers = Headers(
+        {
+            "User-Agent": "curl/8.0",
+            "Authorization": "Bearer secret",
+            "X-API-Key": "key",
+            "X-Tenant": "acme",
+        }
+    )
+
+    allowlisted = LogPolicy({"headers": ["user-agent", "authorization"]})
+    assert allowlisted.filter_headers(headers) == {
+        "user-agent": "curl/8.0",
+        "authorization": REDACTED,
+    }
+
+    everything = LogPolicy({"headers": ["*"], "redact_headers": ["X-Tenant"]})
+    assert everything.filter_headers(headers) == {
+        "user-agent": "curl/8.0",
+        "authorization": REDACTED,
+        "x-api-key": REDACTED,
+        "x-tenant": REDACTED,
+    }
+
+
+def test_query_params_and_body_capture():
+    policy = LogPolicy({"redact_query_params": ["token"], "max_body_bytes": 4})
+
+    assert policy.filter_query_params(QueryParams("page=2&token=abc")) == {
+        "page": "2",
+        "token": REDACTED,
+    }
+    assert policy.capture_body(b'{"name": "x"}') == '{"na'
+    assert LogPolicy().capture_body(b"body") is None
+    assert LogPolicy({"query_params": False}).filter_query_params({"a": "1"}) == {}
+
+
+def test_sampling_always_keeps_errors_and_slow_requests():
+    policy = LogPolicy({"success_sample_rate": 0, "slow_request_ms": 500})
+
+    assert not policy.keep(200, 20)
+    assert policy.keep(503, 20)
+    assert policy.keep(404, 20)
+    assert policy.keep(200, 800)
+    assert LogPolicy({"success_sample_rate": 1}).keep(200, 20)
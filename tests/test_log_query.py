@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.schemas.log import LogFilterParams
+from app.services.log_service import (
+    build_log_query,
+    decode_log_cursor,
+    encode_log_cursor,
+)
+
+
+def test_cursor_round_trips_timestamp_and_id():
+    log = {"_id": ObjectId(), "timestamp": datetime(2024, 5, 1, 10, 30, 0, 123000)}
+
+    assert decode_log_cursor(encode_log_cursor(log)) == (log["timestamp"], log["_id"])
+    with pytest.raises(ValueError):
+        decode_log_cursor("not-a-cursor")
+
+
+def test_path_filter_modes():
+    contains = build_log_query(LogFilterParams(path="users"))
+    prefix = build_log_query(
+        LogFilterParams(path="http://users.svc/v1.0", path_mode="prefix")
+    )
+
+    assert contains["path"] == {"$regex": "users", "$options": "i"}
+    assert prefix["path"] == {"$regex": r"^http://users\.svc/v1\.0"}
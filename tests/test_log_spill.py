@@ -0,0 +1,243 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.services import log_writer as log_writer_module
+from app.services.log_spill import LogSpill
+from app.services.log_writer import RequestLogWriter
+
+
+def _logs(count):
+    return [{"_id": ObjectId(), "path": f"/items/{i}"} for i in range(count)]
+
+
+async def _run(function, *args):
+    return function(*args)
+
+
+@pytest.mark.asyncio
+async def test_replay_drains_segments_in_order_and_deletes_them(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_BATCH_SIZE", 2)
+    spill = LogSpill(str(tmp_path))
+    first, second = _logs(3), _logs(2)
+    assert spill.append(first)
+    spill._segment = None  # force a second segment
+    assert spill.append(second)
+    assert len(spill.segments()) == 2
+
+    written = []
+
+    async def write(batch):
+        written.extend(batch)
+
+    assert await spill.replay(write, _run) == 5
+    assert [log["_id"] for log in written] == [log["_id"] for log in first + second]
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_replay_leaves_segments_opened_after_the_seal(tmp_path):
+    spill = LogSpill(str(tmp_path))
+    early, late = _logs(2), _logs(1)
+    spill.append(early)
+
+    async def run(function, *args):
+        result = function(*args)
+        if function == spill.seal:
+            # A failing flush spills right after the seal
+            spill.append(late)
+        return result
+
+    written = []
+
+    async def write(batch):
+        written.extend(batch)
+
+    assert await spill.replay(write, run) == 2
+    assert [log["_id"] for log in written] == [log["_id"] for log in early]
+    records, _ = spill.read_batch(spill.segments()[0], 10)
+    assert [log["_id"] for log in records] == [log["_id"] for log in late]
+
+
+@pytest.mark.asyncio
+async def test_failed_replay_resumes_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_BATCH_SIZE", 2)
+    spill = LogSpill(str(tmp_path))
+    logs = _logs(5)
+    spill.append(logs)
+    written = []
+
+    async def flaky(batch):
+        if written:
+            raise ConnectionError("mongo down")
+        written.extend(batch)
+
+    with pytest.raises(ConnectionError):
+        await spill.replay(flaky, _run)
+
+    async def write(batch):
+        written.extend(batch)
+
+    await spill.replay(write, _run)
+    assert [log["_id"] for log in written] == [log["_id"] for log in logs]
+
+
+def test_torn_tail_is_skipped(tmp_path):
+    spill = LogSpill(str(tmp_path))
+    spill.append(_logs(2))
+    with open(spill.segments()[0], "ab") as segment:
+        segment.write(b"\x40\x00\x00\x00\x02")
+
+    records, _ = spill.read_batch(spill.segments()[0], 10)
+    assert len(records) == 2
+
+
+def test_append_refuses_past_max_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_SPILL_MAX_BYTES", 100)
+    spill = LogSpill(str(tmp_path))
+
+    assert not spill.append(_logs(10))
+    assert spill.dropped == 10
+    assert spill.segments() == []
+
+
+@pytest.mark.asyncio
+async def test_writer_spills_slow_flushes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_SPILL_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LOG_SPILL_LATENCY_MS", 10)
+    monkeypatch.setattr(settings, "LOG_SPILL_RETRY_INTERVAL", 3600)
+
+    async def hanging_mongodb():
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(log_writer_module, "get_mongodb", hanging_mongodb)
+    writer = RequestLogWriter()
+    writer._spill = LogSpill(str(tmp_path))
+
+    await writer._write(_logs(3))
+    await writer._write(_logs(2))
+
+    stats = writer.stats()
+    assert stats["spilling"] and stats["spilled"] == 5
+    assert stats["failed"] == 0
+    writer._recovery.cancel()
+
+
+class FakeCollection:
+    def __init__(self):
+        self.inserted = []
+
+    def with_options(self, **options):
+        return self
+
+    async def insert_many(self, documents, ordered=True):
+        ids = {log["_id"] for log in self.inserted}
+        duplicates = [log for log in documents if log["_id"] in ids]
+        self.inserted.extend(log for log in documents if log["_id"] not in ids)
+        if duplicates:
+            raise BulkWriteError(
+                {
+                    "nInserted": len(documents) - len(duplicates),
+                    "writeErrors": [{"code": 11000} for _ in duplicates],
+                }
+            )
+
+
+@pytest.mark.asyncio
+async def test_failed_rollups_spill_without_the_stored_logs(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_SPILL_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LOG_SPILL_RETRY_INTERVAL", 3600)
+    monkeypatch.setattr(settings, "LOG_ROLLUPS_ENABLED", True)
+    collection = FakeCollection()
+    folded = []
+
+    async def get_mongodb():
+        return None
+
+    async def write_rollups(mongodb, batch):
+        if not folded:
+            folded.append(None)
+            raise ConnectionError("rollups down")
+        folded.append([log["_id"] for log in batch])
+
+    monkeypatch.setattr(log_writer_module, "get_mongodb", get_mongodb)
+    monkeypatch.setattr(log_writer_module, "log_collection", lambda db: collection)
+    monkeypatch.setattr(log_writer_module, "write_rollups", write_rollups)
+    writer = RequestLogWriter()
+    writer._spill = LogSpill(str(tmp_path))
+    logs = _logs(3)
+
+    await writer._write(logs)
+    writer._recovery.cancel()
+    assert writer.stats()["spilled"] == 3
+
+    await writer._spill.replay(writer._store, _run)
+    # Inserted once, folded into the rollups once
+    assert [log["_id"] for log in collection.inserted] == [log["_id"] for log in logs]
+    assert folded[1] == [log["_id"] for log in logs]
+    assert writer.stats()["written"] == 3
+
+
+@pytest.mark.asyncio
+async def test_duplicates_are_not_counted_as_written(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_ROLLUPS_ENABLED", False)
+    collection = FakeCollection()
+
+    async def get_mongodb():
+        return None
+
+    monkeypatch.setattr(log_writer_module, "get_mongodb", get_mongodb)
+    monkeypatch.setattr(log_writer_module, "log_collection", lambda db: collection)
+    writer = RequestLogWriter()
+    logs = _logs(3)
+
+    await writer._store(logs[:2])
+    await writer._store(logs)
+
+    stats = writer.stats()
+    assert stats["written"] == 3 and stats["duplicates"] == 2
+
+
+class TimeseriesCollection(FakeCollection):
+    """No unique ``_id`` index, duplicates are stored."""
+
+    async def insert_many(self, documents, ordered=True):
+        self.inserted.extend(documents)
+
+    async def find(self, query, projection):
+        ids = set(query["_id"]["$in"])
+        for log in self.inserted:
+            if log["_id"] in ids:
+                yield {"_id": log["_id"]}
+
+
+@pytest.mark.asyncio
+async def test_timeseries_replays_skip_logs_already_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_STORAGE_MODE", "timeseries")
+    monkeypatch.setattr(settings, "LOG_ROLLUPS_ENABLED", False)
+    collection = TimeseriesCollection()
+
+    async def get_mongodb():
+        return None
+
+    monkeypatch.setattr(log_writer_module, "get_mongodb", get_mongodb)
+    monkeypatch.setattr(log_writer_module, "log_collection", lambda db: collection)
+    writer = RequestLogWriter()
+    writer._spill = LogSpill(str(tmp_path))
+    logs = [
+        {**log, "timestamp": datetime(2024, 1, 1, 0, 0, i)}
+        for i, log in enumerate(_logs(3))
+    ]
+    # The insert timed out after storing the first two logs
+    await writer._store(logs[:2])
+    writer._spill.append(logs)
+
+    await writer._spill.replay(writer._replay, _run)
+
+    assert [log["_id"] for log in collection.inserted] == [log["_id"] for log in logs]
+    assert writer.stats()["duplicates"] == 2
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.db.log_storage import compact_log, is_timeseries, migrate_logs
+
+
+def test_compact_log_drops_empty_optional_fields():
+    log = {
+        "_id": ObjectId(),
+        "method": "GET",
+        "status_code": 200,
+        "headers": {},
+        "query_params": {"page": "2"},
+        "error": None,
+    }
+
+    assert compact_log(log) == {
+        "_id": log["_id"],
+        "method": "GET",
+        "status_code": 200,
+        "query_params": {"page": "2"},
+    }
+
+
+@pytest.mark.asyncio
+async def test_migration_copies_logs_into_a_timeseries_collection(monkeypatch):
+    client = AsyncIOMotorClient(settings.MONGODB_URL, serverSelectionTimeoutMS=500)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        pytest.skip("MongoDB is not reachable")
+
+    monkeypatch.setattr(settings, "LOG_STORAGE_MODE", "timeseries")
+    mongodb = client["api_gateway_storage_test"]
+    try:
+        await mongodb["request_logs"].insert_many(
+            [
+                {"service_id": 1, "status_code": 200, "timestamp": datetime.utcnow()}
+                for _ in range(5)
+            ]
+        )
+
+        assert await migrate_logs(mongodb, "request_logs", "logs_ts", 2) == 5
+        assert await is_timeseries(mongodb, "logs_ts")
+        assert await mongodb["logs_ts"].count_documents({"service_id": 1}) == 5
+        # A second run resumes after the checkpoint and copies nothing.
+        assert await migrate_logs(mongodb, "request_logs", "logs_ts", 2) == 0
+    finally:
+        await client.drop_database("api_gateway_storage_test")
+        client.close()
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services import log_writer as log_writer_module
+from app.services.log_writer import RequestLogWriter
+
+
+class FakeCollection:
+    def __init__(self):
+        self.batches = []
+
+    def with_options(self, **options):
+        return self
+
+    async def insert_many(self, documents, ordered=True):
+        self.batches.append([document["n"] for document in documents])
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+
+    async def get_mongodb():
+        return None
+
+    monkeypatch.setattr(log_writer_module, "get_mongodb", get_mongodb)
+    monkeypatch.setattr(log_writer_module, "log_collection", lambda db: collection)
+    monkeypatch.setattr(settings, "LOG_ROLLUPS_ENABLED", False)
+    monkeypatch.setattr(settings, "LOG_SPILL_DIR", "")
+    monkeypatch.setattr(settings, "LOG_QUEUE_SIZE", 100)
+    monkeypatch.setattr(settings, "LOG_OVERFLOW_POLICY", "drop")
+    return collection
+
+
+@pytest.mark.asyncio
+async def test_batches_are_cut_by_size_and_flushed_on_stop(monkeypatch, collection):
+    monkeypatch.setattr(settings, "LOG_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "LOG_FLUSH_INTERVAL", 3600)
+    writer = RequestLogWriter()
+    await writer.start()
+
+    for n in range(7):
+        await writer.put({"n": n})
+    await writer.stop()
+
+    assert collection.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert writer.stats()["written"] == 7
+    assert not writer.running
+
+
+@pytest.mark.asyncio
+async def test_partial_batches_are_flushed_after_the_interval(monkeypatch, collection):
+    monkeypatch.setattr(settings, "LOG_BATCH_SIZE", 100)
+    monkeypatch.setattr(settings, "LOG_FLUSH_INTERVAL", 0.02)
+    writer = RequestLogWriter()
+    await writer.start()
+
+    await writer.put({"n": 0})
+    await writer.put({"n": 1})
+    for _ in range(50):
+        if collection.batches:
+            break
+        await asyncio.sleep(0.01)
+
+    assert collection.batches == [[0, 1]]
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_drop_policy_discards_records_once_the_queue_is_full(
+    monkeypatch, collection
+):
+    monkeypatch.setattr(settings, "LOG_QUEUE_SIZE", 2)
+    writer = RequestLogWriter()
+    writer._queue = asyncio.Queue(maxsize=2)
+
+    for n in range(5):
+        await writer.put({"n": n})
+
+    assert writer.stats()["enqueued"] == 2
+    assert writer.stats()["dropped"] == 3
+
+
+@pytest.mark.asyncio
+async def test_sample_policy_thins_records_past_half_full(monkeypatch, collection):
+    monkeypatch.setattr(settings, "LOG_OVERFLOW_POLICY", "sample")
+    monkeypatch.setattr(settings, "LOG_OVERFLOW_SAMPLE_RATE", 0.0)
+    writer = RequestLogWriter()
+    writer._queue = asyncio.Queue(maxsize=4)
+
+    for n in range(4):
+        await writer.put({"n": n})
+
+    assert writer.enqueued == 2
+    assert writer.dropped == 2
+
+
+@pytest.mark.asyncio
+async def test_block_policy_waits_for_room(monkeypatch, collection):
+    monkeypatch.setattr(settings, "LOG_OVERFLOW_POLICY", "block")
+    writer = RequestLogWriter()
+    writer._queue = asyncio.Queue(maxsize=1)
+    await writer.put({"n": 0})
+
+    blocked = asyncio.create_task(writer.put({"n": 1}))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    writer._queue.get_nowait()
+    await asyncio.wait_for(blocked, 1)
+    assert writer.enqueued == 2 and writer.dropped == 0
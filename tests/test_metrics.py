@@ -0,0 +1,85 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.api.routers import metrics
+from app.core.metrics import REQUESTS, Counter, Histogram, MetricsRegistry
+from app.middleware.logging import RequestLoggingMiddleware
+from app.services.proxy import UpstreamTimings
+
+
+def test_histogram_exposes_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = Histogram(
+        "latency_seconds", "Latency.", ("route",), buckets=(0.1, 1), registry=registry
+    )
+    child = histogram.labels("/a")
+    for value in (0.05, 0.1, 0.5, 3):
+        child.observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+    ]
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/a"} 3.65' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+
+
+def test_label_values_are_escaped_and_collectors_read_at_scrape():
+    registry = MetricsRegistry()
+    Counter("hits_total", "Hits.", ("name",), registry=registry).labels('a"b').inc(2)
+    queue = {"depth": 1}
+    Counter(
+        "depth_total",
+        "Depth.",
+        collect=lambda: {(): queue["depth"]},
+        registry=registry,
+    )
+    queue["depth"] = 7
+
+    text = registry.render()
+    assert 'hits_total{name="a\\"b"} 2' in text
+    assert "depth_total 7" in text
+
+
+@pytest.mark.asyncio
+async def test_upstream_timings_from_trace_events():
+    timings = UpstreamTimings()
+    await timings("connection.connect_tcp.started", {})
+    await timings("connection.connect_tcp.complete", {})
+    await timings("http11.send_request_headers.started", {})
+    await timings("http11.receive_response_headers.complete", {})
+    assert timings.connect is not None and timings.connect >= 0
+    assert timings.ttfb is not None and timings.ttfb >= 0
+
+    reused = UpstreamTimings()
+    await reused("http2.send_request_headers.started", {})
+    assert reused.connect is None
+
+
+def test_metrics_endpoint_counts_requests_by_service():
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+    app.include_router(metrics.router)
+
+    @app.get("/orders")
+    async def orders(request: Request):
+        request.state.service_name = "orders"
+        return {}
+
+    client = TestClient(app)
+    before = REQUESTS.labels("orders", "GET", "2xx").value
+    client.get("/orders")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert REQUESTS.labels("orders", "GET", "2xx").value == before + 1
+    assert 'gateway_requests_total{service="orders",method="GET",status="2xx"}' in (
+        response.text
+    )
+    assert "gateway_log_queue_depth 0" in response.text
+    assert 'gateway_cache_hit_ratio{cache="tokens"}' in response.text
@@ -0,0 +1,40 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.security import create_access_token
+from app.middleware.authentication import AuthenticationMiddleware
+from app.middleware.logging import RequestLoggingMiddleware
+from app.middleware.paths import PathMatcher
+
+
+def test_path_matcher_prefixes_and_exact_paths():
+    matcher = PathMatcher(prefixes=("/api/docs", "/gateway/"), exact=("/api/health",))
+
+    assert matcher("/api/docs/oauth2-redirect")
+    assert matcher("/gateway/users/1")
+    assert matcher("/api/health")
+    assert not matcher("/api/healthz")
+    assert not matcher("/gateway")
+    assert not PathMatcher()("/anything")
+
+
+def test_authentication_middleware_carries_claims_on_state():
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+    app.add_middleware(AuthenticationMiddleware)
+
+    @app.get("/whoami")
+    async def whoami(request: Request):
+        return {
+            "user_id": getattr(request.state, "user_id", None),
+            "sub": getattr(request.state, "token_claims", {}).get("sub"),
+        }
+
+    client = TestClient(app)
+    token = create_access_token({"sub": "alice"})
+
+    response = client.get("/whoami", headers={"Authorization": f"Bearer {token}"})
+    assert response.json() == {"user_id": "alice", "sub": "alice"}
+
+    response = client.get("/whoami", headers={"Authorization": "Bearer invalid"})
+    assert response.json() == {"user_id": None, "sub": None}
@@ -0,0 +1,145 @@
+from datetime import datetime
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.db.mongo_indexes import (
+    IndexSpec,
+    check_query_shapes,
+    declared_indexes,
+    is_collection_scan,
+    reconcile_collection,
+    reconcile_indexes,
+)
+
+
+def test_explain_with_collection_scan_is_flagged():
+    scan = {
+        "queryPlanner": {
+            "winningPlan": {
+                "stage": "SORT",
+                "inputStage": {"stage": "COLLSCAN", "direction": "forward"},
+            }
+        }
+    }
+    indexed = {
+        "queryPlanner": {
+            "winningPlan": {
+                "stage": "FETCH",
+                "inputStage": {"stage": "IXSCAN", "indexName": "gw_logs_service"},
+            }
+        }
+    }
+
+    timeseries_scan = {
+        "stages": [
+            {
+                "$cursor": {
+                    "queryPlanner": {
+                        "winningPlan": {
+                            "queryPlan": {"stage": "COLLSCAN"},
+                        }
+                    }
+                }
+            },
+            {"$_internalUnpackBucket": {}},
+        ]
+    }
+
+    assert is_collection_scan(scan)
+    assert is_collection_scan(timeseries_scan)
+    assert not is_collection_scan(indexed)
+
+
+def test_ttl_index_follows_retention_setting(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_RETENTION_DAYS", 0)
+    names = [spec.name for spec in declared_indexes()["request_logs"]]
+    assert "gw_logs_ttl" not in names
+
+    monkeypatch.setattr(settings, "LOG_RETENTION_DAYS", 7)
+    ttl = {spec.name: spec for spec in declared_indexes()["request_logs"]}
+    assert ttl["gw_logs_ttl"].expire_after_seconds == 7 * 86400
+
+    # Time-series collections expire data themselves.
+    monkeypatch.setattr(settings, "LOG_STORAGE_MODE", "timeseries")
+    specs = {spec.name: spec for spec in declared_indexes()["request_logs"]}
+    assert "gw_logs_ttl" not in specs
+    assert specs["gw_logs_service"].keys == (("service_id", 1), ("timestamp", -1))
+
+
+class FakeIndexes:
+    def __init__(self, existing):
+        self.existing = existing
+        self.calls = []
+
+    def __getitem__(self, name):
+        return self
+
+    async def index_information(self):
+        return self.existing
+
+    async def create_index(self, keys, **options):
+        self.calls.append(("create", options["name"]))
+
+    async def drop_index(self, name):
+        self.calls.append(("drop", name))
+
+    async def command(self, *args, **kwargs):
+        self.calls.append(("collMod", kwargs["index"]["keyPattern"]))
+
+
+@pytest.mark.asyncio
+async def test_only_managed_indexes_are_rebuilt():
+    mongodb = FakeIndexes(
+        {
+            "_id_": {"key": [("_id", 1)]},
+            "ops_path": {"key": [("path", 1)], "sparse": True, "unique": True},
+            "gw_logs_user": {"key": [("user_id", 1)], "unique": True},
+            "gw_logs_old": {"key": [("old", 1)]},
+        }
+    )
+    specs = [
+        IndexSpec("gw_logs_path", (("path", 1),)),
+        IndexSpec("gw_logs_user", (("user_id", 1),)),
+    ]
+
+    actions = await reconcile_collection(mongodb, "request_logs", specs)
+
+    assert actions["conflicts"] == ["ops_path"]
+    assert actions["updated"] == ["gw_logs_user"]
+    assert actions["dropped"] == ["gw_logs_old"]
+    assert ("drop", "ops_path") not in mongodb.calls
+
+
+@pytest.mark.asyncio
+async def test_read_paths_do_not_scan_collections():
+    client = AsyncIOMotorClient(settings.MONGODB_URL, serverSelectionTimeoutMS=500)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        pytest.skip("MongoDB is not reachable")
+
+    mongodb = client["api_gateway_index_test"]
+    try:
+        # Plans of empty collections are EOF, so give the planner data.
+        await mongodb["request_logs"].insert_one(
+            {
+                "service_id": 1,
+                "user_id": 1,
+                "status_code": 200,
+                "method": "GET",
+                "path": "http://users/1",
+                "timestamp": datetime.utcnow(),
+            }
+        )
+        await mongodb["request_rollups"].insert_one(
+            {"service_id": 1, "minute": datetime.utcnow(), "method": "GET", "path": "/"}
+        )
+
+        await reconcile_indexes(mongodb)
+
+        assert await check_query_shapes(mongodb) == []
+    finally:
+        await client.drop_database("api_gateway_index_test")
+        client.close()
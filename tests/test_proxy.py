@@ -0,0 +1,224 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+
+from app.api.gateway import _raw_route_path
+from app.core.config import settings
+from app.services import proxy
+from app.services.proxy import UpstreamClientRegistry
+from app.services.routing import RouteTrie, is_safe_path
+
+
+@pytest.mark.asyncio
+async def test_clients_are_reused_per_origin():
+    registry = UpstreamClientRegistry()
+
+    client = registry.get_client("http://orders/api/a")
+    assert registry.get_client("http://orders:80/api/b") is client
+    assert registry.get_client("https://orders/api/a") is not client
+    registry.get_client("http://orders/health", count=False)
+
+    stats = {entry["origin"]: entry for entry in registry.stats()}
+    assert stats["http://orders:80"]["total_requests"] == 2
+    assert stats["http://orders:80"]["connections"] == 0
+    assert stats["https://orders:443"]["total_requests"] == 1
+    await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_stats_survive_unknown_transports():
+    registry = UpstreamClientRegistry()
+    client = registry.get_client("http://orders")
+    client._transport = httpx.MockTransport(lambda request: httpx.Response(200))
+
+    [stats] = registry.stats()
+    assert stats["connections"] is None and stats["waiting"] is None
+    assert stats["total_requests"] == 1
+    await registry.close()
+
+
+def _service(**overrides):
+    values = dict(
+        name="orders",
+        base_url="http://orders",
+        timeout=None,
+        forward_headers=None,
+        require_authentication=False,
+        auth_header_name=None,
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def _upstream():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.body()
+        return Response(
+            content=body,
+            headers={"x-upstream": "1", "connection": "close"},
+            media_type="application/octet-stream",
+        )
+
+    @app.get("/query")
+    async def query(request: Request):
+        return Response(content=request.url.query)
+
+    @app.get("/raw/{rest:path}")
+    async def raw(request: Request, rest: str):
+        return Response(
+            content=request.scope["raw_path"] + b"|" + request.scope["query_string"]
+        )
+
+    @app.get("/chunks")
+    async def chunks():
+        async def body():
+            for chunk in (b"one,", b"two,", b"three"):
+                yield chunk
+
+        return StreamingResponse(body(), media_type="text/plain")
+
+    return app
+
+
+def _gateway(monkeypatch, captured=None):
+    upstream = httpx.AsyncClient(transport=httpx.ASGITransport(app=_upstream()))
+    monkeypatch.setattr(
+        proxy.upstream_clients, "get_client", lambda url, count=True: upstream
+    )
+    app = FastAPI()
+
+    @app.api_route("/gateway/{path:path}", methods=["GET", "POST"])
+    async def gateway(request: Request, path: str):
+        return await proxy.proxy_request(
+            request,
+            _service(),
+            path=path,
+            body_capture=captured,
+            capture_limit=4 if captured is not None else 0,
+        )
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://gateway"
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("streaming", [True, False])
+async def test_bodies_are_relayed_in_both_modes(monkeypatch, streaming):
+    monkeypatch.setattr(settings, "PROXY_STREAMING", streaming)
+    captured = bytearray()
+
+    async with _gateway(monkeypatch, captured) as client:
+        response = await client.post("/gateway/echo", content=b"payload")
+        chunks = await client.get("/gateway/chunks")
+
+    assert response.status_code == 200
+    assert response.content == b"payload"
+    assert response.headers["x-upstream"] == "1"
+    assert "connection" not in response.headers
+    assert captured == b"payl"
+    assert chunks.text == "one,two,three"
+    assert chunks.headers["content-type"].startswith("text/plain")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("streaming", [True, False])
+async def test_only_streaming_mode_relays_a_stream(monkeypatch, streaming):
+    monkeypatch.setattr(settings, "PROXY_STREAMING", streaming)
+    received = []
+
+    async def receive():
+        received.append(True)
+        return {"type": "http.request", "body": b"payload", "more_body": False}
+
+    request = Request(
+        {
+            "type": "http",
+            "method": "POST",
+            "path": "/gateway/echo",
+            "query_string": b"",
+            "headers": [(b"content-length", b"7")],
+            "state": {},
+        },
+        receive,
+    )
+    upstream = httpx.AsyncClient(transport=httpx.ASGITransport(app=_upstream()))
+    monkeypatch.setattr(
+        proxy.upstream_clients, "get_client", lambda url, count=True: upstream
+    )
+
+    content = await proxy.request_content(request)
+    assert isinstance(content, bytes) is not streaming
+    # A streamed body is only read while it is sent upstream
+    assert received == ([] if streaming else [True])
+
+    response = await proxy.proxy_request(request, _service(), path="echo")
+    assert isinstance(response, StreamingResponse) is streaming
+    if streaming:
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        await response.background()
+    else:
+        body = response.body
+    assert body == b"payload"
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_keys_are_forwarded(monkeypatch):
+    async with _gateway(monkeypatch) as client:
+        response = await client.get("/gateway/query?x=1&x=2&y=a+b")
+
+    assert response.text == "x=1&x=2&y=a+b"
+
+
+def _routed_gateway(monkeypatch):
+    upstream = httpx.AsyncClient(transport=httpx.ASGITransport(app=_upstream()))
+    monkeypatch.setattr(
+        proxy.upstream_clients, "get_client", lambda url, count=True: upstream
+    )
+    routes = RouteTrie()
+    routes.insert("orders", 1, _service(base_url="http://orders/raw"))
+    app = FastAPI()
+
+    @app.get("/gateway/{service_name}/{path:path}")
+    async def gateway(request: Request, service_name: str, path: str):
+        service, rest = routes.match(_raw_route_path(request), 1)
+        if not is_safe_path(rest):
+            return Response(status_code=400)
+        return await proxy.proxy_request(request, service, path=rest)
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://gateway"
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path, upstream",
+    [
+        ("x%3Fadmin=true", b"/raw/x%3Fadmin=true|"),
+        ("a%2Fb?q=1", b"/raw/a%2Fb|q=1"),
+        ("a/b%20c", b"/raw/a/b%20c|"),
+    ],
+)
+async def test_encoded_path_is_forwarded_as_sent(monkeypatch, path, upstream):
+    async with _routed_gateway(monkeypatch) as client:
+        response = await client.get(f"/gateway/orders/{path}")
+
+    assert response.content == upstream
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path", ["a%2F..%2F..%2Fsecret", "a/%2e%2e/secret", "a/%2E/b", "a/%2e%2E%2Fb"]
+)
+async def test_dot_segments_are_rejected(monkeypatch, path):
+    async with _routed_gateway(monkeypatch) as client:
+        response = await client.get(f"/gateway/orders/{path}")
+
+    assert response.status_code == 400
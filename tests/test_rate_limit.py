@@ -0,0 +1,245 @@
+import asyncio
+
+import httpx
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from fastapi import FastAPI, HTTPException
+
+from app.api.gateway import router as gateway_router
+
+from app.core.errors import RateLimitError
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.db.postgres import get_db
+from app.db.redis_client import redis_client
+from app.middleware.rate_limiting import RateLimitingMiddleware
+from app.models.service import RateLimitAlgorithm
+from app.services import rate_limit
+from app.services.rate_limit import (
+    LocalTokenBuckets,
+    RateLimitPolicy,
+    check_rate_limits,
+    enforce_rate_limits,
+    evaluate_rate_limits,
+)
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def redis(monkeypatch):
+    client = FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_client, "client", client)
+    monkeypatch.setattr(rate_limit, "_script_shas", {})
+    yield client
+    await client.aclose()
+
+
+async def _verdicts(policies, count):
+    return [(await evaluate_rate_limits(policies)).allowed for _ in range(count)]
+
+
+async def _retry_after_ms(policies):
+    keys = [f"rate:{policy.algorithm.value}:{policy.key}" for policy in policies]
+    args = [len(policies)]
+    for policy in policies:
+        args.extend([policy.algorithm.value, policy.limit, policy.duration, "m"])
+    return (await rate_limit._evalsha("limit", keys, args))[2]
+
+
+@pytest.mark.asyncio
+async def test_gcra_allows_a_burst_then_spaces_requests():
+    # 4 per 0.4 s, so one request every 100 ms once the burst is spent
+    policy = RateLimitPolicy("gcra", 4, 0.4, RateLimitAlgorithm.GCRA)
+
+    assert await _verdicts([policy], 5) == [True] * 4 + [False]
+    assert 0 < await _retry_after_ms([policy]) <= 100
+
+    await asyncio.sleep(0.11)
+    assert await _verdicts([policy], 2) == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_log_expires_requests_one_by_one():
+    policy = RateLimitPolicy("log", 2, 0.3, RateLimitAlgorithm.SLIDING_WINDOW_LOG)
+
+    assert await _verdicts([policy], 1) == [True]
+    await asyncio.sleep(0.15)
+    assert await _verdicts([policy], 2) == [True, False]
+    retry_after_ms = await _retry_after_ms([policy])
+    assert 0 < retry_after_ms <= 150
+
+    # Only the first request left the window
+    await asyncio.sleep(retry_after_ms / 1000 + 0.01)
+    assert await _verdicts([policy], 2) == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_fixed_window_resets_at_the_end_of_the_window():
+    policy = RateLimitPolicy("fixed", 2, 0.2)
+
+    assert await _verdicts([policy], 3) == [True, True, False]
+    await asyncio.sleep(0.21)
+    assert await _verdicts([policy], 3) == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_a_denied_request_consumes_no_policy(redis):
+    roomy = RateLimitPolicy("roomy", 10, 60)
+    strict = RateLimitPolicy("strict", 1, 60, RateLimitAlgorithm.SLIDING_WINDOW_LOG)
+
+    assert await _verdicts([roomy, strict], 3) == [True, False, False]
+
+    assert await redis.get("rate:fixed_window:roomy") == "1"
+    assert await redis.zcard("rate:sliding_window_log:strict") == 1
+    result = await evaluate_rate_limits([roomy])
+    assert result.allowed and result.remaining == 8
+
+
+@pytest.mark.asyncio
+async def test_remaining_and_retry_after_come_from_the_tightest_policy():
+    minute = RateLimitPolicy("minute", 5, 60)
+    hour = RateLimitPolicy("hour", 2, 3600)
+    second = RateLimitPolicy("second", 1, 1)
+
+    result = await evaluate_rate_limits([minute, hour])
+    assert result.remaining == 1 and result.policy is hour
+    await evaluate_rate_limits([minute, hour])
+    await evaluate_rate_limits([second])
+
+    # Both the hourly and the per second limits deny, the hour is the wait
+    result = await evaluate_rate_limits([second, minute, hour])
+    assert not result.allowed
+    assert result.policy is hour
+    assert 3590 < result.retry_after <= 3600
+
+    with pytest.raises(RateLimitError) as error:
+        await enforce_rate_limits([second, minute, hour])
+    assert error.value.headers["Retry-After"] == str(result.retry_after)
+
+
+def _leased(key, limit, lease_size):
+    return RateLimitPolicy(key, limit, 3600, lease_size=lease_size)
+
+
+@pytest.mark.asyncio
+async def test_leases_are_capped_at_the_window_budget():
+    policy = _leased("hot", 5, 4)
+    first, second = LocalTokenBuckets(), LocalTokenBuckets()
+
+    allowed = [(await first.acquire(policy)).allowed for _ in range(4)]
+    allowed += [(await second.acquire(policy)).allowed for _ in range(3)]
+
+    assert allowed == [True] * 5 + [False] * 2
+    # The budget is known to be spent, the second worker stops asking Redis
+    assert second.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_lease_is_evicted_and_given_back():
+    a, b, c = (_leased(key, 10, 5) for key in "abc")
+    buckets, other = LocalTokenBuckets(), LocalTokenBuckets()
+    buckets.MAX_KEYS = 2
+
+    for policy in (a, b, a, c):
+        assert (await buckets.acquire(policy)).allowed
+    await asyncio.gather(*buckets._giving_back)
+
+    assert list(buckets._leases) == ["a", "c"]
+    # b's 4 unspent tokens are back in the budget for the other worker
+    allowed = [(await other.acquire(b)).allowed for _ in range(10)]
+    assert allowed == [True] * 9 + [False]
+
+
+@pytest.mark.asyncio
+async def test_leases_refill_in_the_background_at_low_water():
+    policy = _leased("hot", 100, 4)
+    buckets = LocalTokenBuckets()
+
+    for _ in range(3):
+        await buckets.acquire(policy)
+    lease = buckets._leases["hot"]
+    assert lease.tokens == 1 and lease.refill is not None
+
+    await lease.refill
+    assert lease.tokens == 5
+    assert buckets.stats() == {"size": 1, "hits": 3, "misses": 2, "hit_ratio": 0.6}
+
+
+@pytest.mark.asyncio
+async def test_an_empty_lease_fetches_again_after_a_failed_refill(monkeypatch):
+    policy = _leased("hot", 100, 2)
+    buckets = LocalTokenBuckets()
+    fetch = buckets._fetch
+    await buckets.acquire(policy)
+
+    async def failing(policy):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(buckets, "_fetch", failing)
+    assert (await buckets.acquire(policy)).allowed
+    lease = buckets._leases["hot"]
+    await lease.refill
+    assert lease.tokens == 0 and lease.refill is None
+
+    monkeypatch.setattr(buckets, "_fetch", fetch)
+    result = await buckets.acquire(policy)
+    assert result.allowed and result.remaining == 1
+
+
+@pytest.mark.asyncio
+async def test_lease_tokens_are_given_back_when_an_exact_policy_denies(monkeypatch):
+    buckets = LocalTokenBuckets()
+    monkeypatch.setattr(rate_limit, "local_buckets", buckets)
+    leased = _leased("client", 100, 10)
+    exact = RateLimitPolicy("service", 1, 60)
+
+    assert await check_rate_limits([leased, exact]) is None
+    denied = await check_rate_limits([leased, exact])
+
+    assert denied.policy is exact
+    assert buckets._leases["client"].tokens == 9
+
+
+@pytest.mark.asyncio
+async def test_middleware_serves_the_client_limit_from_leases(monkeypatch):
+    buckets = LocalTokenBuckets()
+    monkeypatch.setattr(rate_limit, "local_buckets", buckets)
+    monkeypatch.setattr(settings, "CLIENT_RATE_LIMIT", 2)
+    monkeypatch.setattr(settings, "CLIENT_RATE_LIMIT_LEASE_SIZE", 10)
+    middleware = RateLimitingMiddleware(app=None)
+
+    verdicts = [await middleware._is_rate_limited("ip:1") for _ in range(3)]
+
+    assert [limited for limited, _ in verdicts] == [False, False, True]
+    assert buckets.stats()["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_gateway_requests_failing_auth_are_still_limited(monkeypatch):
+    monkeypatch.setattr(rate_limit, "local_buckets", LocalTokenBuckets())
+    monkeypatch.setattr(settings, "CLIENT_RATE_LIMIT", 3)
+    monkeypatch.setattr(settings, "CLIENT_RATE_LIMIT_LEASE_SIZE", 0)
+
+    async def reject():
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+    async def no_db():
+        yield None
+
+    app = FastAPI()
+    app.include_router(gateway_router, prefix="/gateway")
+    app.add_middleware(RateLimitingMiddleware)
+    app.dependency_overrides[get_current_user] = reject
+    app.dependency_overrides[get_db] = no_db
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://gateway"
+    ) as client:
+        statuses = [
+            (
+                await client.get("/gateway/orders/1", headers={"X-API-Key": "guess"})
+            ).status_code
+            for _ in range(4)
+        ]
+
+    assert statuses == [401, 401, 401, 429]
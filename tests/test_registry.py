@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.service import Service, ServiceStatus
+from app.services import registry as registry_module
+from app.services.circuit_breaker import CircuitBreakerRegistry
+from app.services.load_balancer import LoadBalancer
+from app.services.registry import ServiceRegistry, ServiceSnapshot
+
+
+def make_service(**overrides) -> Service:
+    fields = {
+        "id": 1,
+        "name": "orders",
+        "base_url": "http://orders:8080",
+        "status": ServiceStatus.ACTIVE,
+        "owner_id": 7,
+        "forward_headers": ["x-request-id"],
+    }
+    fields.update(overrides)
+    return Service(**fields)
+
+
+def test_snapshot_is_immutable():
+    snapshot = ServiceSnapshot(make_service())
+
+    assert snapshot.name == "orders"
+    assert snapshot.forward_headers == ("x-request-id",)
+    with pytest.raises(AttributeError):
+        snapshot.base_url = "http://elsewhere"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_updates_routes():
+    registry = ServiceRegistry()
+
+    await registry.invalidate(1, make_service())
+    service, path = registry.resolve("orders/42", 7)
+    assert service.id == 1
+    assert path == "42"
+
+    await registry.invalidate(1, make_service(name="purchases"))
+    assert registry.resolve("orders/42", 7) is None
+    assert registry.resolve("purchases/42", 7)[0].name == "purchases"
+
+    await registry.invalidate(1)
+    assert registry.resolve("purchases/42", 7) is None
+    assert registry.stats()["hits"] == 2
+    assert registry.stats()["misses"] == 2
+
+
+class SlowSession:
+    """Session whose ``select`` returns ``rows`` once ``release`` is set."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.release = asyncio.Event()
+
+    async def execute(self, statement):
+        await self.release.wait()
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: self.rows))
+
+
+@pytest.mark.asyncio
+async def test_invalidations_during_a_reload_are_kept(monkeypatch):
+    balancer, breakers = LoadBalancer(), CircuitBreakerRegistry()
+    monkeypatch.setattr(registry_module, "load_balancer", balancer)
+    monkeypatch.setattr(registry_module, "circuit_breakers", breakers)
+    registry = ServiceRegistry()
+    await registry.invalidate(1, make_service())
+    await registry.invalidate(2, make_service(id=2, name="users"))
+    balancer.pool(registry.get(2))
+    breakers.get(2)
+
+    # The reload read the rows before service 1 was renamed and 3 created
+    session = SlowSession([make_service(), make_service(id=2, name="users")])
+    reload = asyncio.create_task(registry.load(session))
+    await asyncio.sleep(0)
+    await registry.invalidate(1, make_service(name="purchases"))
+    await registry.invalidate(3, make_service(id=3, name="carts"))
+    session.release.set()
+    await reload
+
+    assert registry.get(1).name == "purchases"
+    assert registry.resolve("orders/1", 7) is None
+    assert registry.resolve("carts/1", 7)[0].id == 3
+
+    await registry.invalidate(2)
+    assert 2 not in balancer._pools and 2 not in breakers._breakers
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.db.redis_client import redis_client
+from app.services.result_cache import ResultCache
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_computation():
+    cache = ResultCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"total_requests": 3}
+
+    results = await asyncio.gather(
+        *(cache.get_or_compute("log_stats:all", 15, compute) for _ in range(10))
+    )
+
+    assert calls == 1
+    assert results == [{"total_requests": 3}] * 10
+    stats = cache.stats()
+    assert stats["coalesced"] == 9 and stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failures_reach_every_waiter_and_are_not_cached():
+    cache = ResultCache()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("mongo down")
+
+    results = await asyncio.gather(
+        *(cache.get_or_compute("log_stats:all", 15, compute) for _ in range(3)),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not cache._pending
+
+
+@pytest.mark.asyncio
+async def test_size_counts_stored_results_until_they_expire(monkeypatch):
+    redis = FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_client, "client", redis)
+    cache = ResultCache()
+
+    async def compute():
+        return {"total_requests": 1}
+
+    await cache.get_or_compute("log_stats:1", 15, compute)
+    await cache.get_or_compute("log_stats:2", 15, compute)
+    await cache.get_or_compute("log_stats:1", 15, compute)
+    assert cache.stats()["size"] == 2
+
+    cache._expiries["log_stats:2"] = 0.0
+    assert cache.stats()["size"] == 1
+    assert cache.stats()["hits"] == 1
+    await redis.aclose()
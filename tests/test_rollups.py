@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from app.services.rollups import (
+    build_rollup_updates,
+    latency_bin,
+    route_template,
+    status_class,
+)
+
+
+def test_latency_bins_and_status_classes():
+    assert latency_bin(3.2) == "5"
+    assert latency_bin(5) == "5"
+    assert latency_bin(240) == "250"
+    assert latency_bin(60000) == "inf"
+    assert status_class(204) == "2xx"
+    assert status_class(503) == "5xx"
+
+
+def test_route_templates_drop_hosts_and_ids():
+    assert route_template("http://orders:8080/api/orders/123?x=1") == (
+        "/api/orders/{id}"
+    )
+    assert route_template(
+        "http://orders/api/orders/3f2b8c1e-9a4d-4c6b-8e2f-1a2b3c4d5e6f/items"
+    ) == ("/api/orders/{id}/items")
+    assert route_template("http://orders/v1/a/b/c/d/e") == "/v1/a/b/c/*"
+    assert route_template("http://orders") == "/"
+
+
+def test_records_fold_into_one_update_per_minute_bucket():
+    def record(second, status_code, response_time, path="http://users/1"):
+        return {
+            "service_id": 1,
+            "timestamp": datetime(2024, 1, 1, 12, 0, second),
+            "method": "GET",
+            "path": path,
+            "status_code": status_code,
+            "response_time": response_time,
+            "response_size": 100,
+        }
+
+    updates = build_rollup_updates(
+        [
+            record(1, 200, 12.0),
+            record(30, 404, 40.0),
+            record(59, 200, 8.0),
+            record(10, 200, 8.0, path="http://users/2/orders"),
+        ]
+    )
+
+    assert len(updates) == 2
+    bucket = updates[0]._doc["$inc"]
+    assert updates[0]._filter["minute"] == datetime(2024, 1, 1, 12, 0)
+    assert updates[0]._filter["path"] == "/{id}"
+    assert updates[1]._filter["path"] == "/{id}/orders"
+    assert bucket["count"] == 3
+    assert bucket["status.2xx"] == 2
+    assert bucket["status.4xx"] == 1
+    assert bucket["latency_sum"] == 60.0
+    assert bucket["latency.10"] == 1
+    assert bucket["latency.25"] == 1
+    assert bucket["latency.50"] == 1
+    assert bucket["bytes"] == 300
+    assert sum(v for k, v in bucket.items() if k.startswith("sketch.")) == 3
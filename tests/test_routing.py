@@ -0,0 +1,66 @@
+from app.services.routing import RouteTrie, is_safe_path, upstream_url
+
+
+def test_match_returns_remaining_path():
+    trie = RouteTrie()
+    trie.insert("orders", 1, "orders-service")
+
+    assert trie.match("orders", 1) == ("orders-service", "")
+    assert trie.match("orders/123/items", 1) == ("orders-service", "123/items")
+    assert trie.match("orders/123/", 1) == ("orders-service", "123/")
+    assert trie.match("order", 1) is None
+
+
+def test_match_is_scoped_to_owner():
+    trie = RouteTrie()
+    trie.insert("orders", 1, "mine")
+    trie.insert("orders", 2, "theirs")
+
+    assert trie.match("orders/1", 1) == ("mine", "1")
+    assert trie.match("orders/1", 2) == ("theirs", "1")
+    assert trie.match("orders/1", 3) is None
+
+
+def test_longest_prefix_wins():
+    trie = RouteTrie()
+    trie.insert("billing", 1, "billing")
+    trie.insert("billing/v2", 1, "billing-v2")
+
+    assert trie.match("billing/v2/invoices", 1) == ("billing-v2", "invoices")
+    assert trie.match("billing/v1/invoices", 1) == ("billing", "v1/invoices")
+
+
+def test_remove_prunes_routes():
+    trie = RouteTrie()
+    trie.insert("billing", 1, "billing")
+    trie.insert("billing/v2", 1, "billing-v2")
+
+    trie.remove("billing/v2", 1)
+
+    assert len(trie) == 1
+    assert trie.match("billing/v2/invoices", 1) == ("billing", "v2/invoices")
+
+
+def test_upstream_url():
+    assert upstream_url("http://orders:8080", "") == "http://orders:8080"
+    assert (
+        upstream_url("http://orders:8080/", "1/items") == "http://orders:8080/1/items"
+    )
+
+
+def test_match_decodes_segments_and_keeps_the_rest_encoded():
+    trie = RouteTrie()
+    trie.insert("my orders", 1, "orders")
+
+    assert trie.match("my%20orders/a%2Fb%3Fc", 1) == ("orders", "a%2Fb%3Fc")
+    # An encoded slash never splits a service name
+    assert trie.match("my%20orders%2Fa", 1) is None
+
+
+def test_is_safe_path_rejects_dot_segments():
+    assert is_safe_path("a/b.c/..d")
+    assert is_safe_path("")
+    assert not is_safe_path("..")
+    assert not is_safe_path("a/./b")
+    assert not is_safe_path("a/%2E%2e/b")
+    assert not is_safe_path("a%2F..%2Fb")
@@ -0,0 +1,223 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Request
+
+from app.core import security
+from app.core.security import (
+    api_key_cache,
+    api_key_negative_cache,
+    create_access_token,
+    decode_access_token,
+    get_current_user,
+    token_cache,
+    user_cache,
+    username_cache,
+)
+from app.models.user import UserRole
+from app.schemas.auth import APIKeyCreate
+from app.schemas.user import UserUpdate
+from app.services.auth import (
+    create_api_key,
+    deactivate_api_key,
+    delete_user,
+    update_user,
+)
+
+
+def test_decode_access_token_caches_claims():
+    token = create_access_token({"sub": "alice"})
+    claims = decode_access_token(token)
+    assert claims["sub"] == "alice"
+
+    hits = token_cache.hits
+    assert decode_access_token(token) == claims
+    assert token_cache.hits == hits + 1
+
+
+def test_decode_access_token_rejects_invalid_and_expired_tokens():
+    token = create_access_token({"sub": "alice"})
+    assert decode_access_token(token[:-2]) is None
+
+    expired = create_access_token({"sub": "alice"}, timedelta(seconds=-1))
+    assert decode_access_token(expired) is None
+
+
+class _Session:
+    """Just enough of an AsyncSession for the auth service mutations."""
+
+    def __init__(self, row=None):
+        self.row = row
+
+    def add(self, obj):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, obj):
+        pass
+
+    async def execute(self, query):
+        row = self.row
+        return SimpleNamespace(
+            scalars=lambda: SimpleNamespace(first=lambda: row), rowcount=1
+        )
+
+
+def _user(**overrides):
+    values = dict(
+        id=1,
+        username="alice",
+        email="alice@example.com",
+        full_name="Alice",
+        role=UserRole.DEVELOPER,
+        is_active=True,
+        created_at=None,
+        updated_at=None,
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+class _Database:
+    """Stubs for the lookups the auth caches sit in front of."""
+
+    def __init__(self):
+        self.keys = {}
+        self.users = {1: _user()}
+        self.calls = Counter()
+
+    async def get_api_key(self, db, api_key):
+        self.calls["api_key"] += 1
+        return self.keys.get(api_key)
+
+    async def get_user_by_id(self, db, user_id):
+        self.calls["user"] += 1
+        return self.users.get(user_id)
+
+    async def get_user_by_username(self, db, username):
+        self.calls["username"] += 1
+        return next((u for u in self.users.values() if u.username == username), None)
+
+
+@pytest.fixture
+def database(monkeypatch):
+    for cache in (
+        api_key_cache,
+        api_key_negative_cache,
+        user_cache,
+        username_cache,
+        token_cache,
+    ):
+        cache.clear()
+    stub = _Database()
+    monkeypatch.setattr(security, "get_api_key", stub.get_api_key)
+    monkeypatch.setattr(security, "get_user_by_id", stub.get_user_by_id)
+    monkeypatch.setattr(security, "get_user_by_username", stub.get_user_by_username)
+    return stub
+
+
+def _api_key(key="secret", **overrides):
+    values = dict(id=7, key=key, user_id=1, is_active=True, expires_at=None)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def _request():
+    return Request({"type": "http", "headers": [], "state": {}})
+
+
+async def _authenticate(api_key=None, token=None):
+    return await get_current_user(_request(), None, api_key=api_key, token=token)
+
+
+async def _status(**credentials):
+    with pytest.raises(HTTPException) as error:
+        await _authenticate(**credentials)
+    return error.value.status_code
+
+
+@pytest.mark.asyncio
+async def test_api_key_and_user_are_looked_up_once(database):
+    database.keys["secret"] = _api_key()
+
+    first = await _authenticate(api_key="secret")
+    second = await _authenticate(api_key="secret")
+
+    assert first.id == second.id == 1
+    assert database.calls == {"api_key": 1, "user": 1}
+
+
+@pytest.mark.asyncio
+async def test_unknown_and_inactive_keys_are_negatively_cached(database):
+    database.keys["inactive"] = _api_key("inactive", is_active=False)
+
+    for key in ("unknown", "inactive"):
+        assert [await _status(api_key=key) for _ in range(3)] == [401] * 3
+
+    assert database.calls == {"api_key": 2}
+
+
+@pytest.mark.asyncio
+async def test_a_cached_key_is_rejected_once_expired(database):
+    database.keys["secret"] = _api_key(
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=0.05)
+    )
+    assert (await _authenticate(api_key="secret")).id == 1
+
+    await asyncio.sleep(0.06)
+
+    assert await _status(api_key="secret") == 401
+    assert database.calls["api_key"] == 1
+
+
+@pytest.mark.asyncio
+async def test_a_deactivated_key_is_rejected_right_away(database):
+    key = database.keys["secret"] = _api_key()
+    await _authenticate(api_key="secret")
+
+    assert await deactivate_api_key(_Session(key), key.id, user_id=1)
+
+    assert await _status(api_key="secret") == 401
+    assert database.calls["api_key"] == 2
+
+
+@pytest.mark.asyncio
+async def test_a_created_key_is_accepted_despite_an_earlier_miss(database):
+    assert await _status(api_key="fresh") == 401
+
+    database.keys["fresh"] = _api_key("fresh")
+    await create_api_key(_Session(), 1, APIKeyCreate(name="ci"), "fresh")
+
+    assert (await _authenticate(api_key="fresh")).id == 1
+    assert database.calls["api_key"] == 2
+
+
+@pytest.mark.asyncio
+async def test_updated_and_deleted_users_are_reloaded(database):
+    database.keys["secret"] = _api_key()
+    await _authenticate(api_key="secret")
+
+    user = database.users[1]
+    await update_user(_Session(), user, UserUpdate(full_name="Alice B"))
+    assert (await _authenticate(api_key="secret")).full_name == "Alice B"
+
+    del database.users[1]
+    await delete_user(_Session(), 1)
+    assert await _status(api_key="secret") == 401
+    assert database.calls["user"] == 3
+
+
+@pytest.mark.asyncio
+async def test_token_claims_and_username_are_resolved_once(database):
+    token = create_access_token({"sub": "alice"})
+
+    for _ in range(3):
+        assert (await _authenticate(token=token)).username == "alice"
+
+    assert token_cache.get(token)["sub"] == "alice"
+    assert database.calls == {"username": 1}
@@ -0,0 +1,31 @@
+import random
+
+from app.core.sketch import LatencySketch
+
+
+def test_quantiles_are_within_relative_accuracy():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(3, 1) for _ in range(20000))
+    sketch = LatencySketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.5, 0.95, 0.99):
+        expected = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - expected) <= 0.01 * expected
+
+
+def test_merged_sketches_match_a_single_sketch():
+    rng = random.Random(11)
+    values = [rng.uniform(1, 500) for _ in range(5000)]
+    whole, first, second = LatencySketch(), LatencySketch(), LatencySketch()
+    for index, value in enumerate(values):
+        whole.add(value)
+        (first if index % 2 else second).add(value)
+
+    first.merge(second)
+    rebuilt = LatencySketch.from_bins((str(k), v) for k, v in first.bins.items())
+
+    assert rebuilt.count == whole.count
+    assert rebuilt.quantile(0.99) == whole.quantile(0.99)
+    assert LatencySketch().quantile(0.5) is None
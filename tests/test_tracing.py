@@ -0,0 +1,80 @@
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.tracing import Trace, current_trace, request_id_from, span
+from app.middleware.tracing import TracingMiddleware
+
+
+def _app():
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/work")
+    async def work():
+        with span("stage"):
+            pass
+        trace = current_trace.get()
+        return {"spans": trace.to_log() if trace else None}
+
+    @app.get("/echo")
+    async def echo():
+        response = Response()
+        response.raw_headers = [(b"x-request-id", b"upstream"), (b"x-other", b"1")]
+        return response
+
+    return TestClient(app)
+
+
+def test_span_is_a_noop_outside_a_sampled_request():
+    assert current_trace.get() is None
+    with span("anything") as noop:
+        pass
+    assert noop is span("other")
+
+
+def test_request_id_is_propagated_or_generated():
+    assert request_id_from("abc-123") == "abc-123"
+    assert len(request_id_from(None)) == 32
+    assert request_id_from("bad id\r\n") != "bad id\r\n"
+
+
+def test_unsampled_requests_only_get_a_request_id(monkeypatch):
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(settings, "TRACE_SERVER_TIMING", True)
+
+    response = _app().get("/work", headers={"X-Request-ID": "req-1"})
+
+    assert response.headers["x-request-id"] == "req-1"
+    assert "server-timing" not in response.headers
+    assert response.json() == {"spans": None}
+
+
+def test_sampled_requests_record_spans_and_server_timing(monkeypatch):
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "TRACE_SERVER_TIMING", True)
+
+    response = _app().get("/work")
+
+    spans = response.json()["spans"]
+    assert [entry["name"] for entry in spans] == ["stage"]
+    assert response.headers["server-timing"].startswith("stage;dur=")
+    assert ", total;dur=" in response.headers["server-timing"]
+
+
+def test_trace_log_offsets_are_relative_to_the_request():
+    trace = Trace("r")
+    trace.add("upstream.ttfb", 0.002, trace.started + 0.001)
+
+    assert trace.to_log() == [
+        {"name": "upstream.ttfb", "start_ms": 1.0, "duration_ms": 2.0}
+    ]
+
+
+def test_request_id_echoed_by_the_upstream_is_not_duplicated(monkeypatch):
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 0.0)
+
+    response = _app().get("/echo", headers={"X-Request-ID": "req-1"})
+
+    assert response.headers.get_list("x-request-id") == ["req-1"]
+    assert response.headers["x-other"] == "1"